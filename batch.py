@@ -0,0 +1,236 @@
+"""
+Concurrent batch optimization.
+
+Collects many SQL statements from a directory, a glob, a JSONL file or a
+multi-statement .sql file, indexes the repository once, and runs the Gemini
+calls on a bounded worker pool with rate limiting and retry/backoff on 429s.
+Results are yielded in input order or as they complete.
+"""
+
+import glob
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from chunking import split_statements
+
+
+@dataclass
+class BatchItem:
+    id: str
+    sql: str
+
+
+@dataclass
+class BatchResult:
+    id: str
+    sql: str
+    output: Optional[str] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+    def to_dict(self):
+        return asdict(self)
+
+
+# --- Input collection ---
+
+def _items_from_sql_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        statements = split_statements(f.read())
+    if len(statements) == 1:
+        return [BatchItem(path, statements[0])]
+    return [BatchItem(f"{path}:{i + 1}", stmt) for i, stmt in enumerate(statements)]
+
+
+def _items_from_jsonl(path):
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                sql, item_id = record, None
+            else:
+                sql = record.get("sql") or record.get("query")
+                item_id = record.get("id")
+            if sql:
+                items.append(BatchItem(str(item_id) if item_id is not None else f"{path}:{line_no}", sql))
+    return items
+
+
+def collect_queries(source):
+    """
+    Collect the statements to optimize.
+
+    Args:
+        source: a directory (all .sql files, recursively), a glob pattern,
+            a .jsonl file (one {"id", "sql"} object or SQL string per line)
+            or a .sql file with one or more statements.
+
+    Returns:
+        List of BatchItem in a stable order.
+    """
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, "**", "*.sql"), recursive=True))
+    elif os.path.isfile(source):
+        paths = [source]
+    else:
+        paths = sorted(p for p in glob.glob(source, recursive=True) if os.path.isfile(p))
+        if not paths:
+            raise FileNotFoundError(f"No files match '{source}'")
+
+    items = []
+    for path in paths:
+        if path.endswith((".jsonl", ".ndjson")):
+            items.extend(_items_from_jsonl(path))
+        else:
+            items.extend(_items_from_sql_file(path))
+    return items
+
+
+# --- Rate limiting and retries ---
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` calls per second with bursts up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_rate_limit_error(error):
+    """Whether an exception from the Gemini client is a 429 / quota error."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+class _ThrottledModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def generate_content(self, **kwargs):
+        return self._owner._call(kwargs)
+
+
+class ThrottledClient:
+    """
+    Wraps a Gemini client so every generate_content call is rate limited and
+    retried with exponential backoff and jitter on 429s.
+    """
+
+    def __init__(self, client, rate_limiter=None, max_retries=5, base_delay=1.0, max_delay=30.0):
+        self.client = client
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.models = _ThrottledModels(self)
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def _call(self, kwargs):
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                return self.client.models.generate_content(**kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+
+# --- Runner ---
+
+def run_batch(items, repo_path=None, rag_strategy=None, concurrency=4, rate=None,
+              max_retries=5, ordered=True, client=None, temperature=0.1, offline=False, rag=None,
+              context_tokens=None, verify=False, verify_rows=None):
+    """
+    Optimize many statements concurrently.
+
+    The repository is indexed once up front (or an already indexed `rag` is
+    used); every statement then runs optimize_sql on a bounded thread pool
+    against the shared index. With `offline` only the rule-based pass runs
+    and no client is needed. With `verify`, every result is checked on SQLite
+    against the repository's schema (see sql_verify).
+
+    Yields:
+        BatchResult per item, in input order if `ordered`, else as completed.
+    """
+    from sql_optimizer import optimize_sql, prepare_rag, get_client
+    from rag_config import RAGStrategy
+
+    rag_strategy = rag_strategy or RAGStrategy.HYBRID
+    if rag is None and repo_path and not offline:
+        rag = prepare_rag(repo_path, rag_strategy)
+    throttled = None
+    if not offline:
+        throttled = ThrottledClient(
+            client or get_client(),
+            rate_limiter=RateLimiter(rate) if rate else None,
+            max_retries=max_retries
+        )
+
+    def work(item):
+        start = time.perf_counter()
+        result = BatchResult(item.id, item.sql)
+        try:
+            result.output = optimize_sql(
+                item.sql, repo_path=repo_path, rag=rag, client=throttled, temperature=temperature,
+                rag_strategy=rag_strategy, offline=offline, context_tokens=context_tokens, verify=verify,
+                verify_rows=verify_rows
+            )
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        result.seconds = time.perf_counter() - start
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(work, item) for item in items]
+        if ordered:
+            for future in futures:
+                yield future.result()
+        else:
+            for future in as_completed(futures):
+                yield future.result()
+
+    if throttled is not None and throttled.retries:
+        print(f"Retried {throttled.retries} rate-limited calls", file=sys.stderr)
+
+
+def format_result(result, output_format="sql"):
+    """Render a BatchResult as an SQL block or a JSON line."""
+    if output_format == "jsonl":
+        return json.dumps(result.to_dict())
+    if result.error:
+        return f"-- [{result.id}] ERROR: {result.error}\n"
+    return f"-- [{result.id}]\n{(result.output or '').rstrip().rstrip(';')};\n"
@@ -0,0 +1,105 @@
+"""
+End-to-end optimization throughput benchmark.
+
+Runs optimize_sql over the labelled queries of a (synthetic) repository
+through the batch runner, with FakeGeminiClient in place of Gemini and the
+hash embedder in place of the embedding model, so it needs no network or
+model download. Reports index time, queries/second and per-query latency.
+
+Run from the repository root:
+    python -m benchmarks.end_to_end --files 1000 --strategy hybrid --latency 0.2 --concurrency 8
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from benchmarks.retrieval import percentiles
+
+
+def build_rag(strategy, repo):
+    """Index a repository for a strategy, using the hash embedder for HYBRID."""
+    from rag_config import RAGFactory, RAGStrategy
+    if strategy == RAGStrategy.HYBRID:
+        from hybrid_rag import HybridRAG
+        from benchmarks.hash_embedder import HashEmbedder
+        rag = HybridRAG(embedder=HashEmbedder())
+    else:
+        rag = RAGFactory.get_rag_class(strategy)()
+    rag.index_directory(repo)
+    return rag
+
+
+def run(repo, strategy, concurrency, latency, repeat, use_cache):
+    from batch import BatchItem, run_batch
+    from benchmarks.synthetic import load_ground_truth
+    from fake_client import FakeGeminiClient
+    from result_cache import configure_result_cache
+
+    configure_result_cache(enabled=use_cache)
+    queries = load_ground_truth(repo)
+    items = [BatchItem(f"q{i}", item["query"]) for i, item in enumerate(queries * repeat)]
+
+    start = time.perf_counter()
+    rag = build_rag(strategy, repo)
+    index_s = time.perf_counter() - start
+
+    client = FakeGeminiClient(latency=latency, seed=0)
+    start = time.perf_counter()
+    results = list(run_batch(items, rag=rag, rag_strategy=strategy, concurrency=concurrency, client=client))
+    wall_s = time.perf_counter() - start
+
+    return {
+        "strategy": strategy.value,
+        "queries": len(items),
+        "concurrency": concurrency,
+        "llm_latency_s": latency,
+        "index_s": index_s,
+        "wall_s": wall_s,
+        "queries_per_s": len(items) / wall_s if wall_s else None,
+        "latency": percentiles([r.seconds for r in results]),
+        "llm_calls": client.calls,
+        "failures": sum(r.error is not None for r in results),
+    }
+
+
+def main(argv=None):
+    from rag_config import RAGStrategy
+    from benchmarks.synthetic import generate_repo
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repo", help="Existing repository with queries.jsonl (default: generate a synthetic one)")
+    parser.add_argument("--files", type=int, default=100, help="Size of the synthetic repository")
+    parser.add_argument("--strategy", type=RAGStrategy, default=RAGStrategy.HYBRID,
+                        choices=list(RAGStrategy), metavar="{" + ",".join(s.value for s in RAGStrategy) + "}")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per LLM call")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the labelled queries")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache enabled")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    if args.repo:
+        report = run(args.repo, args.strategy, args.concurrency, args.latency, args.repeat, args.cache)
+    else:
+        with tempfile.TemporaryDirectory() as repo:
+            generate_repo(repo, args.files)
+            report = run(repo, args.strategy, args.concurrency, args.latency, args.repeat, args.cache)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(
+        f"{report['strategy']}: {report['queries']} queries in {report['wall_s']:.2f} s "
+        f"({report['queries_per_s']:.1f} q/s, concurrency {report['concurrency']}), "
+        f"p50 {report['latency']['p50_ms']:.1f} ms, p99 {report['latency']['p99_ms']:.1f} ms, "
+        f"index {report['index_s'] * 1000:.0f} ms, {report['failures']} failures"
+    )
+
+
+if __name__ == "__main__":
+    main()
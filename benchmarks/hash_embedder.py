@@ -0,0 +1,31 @@
+"""
+Deterministic stand-in for EmbeddingService.
+
+Hashes tokens into a fixed number of dimensions (a signed bag-of-words
+sketch), so Chroma, FAISS and HybridRAG can be benchmarked offline without
+downloading or running the embedding model.
+"""
+
+import zlib
+import numpy as np
+from sparse_index import tokenize
+
+
+class HashEmbedder:
+    """Same encode/encode_one interface as EmbeddingService."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.model_name = f"hash-embedder-{dim}"
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                h = zlib.crc32(token.encode())
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def encode_one(self, text):
+        return self.encode([text])[0]
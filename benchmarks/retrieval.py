@@ -0,0 +1,194 @@
+"""
+Indexing and retrieval benchmark.
+
+For each backend (LocalRAG, TFIDFRAG, ChromaRAG, FAISSRAG, HybridRAG) and
+each repository size, measures in a fresh interpreter:
+- index build time (chunking is timed separately for the single retrievers)
+- peak resident memory
+- p50/p99 retrieval latency
+- recall@k of the labelled query -> table ground truth
+
+Vector backends use the hash embedder from benchmarks.hash_embedder, so the
+benchmark runs offline. Synthetic repositories are generated on the fly
+(see benchmarks.synthetic) unless --repo is given.
+
+Run from the repository root:
+    python -m benchmarks.retrieval --files 10 100 1000
+    python -m benchmarks.retrieval --repo /tmp/synthetic_1k --backends local hybrid --json
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from benchmarks.startup import run_snippet
+
+BACKENDS = ("local", "tfidf", "chroma", "faiss", "hybrid")
+
+WORKER_SNIPPET = """
+import json, os
+os.environ["SQLCLEAN_CACHE_DIR"] = {cache_dir!r}
+from benchmarks.retrieval import run_backend
+print(json.dumps(run_backend({backend!r}, {repo!r}, {top_k!r}, {rounds!r})))
+"""
+
+
+def percentiles(samples):
+    import numpy as np
+    values = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def _peak_rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_documents(repo):
+    """Chunk a repository the way IndexStore does, with stable chunk IDs."""
+    from index_store import chunk_id
+    from ingest import walk_files, load_files
+    from chunking import chunk_document
+    docs = []
+    for rel, _, chunks in load_files(repo, walk_files(repo), chunk_document):
+        for i, doc in enumerate(chunks):
+            doc["id"] = chunk_id(rel, i)
+            docs.append(doc)
+    return docs
+
+
+def _build(backend, repo):
+    """Return (retrieve(query, top_k) -> docs, timings) for a backend."""
+    import time
+    from benchmarks.hash_embedder import HashEmbedder
+
+    timings = {}
+    if backend == "local":
+        from rag_utils import LocalRAG
+        rag = LocalRAG()
+        start = time.perf_counter()
+        rag.index_directory(repo)
+        timings["index_s"] = time.perf_counter() - start
+        timings["chunks"] = len(rag.documents)
+        return rag.retrieve, timings
+    if backend == "hybrid":
+        from hybrid_rag import HybridRAG
+        rag = HybridRAG(embedder=HashEmbedder())
+        start = time.perf_counter()
+        rag.index_directory(repo)
+        timings["index_s"] = time.perf_counter() - start
+        timings["chunks"] = len(rag.documents)
+        return rag.retrieve, timings
+
+    from hybrid_rag import TFIDFRAG, ChromaRAG, FAISSRAG
+    start = time.perf_counter()
+    docs = load_documents(repo)
+    timings["chunk_s"] = time.perf_counter() - start
+    timings["chunks"] = len(docs)
+    rag = {"tfidf": TFIDFRAG, "chroma": ChromaRAG, "faiss": FAISSRAG}[backend]
+    rag = rag() if backend == "tfidf" else rag(embedder=HashEmbedder())
+    start = time.perf_counter()
+    rag.index(docs)
+    timings["index_s"] = time.perf_counter() - start
+    return (lambda query, top_k: [doc for doc, _ in rag.retrieve(query, top_k)]), timings
+
+
+def recall(docs, tables):
+    """Fraction of expected tables whose DDL file or schema entry was retrieved."""
+    found = set()
+    for doc in docs:
+        found.add(os.path.splitext(os.path.basename(doc["source"]))[0])
+        table = doc.get("metadata", {}).get("table")
+        if table:
+            found.add(table)
+    return len(found & set(tables)) / len(tables)
+
+
+def run_backend(backend, repo, top_k=5, rounds=3):
+    """Benchmark one backend in the current process. Returns a JSON-able dict."""
+    import time
+    from benchmarks.synthetic import load_ground_truth
+
+    ground_truth = load_ground_truth(repo)
+    rss_before = _peak_rss_mb()
+    retrieve, result = _build(backend, repo)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["rss_growth_mb"] = result["peak_rss_mb"] - rss_before
+
+    latencies = []
+    recalls = []
+    for round_number in range(rounds):
+        for item in ground_truth:
+            start = time.perf_counter()
+            docs = retrieve(item["query"], top_k)
+            latencies.append(time.perf_counter() - start)
+            if round_number == 0:
+                recalls.append(recall(docs, item["tables"]))
+    result["retrieve"] = percentiles(latencies)
+    result[f"recall_at_{top_k}"] = sum(recalls) / len(recalls) if recalls else None
+    result["queries"] = len(ground_truth)
+    return result
+
+
+def bench_repo(repo, backends, top_k, rounds):
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for backend in backends:
+            try:
+                results[backend] = run_snippet(WORKER_SNIPPET.format(
+                    cache_dir=cache_dir, backend=backend, repo=os.path.abspath(repo), top_k=top_k, rounds=rounds
+                ))
+            except RuntimeError as e:
+                results[backend] = {"error": str(e)}
+    return results
+
+
+def main(argv=None):
+    from benchmarks.synthetic import generate_repo
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repo", help="Existing repository with queries.jsonl (default: generate synthetic ones)")
+    parser.add_argument("--files", type=int, nargs="*", default=[10, 100, 1000], help="Synthetic repository sizes")
+    parser.add_argument("--backends", nargs="*", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over the labelled queries")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = {}
+    if args.repo:
+        report[args.repo] = bench_repo(args.repo, args.backends, args.top_k, args.rounds)
+    else:
+        for files in args.files:
+            with tempfile.TemporaryDirectory() as repo:
+                generate_repo(repo, files, args.seed)
+                report[f"synthetic_{files}"] = bench_repo(repo, args.backends, args.top_k, args.rounds)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for repo, results in report.items():
+        print(repo)
+        for backend, r in results.items():
+            if "error" in r:
+                print(f"  {backend:<8} error: {r['error']}")
+                continue
+            print(
+                f"  {backend:<8} index {r['index_s'] * 1000:9.1f} ms  rss {r['peak_rss_mb']:7.1f} MB  "
+                f"p50 {r['retrieve']['p50_ms']:7.2f} ms  p99 {r['retrieve']['p99_ms']:7.2f} ms  "
+                f"recall@{args.top_k} {r[f'recall_at_{args.top_k}']:.2f}  ({r['chunks']} chunks)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Startup-time benchmark.
+
+Measures, each in a fresh interpreter:
+- import latency of the CLI entry point (sqlClean) and sql_optimizer
+- first-call latency per RAG strategy: backend import + construction,
+  first index_directory() and first retrieve()
+
+Run from the repository root:
+    python -m benchmarks.startup --repo sqlSchema/ecommerce
+    python -m benchmarks.startup --strategies simple --repeat 5 --json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+heavy = [m for m in ("chromadb", "faiss", "sentence_transformers", "sklearn", "google.genai") if m in sys.modules]
+print(json.dumps({{"seconds": t1 - t0, "heavy_modules": heavy}}))
+"""
+
+FIRST_CALL_SNIPPET = """
+import json, time
+from rag_config import RAGFactory, RAGStrategy
+strategy = RAGStrategy({strategy!r})
+t0 = time.perf_counter()
+rag = RAGFactory.create_rag(strategy)
+t1 = time.perf_counter()
+rag.index_directory({repo!r})
+t2 = time.perf_counter()
+rag.retrieve({query!r}, top_k=3)
+t3 = time.perf_counter()
+print(json.dumps({{"create": t1 - t0, "index": t2 - t1, "retrieve": t3 - t2, "total": t3 - t0}}))
+"""
+
+
+def run_snippet(code):
+    """Run a snippet in a fresh interpreter and return its JSON output."""
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "max": max(samples),
+    }
+
+
+def bench_imports(modules, repeat):
+    results = {}
+    for module in modules:
+        runs = [run_snippet(IMPORT_SNIPPET.format(module=module)) for _ in range(repeat)]
+        results[module] = {
+            "seconds": summarize([r["seconds"] for r in runs]),
+            "heavy_modules": runs[-1]["heavy_modules"],
+        }
+    return results
+
+
+def bench_first_call(strategies, repo, query, repeat):
+    results = {}
+    for strategy in strategies:
+        try:
+            runs = [
+                run_snippet(FIRST_CALL_SNIPPET.format(strategy=strategy, repo=repo, query=query))
+                for _ in range(repeat)
+            ]
+        except RuntimeError as e:
+            results[strategy] = {"error": str(e)}
+            continue
+        results[strategy] = {
+            phase: summarize([r[phase] for r in runs])
+            for phase in ("create", "index", "retrieve", "total")
+        }
+    return results
+
+
+def main(argv=None):
+    from rag_config import RAGStrategy
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repo", default="sqlSchema/ecommerce", help="Repository to index for first-call timings")
+    parser.add_argument("--query", default="SELECT * FROM orders o JOIN customers c ON o.customer_id = c.customer_id")
+    parser.add_argument("--strategies", nargs="*", default=[s.value for s in RAGStrategy])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    args = parser.parse_args(argv)
+
+    report = {
+        "imports": bench_imports(["sqlClean", "sql_optimizer"], args.repeat),
+        "first_call": bench_first_call(args.strategies, args.repo, args.query, args.repeat),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for module, r in report["imports"].items():
+        heavy = ", ".join(r["heavy_modules"]) or "none"
+        print(f"import {module:<15} {r['seconds']['median'] * 1000:8.1f} ms  (heavy modules loaded: {heavy})")
+    for strategy, r in report["first_call"].items():
+        if "error" in r:
+            print(f"first call {strategy:<10} error: {r['error']}")
+            continue
+        phases = "  ".join(f"{p}={r[p]['median'] * 1000:.1f}ms" for p in ("create", "index", "retrieve"))
+        print(f"first call {strategy:<10} {r['total']['median'] * 1000:8.1f} ms  ({phases})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Synthetic schema repository generator.
+
+Builds repositories shaped like sqlSchema/education and sqlSchema/ecommerce:
+one directory per domain with a README.md and one .sql file per table
+(CREATE TABLE with foreign keys, CREATE INDEX, sample INSERTs). Alongside the
+schema it writes queries.jsonl, labelled query -> table ground truth used to
+score retrieval recall.
+
+Run from the repository root:
+    python -m benchmarks.synthetic /tmp/synthetic_1k --files 1000
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+
+QUERIES_FILE = "queries.jsonl"
+TABLES_PER_DOMAIN = 6
+
+THEMES = ["shop", "campus", "clinic", "bank", "logistics", "media", "travel", "energy"]
+ENTITIES = [
+    "customers", "orders", "products", "payments", "shipments", "students", "courses",
+    "enrollments", "grades", "invoices", "suppliers", "employees", "departments", "accounts",
+    "sessions", "reviews", "categories", "warehouses", "tickets", "events", "patients", "visits",
+]
+COLUMN_TYPES = [
+    ("name", "VARCHAR(100) NOT NULL"), ("status", "ENUM('active', 'inactive', 'pending') DEFAULT 'active'"),
+    ("amount", "DECIMAL(10, 2)"), ("quantity", "INT DEFAULT 1"), ("email", "VARCHAR(255) UNIQUE"),
+    ("created_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"), ("notes", "TEXT"), ("score", "DECIMAL(4, 2)"),
+    ("code", "VARCHAR(20)"), ("started_on", "DATE"),
+]
+
+
+def _singular(entity):
+    if entity.endswith("ies"):
+        return entity[:-3] + "y"
+    return entity[:-1] if entity.endswith("s") else entity
+
+
+def _table_ddl(table, parents, rng):
+    key = f"{_singular(table.split('_', 1)[1])}_id"
+    columns = [f"    {key} INT PRIMARY KEY AUTO_INCREMENT"]
+    picked = rng.sample(COLUMN_TYPES, rng.randint(3, 6))
+    columns += [f"    {name} {kind}" for name, kind in picked]
+    fks = []
+    for parent, parent_key in parents:
+        columns.append(f"    {parent_key} INT NOT NULL")
+        fks.append(f"    FOREIGN KEY ({parent_key}) REFERENCES {parent}({parent_key}) ON DELETE CASCADE")
+    lines = [f"-- {table.replace('_', ' ').title()} table", f"CREATE TABLE {table} ("]
+    lines.append(",\n".join(columns + fks))
+    lines.append(");")
+    for _, parent_key in parents:
+        lines.append(f"\nCREATE INDEX idx_{table}_{parent_key} ON {table}({parent_key});")
+
+    insert_columns = [name for name, _ in picked if name in ("name", "code", "quantity")]
+    if insert_columns:
+        values = ",\n".join(
+            "(" + ", ".join(
+                f"'{table}_{col}_{i}'" if col != "quantity" else str(i + 1) for col in insert_columns
+            ) + ")"
+            for i in range(2)
+        )
+        lines.append(f"\n-- Sample data\nINSERT INTO {table} ({', '.join(insert_columns)}) VALUES\n{values};")
+    return key, [name for name, _ in picked], "\n".join(lines) + "\n"
+
+
+def _readme(domain, tables):
+    bullet_list = "\n".join(f"- **{t}**: {t.split('_', 1)[1].replace('_', ' ')} records" for t in tables)
+    return (
+        f"# {domain.title()} Database Schema\n\n"
+        f"## Overview\nSynthetic {domain} schema with {len(tables)} related tables.\n\n"
+        f"## Tables\n{bullet_list}\n\n"
+        "## Best Practices\n"
+        "- Index foreign key columns used in joins\n"
+        "- Filter on indexed columns and avoid functions on them in WHERE clauses\n"
+        "- Select only the columns you need instead of SELECT *\n"
+    )
+
+
+def _query(chain, columns, rng):
+    """A JOIN over an FK chain [(table, key, parent_key)] with a filter on the first table."""
+    aliases = [f"t{i}" for i in range(len(chain))]
+    select = [f"{alias}.{rng.choice(columns[table])}" for alias, (table, _, _) in zip(aliases, chain)]
+    table, key, _ = chain[0]
+    sql = [f"SELECT {', '.join(select)}", f"FROM {table} {aliases[0]}"]
+    for i in range(1, len(chain)):
+        child, _, parent_key = chain[i]
+        sql.append(f"JOIN {child} {aliases[i]} ON {aliases[i - 1]}.{chain[i - 1][1]} = {aliases[i]}.{parent_key}")
+    sql.append(f"WHERE {aliases[0]}.{key} > {rng.randint(1, 1000)}")
+    return "\n".join(sql) + ";"
+
+
+def generate_repo(path, files=100, seed=0):
+    """
+    Write a synthetic schema repository with roughly `files` files.
+
+    Returns:
+        List of {'query', 'tables'} ground-truth dicts (also written to
+        <path>/queries.jsonl).
+    """
+    rng = random.Random(seed)
+    domains = max(1, math.ceil(files / (TABLES_PER_DOMAIN + 1)))
+    ground_truth = []
+    written = 0
+    for d in range(domains):
+        domain = f"{THEMES[d % len(THEMES)]}{d}"
+        domain_dir = os.path.join(path, domain)
+        os.makedirs(domain_dir, exist_ok=True)
+        n_tables = min(TABLES_PER_DOMAIN, max(1, files - written - 1))
+        tables = [f"{domain}_{entity}" for entity in rng.sample(ENTITIES, n_tables)]
+
+        keys = {}
+        columns = {}
+        children = {}
+        for i, table in enumerate(tables):
+            parents = [(p, keys[p]) for p in rng.sample(tables[:i], min(i, rng.randint(1, 2)))]
+            keys[table], columns[table], ddl = _table_ddl(table, parents, rng)
+            for parent, _ in parents:
+                children.setdefault(parent, []).append(table)
+            with open(os.path.join(domain_dir, f"{table}.sql"), "w") as f:
+                f.write(ddl)
+        with open(os.path.join(domain_dir, "README.md"), "w") as f:
+            f.write(_readme(domain, tables))
+        written += n_tables + 1
+
+        # Walk FK edges parent -> child to label a join query
+        start = rng.choice([t for t in tables if t in children] or tables)
+        chain = [(start, keys[start], None)]
+        while len(chain) < 3 and chain[-1][0] in children:
+            child = rng.choice(children[chain[-1][0]])
+            chain.append((child, keys[child], keys[chain[-1][0]]))
+        ground_truth.append({"query": _query(chain, columns, rng), "tables": [t for t, _, _ in chain]})
+
+    with open(os.path.join(path, QUERIES_FILE), "w") as f:
+        for item in ground_truth:
+            f.write(json.dumps(item) + "\n")
+    return ground_truth
+
+
+def load_ground_truth(path):
+    with open(os.path.join(path, QUERIES_FILE)) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Directory to write the repository to")
+    parser.add_argument("--files", type=int, default=100, help="Approximate number of files")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    queries = generate_repo(args.path, args.files, args.seed)
+    print(f"Wrote {args.path} with {len(queries)} labelled queries")
+
+
+if __name__ == "__main__":
+    main()
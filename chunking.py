@@ -0,0 +1,194 @@
+"""
+SQL- and Markdown-aware chunking.
+
+.sql files are split by statement (sqlglot tokenizer) and each chunk records
+the statement kinds and table names it touches. .md files are split by
+heading, then by paragraph. Small neighbouring pieces are merged and
+oversized ones are split on line boundaries with overlap, so chunks stay
+whole and self-describing instead of being cut every N characters.
+"""
+
+import os
+import re
+import sqlglot
+from sqlglot import exp
+from sqlglot.tokens import Tokenizer, TokenType
+
+MAX_CHUNK_CHARS = 1500
+MIN_CHUNK_CHARS = 200
+OVERLAP_CHARS = 200
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+
+# Schema repos mix dialects (e.g. MySQL AUTO_INCREMENT/ENUM, generated columns)
+PARSE_DIALECTS = (None, "mysql", "postgres", "sqlite")
+
+
+def parse_statement(statement, dialects=PARSE_DIALECTS):
+    """Parse a single statement, trying each dialect in turn. Returns None if none parses it."""
+    for dialect in dialects:
+        try:
+            parsed = sqlglot.parse_one(statement, read=dialect)
+        except Exception:
+            continue
+        if parsed is not None:
+            return parsed
+    return None
+
+
+def split_statements(text):
+    """Split a SQL script into statements on top-level semicolons, keeping the original text."""
+    try:
+        tokens = Tokenizer().tokenize(text)
+    except Exception:
+        return [part.strip() for part in text.split(";") if part.strip()]
+
+    statements = []
+    start = 0
+    for token in tokens:
+        if token.token_type == TokenType.SEMICOLON:
+            statements.append(text[start:token.start])
+            start = token.end + 1
+    statements.append(text[start:])
+    return [stmt.strip() for stmt in statements if stmt.strip()]
+
+
+def split_with_overlap(text, max_chars=MAX_CHUNK_CHARS, overlap=OVERLAP_CHARS):
+    """Split text into windows of at most max_chars on line boundaries, repeating ~overlap chars."""
+    if len(text) <= max_chars:
+        return [text]
+    lines = text.splitlines(keepends=True)
+    windows = []
+    current = []
+    size = 0
+    for line in lines:
+        while len(line) > max_chars:
+            # A single huge line: fall back to a hard cut
+            if current:
+                windows.append("".join(current))
+                current, size = [], 0
+            windows.append(line[:max_chars])
+            line = line[max_chars - overlap:]
+        if size + len(line) > max_chars and current:
+            windows.append("".join(current))
+            # Carry the tail of the previous window into the next one
+            tail = []
+            tail_size = 0
+            for prev in reversed(current):
+                if tail_size + len(prev) > overlap:
+                    break
+                tail.insert(0, prev)
+                tail_size += len(prev)
+            current, size = tail, tail_size
+        current.append(line)
+        size += len(line)
+    if current:
+        windows.append("".join(current))
+    return [w.strip() for w in windows if w.strip()]
+
+
+def _statement_metadata(statement):
+    parsed = parse_statement(statement)
+    if parsed is None:
+        return "unknown", []
+    kind = parsed.key
+    if isinstance(parsed, exp.Create):
+        kind = f"create_{(parsed.args.get('kind') or '').lower()}".rstrip("_")
+    tables = sorted({table.name for table in parsed.find_all(exp.Table) if table.name})
+    return kind, tables
+
+
+def _merge_small(pieces, max_chars=MAX_CHUNK_CHARS, min_chars=MIN_CHUNK_CHARS, separator="\n\n"):
+    """
+    Merge consecutive (text, metadata) pieces while the running chunk is below
+    min_chars and the merged chunk stays within max_chars.
+    """
+    merged = []
+    for text, meta in pieces:
+        if merged:
+            prev_text, prev_meta = merged[-1]
+            if len(prev_text) < min_chars and len(prev_text) + len(separator) + len(text) <= max_chars:
+                merged[-1] = (prev_text + separator + text, _combine_metadata(prev_meta, meta))
+                continue
+        merged.append((text, meta))
+    return merged
+
+
+def _combine_metadata(a, b):
+    combined = dict(a)
+    for key in ("tables", "statements"):
+        if key in a or key in b:
+            combined[key] = sorted(set(a.get(key, [])) | set(b.get(key, [])))
+    return combined
+
+
+def chunk_sql(text, max_chars=MAX_CHUNK_CHARS, min_chars=MIN_CHUNK_CHARS, overlap=OVERLAP_CHARS):
+    """Chunk a SQL script by statement. Returns a list of (content, metadata)."""
+    pieces = []
+    for statement in split_statements(text):
+        kind, tables = _statement_metadata(statement)
+        meta = {"type": "sql", "statements": [kind], "tables": tables}
+        for window in split_with_overlap(statement + ";", max_chars, overlap):
+            pieces.append((window, meta))
+    return _merge_small(pieces, max_chars, min_chars)
+
+
+def chunk_markdown(text, max_chars=MAX_CHUNK_CHARS, min_chars=MIN_CHUNK_CHARS, overlap=OVERLAP_CHARS):
+    """Chunk Markdown by heading, then paragraph. Returns a list of (content, metadata)."""
+    sections = []
+    path = []
+    current = []
+
+    def flush():
+        body = "".join(current).strip()
+        if body:
+            sections.append((body, {"type": "markdown", "heading": " > ".join(path)}))
+
+    for line in text.splitlines(keepends=True):
+        match = _HEADING.match(line.strip())
+        if match:
+            flush()
+            current = []
+            level = len(match.group(1))
+            path[:] = path[:level - 1] + [match.group(2).strip()]
+        current.append(line)
+    flush()
+
+    pieces = []
+    for body, meta in sections:
+        if len(body) <= max_chars:
+            pieces.append((body, meta))
+            continue
+        paragraphs = [(p.strip(), meta) for p in re.split(r"\n\s*\n", body) if p.strip()]
+        for paragraph, _ in _merge_small(paragraphs, max_chars, max_chars):
+            for window in split_with_overlap(paragraph, max_chars, overlap):
+                pieces.append((window, meta))
+    return _merge_small(pieces, max_chars, min_chars)
+
+
+def chunk_text(text, max_chars=MAX_CHUNK_CHARS, overlap=OVERLAP_CHARS):
+    """Fallback chunking for other files: line-aligned windows with overlap."""
+    return [(window, {"type": "text"}) for window in split_with_overlap(text, max_chars, overlap)]
+
+
+def chunk_document(content, source, max_chars=MAX_CHUNK_CHARS, min_chars=MIN_CHUNK_CHARS, overlap=OVERLAP_CHARS):
+    """
+    Split a file's content into document dicts based on its extension.
+
+    Returns:
+        List of {'content', 'source', 'metadata'} dicts. metadata always has
+        'type' and 'chunk' (index within the file); SQL chunks add
+        'statements' and 'tables', Markdown chunks add 'heading'.
+    """
+    ext = os.path.splitext(source)[1].lower()
+    if ext == ".sql":
+        pieces = chunk_sql(content, max_chars, min_chars, overlap)
+    elif ext in (".md", ".markdown"):
+        pieces = chunk_markdown(content, max_chars, min_chars, overlap)
+    else:
+        pieces = chunk_text(content, max_chars, overlap)
+
+    return [
+        {'content': text, 'source': source, 'metadata': dict(meta, chunk=i)}
+        for i, (text, meta) in enumerate(pieces)
+    ]
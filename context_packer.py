@@ -0,0 +1,116 @@
+"""
+Token-budgeted context packing for the Gemini prompt.
+
+Retrieval returns a generous list of candidates; the packer decides what
+actually goes into the prompt:
+- DDL for the tables the query references comes first, then the other
+  candidates in retrieval order
+- exact duplicates and chunks that mostly repeat an already packed one
+  (word 5-gram overlap) are dropped
+- chunks are added while they fit the token budget; the first chunk is cut
+  to size rather than dropped, so some context always fits
+
+The prompt therefore stays small and predictable however many chunks the
+retriever returns.
+"""
+
+import os
+import re
+from schema_index import referenced_tables
+
+# Budget for the repository context block, in (estimated) tokens
+DEFAULT_CONTEXT_TOKENS = int(os.environ.get("SQLCLEAN_CONTEXT_TOKENS", 1500))
+# How many chunks to retrieve for the packer to choose from
+CANDIDATES = 12
+# Gemini averages roughly four characters of code per token
+CHARS_PER_TOKEN = 4
+SHINGLE_WORDS = 5
+MAX_OVERLAP = 0.6
+
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def format_doc(doc):
+    return f"From {doc['source']}:\n{doc['content']}"
+
+
+def format_context(docs):
+    return "\n".join(format_doc(doc) for doc in docs)
+
+
+def _shingles(text):
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def _ddl_tables(doc):
+    """Tables a chunk defines: schema-stage documents and CREATE TABLE chunks."""
+    meta = doc.get("metadata", {})
+    if meta.get("type") == "schema":
+        return {meta.get("table", "").lower()}
+    if "create_table" in meta.get("statements", []):
+        return {table.lower() for table in meta.get("tables", [])}
+    return set()
+
+
+def _truncate(doc, max_tokens):
+    """Cut a chunk's content on a line boundary so the formatted doc fits max_tokens."""
+    room = max_tokens * CHARS_PER_TOKEN - len(format_doc(dict(doc, content="")))
+    if room <= 0:
+        return None
+    content = doc["content"][:room]
+    if len(content) < len(doc["content"]) and "\n" in content:
+        content = content[:content.rindex("\n")]
+    return dict(doc, content=content.rstrip())
+
+
+def pack_context(docs, query, max_tokens=DEFAULT_CONTEXT_TOKENS):
+    """
+    Choose the retrieved docs to put in the prompt.
+
+    Args:
+        docs: candidates in retrieval (relevance) order
+        query: the SQL being optimized, used to find referenced tables
+        max_tokens: budget for the formatted context
+
+    Returns:
+        (packed docs, estimated tokens of format_context(packed docs))
+    """
+    if not docs or max_tokens <= 0:
+        return [], 0
+    tables = set(referenced_tables(query))
+    ranked = sorted(range(len(docs)), key=lambda i: (not (_ddl_tables(docs[i]) & tables), i))
+
+    packed = []
+    packed_shingles = []
+    seen = set()
+    used = 0
+    for i in ranked:
+        doc = docs[i]
+        content = doc["content"].strip()
+        if not content or content in seen:
+            continue
+        shingles = _shingles(content)
+        if any(len(shingles & other) > MAX_OVERLAP * min(len(shingles), len(other)) for other in packed_shingles):
+            continue
+        # Joined with a newline after the first doc
+        cost = estimate_tokens(format_doc(doc)) + (1 if packed else 0)
+        if used + cost > max_tokens:
+            if packed:
+                # A smaller candidate further down may still fit
+                continue
+            doc = _truncate(doc, max_tokens)
+            if doc is None or not doc["content"]:
+                continue
+            cost = estimate_tokens(format_doc(doc))
+        packed.append(doc)
+        packed_shingles.append(shingles)
+        seen.add(content)
+        used += cost
+    return packed, used
@@ -0,0 +1,164 @@
+"""
+Shared embedding service.
+
+One SentenceTransformer per model is loaded lazily and shared by every
+vector backend. Embeddings are L2-normalized, so the vector indexes' inner
+product is cosine similarity. Encodes are batched and cached by content
+hash, both in memory and on disk, so repeated chunks and repeated queries
+skip the model.
+"""
+
+import os
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from index_store import CACHE_DIR
+import tracing
+
+EMBEDDING_MODEL = 'BAAI/bge-code-large'
+
+
+class EmbeddingService:
+    """Batched, content-hash-cached encoder around a single SentenceTransformer."""
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, model_name=EMBEDDING_MODEL):
+        """Return the process-wide service for a model, creating it on first use."""
+        with cls._shared_lock:
+            if model_name not in cls._shared:
+                cls._shared[model_name] = cls(model_name)
+            return cls._shared[model_name]
+
+    def __init__(self, model_name=EMBEDDING_MODEL, cache_dir=None, batch_size=32,
+                 memory_cache_size=50000, disk_cache=True):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.memory_cache_size = memory_cache_size
+        self._model = None
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = {}          # key -> Event set once another call has encoded it
+        self._conn = None
+        if disk_cache:
+            cache_dir = os.path.join(cache_dir or CACHE_DIR, "embeddings")
+            os.makedirs(cache_dir, exist_ok=True)
+            model_key = hashlib.sha256(f"{model_name}\0normalized".encode()).hexdigest()[:16]
+            self._conn = sqlite3.connect(
+                os.path.join(cache_dir, f"{model_key}.sqlite"), check_same_thread=False
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+            )
+            self._conn.commit()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "encoded": 0}
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_cache_size:
+            self._memory.popitem(last=False)
+
+    def encode(self, texts):
+        """
+        Encode a list of texts into a 2D float32 array.
+
+        Cached vectors are served from memory or disk; only unseen texts are
+        sent to the model, de-duplicated and in batches of `batch_size`. The
+        lock only guards the caches: the model runs outside it, and a text
+        another call is already encoding is waited for, not encoded again.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory and key not in found:
+                    found[key] = self._memory[key]
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            if missing and self._conn is not None:
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    )
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, found[key])
+                        self.stats["disk_hits"] += 1
+
+            to_encode = {}
+            waiting = {}
+            for key, text in zip(keys, texts):
+                if key in found or key in to_encode or key in waiting:
+                    continue
+                if key in self._pending:
+                    waiting[key] = (text, self._pending[key])
+                else:
+                    to_encode[key] = text
+                    self._pending[key] = threading.Event()
+            tracing.count("embed.cache_hits", len(found))
+
+        if to_encode:
+            try:
+                with tracing.span("embed.model", texts=len(to_encode)):
+                    vectors = np.asarray(
+                        self.model.encode(list(to_encode.values()), batch_size=self.batch_size,
+                                          normalize_embeddings=True),
+                        dtype=np.float32
+                    )
+                found.update(zip(to_encode, vectors))
+                tracing.count("embed.encoded", len(to_encode))
+                with self._lock:
+                    self.stats["encoded"] += len(to_encode)
+                    for key in to_encode:
+                        self._remember(key, found[key])
+                    if self._conn is not None:
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                            [(key, found[key].tobytes()) for key in to_encode]
+                        )
+                        self._conn.commit()
+            finally:
+                with self._lock:
+                    for key in to_encode:
+                        self._pending.pop(key).set()
+
+        if waiting:
+            for _, event in waiting.values():
+                event.wait()
+            with self._lock:
+                for key in waiting:
+                    if key in self._memory:
+                        found[key] = self._memory[key]
+            # The other call failed (or its vectors were already evicted)
+            retry = [text for key, (text, _) in waiting.items() if key not in found]
+            if retry:
+                found.update(zip(map(self._key, retry), self.encode(retry)))
+
+        return np.vstack([found[key] for key in keys])
+
+    def encode_one(self, text):
+        """Encode a single text into a 1D float32 vector."""
+        return self.encode([text])[0]
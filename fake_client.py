@@ -0,0 +1,91 @@
+"""
+Local stand-in for the Gemini client.
+
+Mimics `client.models.generate_content(...)` and
+`generate_content_stream(...)` closely enough to exercise the
+optimizer, batch runner and benchmarks offline: it echoes back the SQL from
+the prompt, formatted with sqlglot, after an optional simulated latency,
+and can inject HTTP 429 errors to test retry/backoff.
+"""
+
+import random
+import threading
+import time
+import sqlglot
+
+
+class FakeRateLimitError(Exception):
+    """Simulated 429 RESOURCE_EXHAUSTED error."""
+    code = 429
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def generate_content(self, model=None, contents=None, config=None):
+        return self._owner._respond(contents)
+
+    def generate_content_stream(self, model=None, contents=None, config=None):
+        return self._owner._respond_stream(contents)
+
+
+class FakeGeminiClient:
+    """Offline client that echoes the SQL it was asked to optimize."""
+
+    def __init__(self, latency=0.0, rate_limit_every=0, seed=None, chunk_chars=16):
+        """
+        Args:
+            latency: seconds to sleep per call (simulated network round-trip)
+            rate_limit_every: raise FakeRateLimitError on every Nth call (0 = never)
+            seed: seed for the latency jitter
+            chunk_chars: size of the pieces generate_content_stream yields
+        """
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.chunk_chars = chunk_chars
+        self.models = _FakeModels(self)
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def _start_call(self):
+        with self._lock:
+            self.calls += 1
+            call_number = self.calls
+            jitter = self._random.uniform(0.5, 1.5) if self.latency else 0
+        if self.rate_limit_every and call_number % self.rate_limit_every == 0:
+            raise FakeRateLimitError("429 RESOURCE_EXHAUSTED (simulated)")
+        return self.latency * jitter
+
+    def _respond(self, contents):
+        delay = self._start_call()
+        if delay:
+            time.sleep(delay)
+        return FakeResponse(self._echo(contents or ""))
+
+    def _respond_stream(self, contents):
+        # The simulated latency is spread over the chunks, as with token streaming
+        delay = self._start_call()
+        text = self._echo(contents or "")
+        pieces = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+        for piece in pieces:
+            if delay:
+                time.sleep(delay / len(pieces))
+            yield FakeResponse(piece)
+
+    @staticmethod
+    def _echo(prompt):
+        # The SQL is always the last part of the prompt
+        for marker in ("SQL to optimize:\n", "return ONLY the corrected SQL.\n\n"):
+            if marker in prompt:
+                prompt = prompt.rsplit(marker, 1)[1]
+        try:
+            return ";\n".join(sqlglot.transpile(prompt, pretty=True))
+        except sqlglot.errors.SqlglotError:
+            return prompt.strip()
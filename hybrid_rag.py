@@ -1,64 +1,99 @@
-import os
-import glob
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import hashlib
 import numpy as np
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import chromadb
-from sentence_transformers import SentenceTransformer
-import faiss
 from collections import defaultdict
+from index_store import IndexStore, chunk_id
+from embeddings import EmbeddingService
+from chunking import chunk_document
+from schema_index import SchemaRAG
+from pattern_index import PatternRAG
+from sparse_index import SparseIndex
+from vector_index import FaissIndex
+import tracing
+
+# Retrieves one HybridRAG serves at once (server threads, batch workers)
+RETRIEVE_CONCURRENCY = int(os.environ.get("SQLCLEAN_RETRIEVE_CONCURRENCY", 8))
+
 
 class TFIDFRAG:
-    """TF-IDF based RAG for keyword-level retrieval."""
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(stop_words='english')
+    """Sparse keyword retrieval (BM25 over an incremental inverted index)."""
+    def __init__(self, min_score=0.1):
+        self.engine = SparseIndex()
+        self.min_score = min_score
         self.documents = []
-        self.tfidf_matrix = None
 
     def index(self, documents):
-        self.documents = documents
-        if documents:
-            contents = [doc['content'] for doc in documents]
-            self.tfidf_matrix = self.vectorizer.fit_transform(contents)
+        """
+        Index documents. Documents with a stable 'id' are synced
+        incrementally: unchanged chunks are kept, changed and new ones are
+        (re)tokenized and missing ones removed. Otherwise the index is rebuilt.
+        """
+        if documents and all('id' in doc for doc in documents) and all('id' in doc for doc in self.documents):
+            wanted = {doc['id']: doc for doc in documents}
+            for old in self.documents:
+                new = wanted.get(old['id'])
+                if new is None or new['content'] != old['content']:
+                    self.engine.remove(old['id'])
+                else:
+                    self.engine.update_document(new['id'], new)
+            for doc_id, doc in wanted.items():
+                if doc_id not in self.engine:
+                    self.engine.add(doc_id, doc)
         else:
-            self.tfidf_matrix = None
+            self.engine.clear()
+            self.engine.add_many((doc.get('id', i), doc) for i, doc in enumerate(documents))
+        self.documents = documents
 
     def retrieve(self, query, top_k=5):
-        if self.tfidf_matrix is None or len(self.documents) == 0:
-            return []
-        query_vec = self.vectorizer.transform([query])
-        similarities = cosine_similarity(query_vec, self.tfidf_matrix)[0]
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
-        results = []
-        for idx in top_indices:
-            if similarities[idx] > 0.1:
-                results.append((self.documents[idx], similarities[idx]))
-        return results
+        return self.engine.search(query, top_k, self.min_score)
+
+    def retrieve_batch(self, queries, top_k=5):
+        return self.engine.search_batch(queries, top_k, self.min_score)
 
 
 class ChromaRAG:
     """Chroma-based RAG using BGE embeddings for semantic retrieval."""
-    def __init__(self):
-        self.embedder = SentenceTransformer('BAAI/bge-code-large')
+    def __init__(self, embedder=None):
+        self.embedder = embedder or EmbeddingService.shared()
         self.chroma_client = chromadb.EphemeralClient()
-        self.collection = self.chroma_client.create_collection(name="sql_docs")
+        # Ephemeral clients share state in-process, so each instance gets its own collection
+        self.collection_name = f"sql_docs_{uuid.uuid4().hex[:8]}"
+        self.collection = self.chroma_client.create_collection(name=self.collection_name)
         self.id_to_doc = {}
 
-    def index(self, documents):
+    def reset(self):
+        self.chroma_client.delete_collection(name=self.collection_name)
+        self.collection = self.chroma_client.create_collection(name=self.collection_name)
+        self.id_to_doc = {}
+
+    def close(self):
+        """Drop the collection (ephemeral clients keep it alive for the whole process)."""
+        self.chroma_client.delete_collection(name=self.collection_name)
+        self.id_to_doc = {}
+
+    def index(self, documents, embeddings=None):
         if documents:
             chunks = [doc['content'] for doc in documents]
-            embeddings = self.embedder.encode(chunks)
-            ids = [str(i) for i in range(len(documents))]
+            if embeddings is None:
+                embeddings = self.embedder.encode(chunks)
+            ids = [str(doc.get('id', i)) for i, doc in enumerate(documents)]
             self.collection.add(
                 documents=chunks,
-                embeddings=embeddings.tolist(),
+                embeddings=np.asarray(embeddings).tolist(),
                 ids=ids
             )
-            for i, doc in enumerate(documents):
-                self.id_to_doc[i] = doc
+            for id_str, doc in zip(ids, documents):
+                self.id_to_doc[int(id_str)] = doc
 
-    def retrieve(self, query, top_k=5):
-        query_emb = self.embedder.encode([query])[0]
+    def retrieve(self, query, top_k=5, query_embedding=None):
+        query_emb = query_embedding if query_embedding is not None else self.embedder.encode_one(query)
         results = self.collection.query(query_embeddings=[query_emb.tolist()], n_results=top_k)
         retrieved = []
         for id_str, dist in zip(results['ids'][0], results['distances'][0]):
@@ -69,112 +104,438 @@ class ChromaRAG:
 
 
 class FAISSRAG:
-    """FAISS-based RAG for fast vector similarity search."""
-    def __init__(self):
-        self.embedder = SentenceTransformer('BAAI/bge-code-large')
-        self.dimension = 1024
-        self.faiss_index = faiss.IndexFlatIP(self.dimension)
+    """
+    FAISS-based RAG for fast vector similarity search.
+
+    Vectors are keyed by the chunk 'id', so re-indexing only removes changed
+    or deleted chunks and adds new ones. With `index_path` the index is saved
+    after every change and memory-mapped by load(). See vector_index for the
+    available index types.
+    """
+    def __init__(self, embedder=None, index_type="auto", index_path=None, nprobe=16, ef_search=64):
+        self.embedder = embedder or EmbeddingService.shared()
+        self.vectors = FaissIndex(index_type, nprobe=nprobe, ef_search=ef_search)
+        self.index_path = index_path
         self.id_to_doc = {}
+        # vector ID -> content hash of the chunk it was built from
+        self._hashes = {}
 
-    def index(self, documents):
-        if documents:
-            chunks = [doc['content'] for doc in documents]
-            embeddings = self.embedder.encode(chunks)
-            self.faiss_index.add(embeddings)
-            for i, doc in enumerate(documents):
-                self.id_to_doc[i] = doc
+    @staticmethod
+    def _vector_id(key):
+        """Stable non-negative int64 for a chunk ID."""
+        digest = hashlib.blake2b(str(key).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") >> 1
 
-    def retrieve(self, query, top_k=5):
-        query_emb = self.embedder.encode([query])[0].reshape(1, -1)
-        distances, indices = self.faiss_index.search(query_emb, top_k)
-        retrieved = []
-        for idx, dist in zip(indices[0], distances[0]):
-            if idx != -1:
-                sim = dist
-                retrieved.append((self.id_to_doc[idx], sim))
-        return retrieved
+    @staticmethod
+    def _content_hash(content):
+        return int.from_bytes(hashlib.blake2b(content.encode(), digest_size=8).digest(), "little") >> 1
+
+    def reset(self):
+        self.vectors.reset()
+        self.id_to_doc = {}
+        self._hashes = {}
+
+    def load(self):
+        """Attach the index saved at `index_path` (memory-mapped). Returns False if there is none."""
+        if not self.index_path or not os.path.exists(self.index_path + ".ids.npz"):
+            return False
+        if not self.vectors.load(self.index_path):
+            return False
+        saved = np.load(self.index_path + ".ids.npz")
+        self._hashes = dict(zip(saved["ids"].tolist(), saved["hashes"].tolist()))
+        return True
+
+    def save(self):
+        self.vectors.save(self.index_path)
+        ids = np.fromiter(self._hashes.keys(), dtype=np.int64, count=len(self._hashes))
+        hashes = np.fromiter(self._hashes.values(), dtype=np.int64, count=len(self._hashes))
+        tmp = self.index_path + ".ids.tmp.npz"
+        np.savez(tmp, ids=ids, hashes=hashes)
+        os.replace(tmp, self.index_path + ".ids.npz")
+
+    def index(self, documents, embeddings=None):
+        """
+        Sync the index to exactly these documents. Only new or changed chunks
+        are embedded (when `embeddings` is not given) and added; the index is
+        rebuilt when its type no longer suits the corpus size.
+        """
+        rows = {}
+        hashes = {}
+        for i, doc in enumerate(documents):
+            vid = self._vector_id(doc.get('id', i))
+            rows[vid] = i
+            hashes[vid] = self._content_hash(doc['content'])
+        self.id_to_doc = {vid: documents[i] for vid, i in rows.items()}
+        if not documents:
+            self.vectors.reset()
+            self._hashes = {}
+            return
+
+        def vectors_for(vids):
+            positions = [rows[vid] for vid in vids]
+            if embeddings is not None:
+                return np.asarray(embeddings, dtype=np.float32)[positions]
+            return np.asarray(self.embedder.encode([documents[i]['content'] for i in positions]), dtype=np.float32)
+
+        if self.vectors.needs_rebuild(len(rows)):
+            vids = list(rows)
+            self.vectors.build(vids, vectors_for(vids))
+        else:
+            stale = [vid for vid, h in self._hashes.items() if hashes.get(vid) != h]
+            added = [vid for vid, h in hashes.items() if self._hashes.get(vid) != h]
+            if not stale and not added:
+                self._hashes = hashes
+                return
+            self.vectors.remove(stale)
+            if added:
+                self.vectors.add(added, vectors_for(added))
+        self._hashes = hashes
+        if self.index_path:
+            self.save()
+
+    def remove(self, ids):
+        """Remove documents by their 'id'."""
+        vids = [self._vector_id(key) for key in ids]
+        self.vectors.remove(vids)
+        for vid in vids:
+            self.id_to_doc.pop(vid, None)
+            self._hashes.pop(vid, None)
+
+    def retrieve(self, query, top_k=5, query_embedding=None):
+        if self.vectors.ntotal <= 0:
+            return []
+        query_emb = query_embedding if query_embedding is not None else self.embedder.encode_one(query)
+        return [
+            (self.id_to_doc[vid], sim) for vid, sim in self.vectors.search(query_emb, top_k)
+            if vid in self.id_to_doc
+        ]
 
 
 class HybridRAG:
-    """Hybrid RAG combining TF-IDF, Chroma, and FAISS for best retrieval."""
-    def __init__(self):
+    """
+    Hybrid RAG: a schema-first DDL lookup for the tables the query references,
+    followed by TF-IDF, Chroma, FAISS and query-pattern (AST shape) retrieval
+    run concurrently and merged with rank-based fusion.
+    """
+    RETRIEVERS = ("tfidf", "chroma", "faiss", "pattern")
+
+    def __init__(self, embedder=None, fusion="rrf", weights=None, rrf_k=60, retriever_timeout=5.0,
+                 faiss_index_type=None, concurrency=None):
+        """
+        Args:
+            embedder: shared EmbeddingService (defaults to the process-wide one)
+            fusion: 'rrf' (reciprocal rank fusion) or 'weighted' (weighted sum
+                of per-retriever min-max normalized scores)
+            weights: optional {'tfidf': w, 'chroma': w, 'faiss': w, 'pattern': w}
+            rrf_k: RRF damping constant
+            retriever_timeout: seconds each retriever may run (counted from when it
+                starts, with as long again to get a thread); slower ones are skipped
+            faiss_index_type: one of vector_index.INDEX_TYPES (default: SQLCLEAN_FAISS_INDEX
+                or 'auto', which picks by corpus size)
+            concurrency: retrieve() calls expected at once; the retriever pool gets
+                a thread per retriever for each (default: SQLCLEAN_RETRIEVE_CONCURRENCY or 8)
+        """
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        # One embedding service feeds both vector backends
+        self.embedder = embedder or EmbeddingService.shared()
         self.tfidf_rag = TFIDFRAG()
-        self.chroma_rag = ChromaRAG()
-        self.faiss_rag = FAISSRAG()
+        self.chroma_rag = ChromaRAG(self.embedder)
+        self.faiss_rag = FAISSRAG(self.embedder, faiss_index_type or os.environ.get("SQLCLEAN_FAISS_INDEX", "auto"))
+        self.schema_rag = SchemaRAG()
+        self.pattern_rag = PatternRAG()
+        self.fusion = fusion
+        self.weights = {name: 1.0 for name in self.RETRIEVERS}
+        self.weights.update(weights or {})
+        self.rrf_k = rrf_k
+        self.retriever_timeout = retriever_timeout
+        self.concurrency = concurrency or RETRIEVE_CONCURRENCY
         self.documents = []
+        self._latencies = {name: deque(maxlen=1000) for name in self.RETRIEVERS}
+        self._pool = self._new_pool()
+        self._pool_lock = threading.Lock()
+        self._store = None
+        self._loaded = False
 
     def index_directory(self, repo_path):
-        """Index all .md and .sql files in the given directory recursively."""
-        patterns = ['**/*.md', '**/*.sql']
-        files = []
-        for pattern in patterns:
-            files.extend(glob.glob(os.path.join(repo_path, pattern), recursive=True))
+        """
+        Index all .md and .sql files in the given directory recursively.
 
-        self.documents = []
-        for file_path in files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # Chunk the content into smaller pieces, e.g., by paragraphs or fixed size
-                    chunks = self._chunk_text(content, chunk_size=500)
-                    for chunk in chunks:
-                        self.documents.append({
-                            'content': chunk,
-                            'source': file_path
-                        })
-            except Exception as e:
-                print(f"Error reading {file_path}: {e}")
+        Chunks and embeddings are persisted in an IndexStore, so only added,
+        changed or deleted files are re-read and re-embedded. If nothing
+        changed since the last call for the same repository, the backends
+        are left untouched.
+        """
+        if self._store is None or self._store.repo_path != repo_path:
+            if self._store is not None:
+                self._store.close()
+            self._store = IndexStore(repo_path, embedding_key=self.embedder.model_name)
+            self._loaded = False
+            # The FAISS index lives next to the chunk store and is memory-mapped on reuse
+            self.faiss_rag.index_path = f"{os.path.splitext(self._store.db_path)[0]}.{self.faiss_rag.vectors.index_type}.faiss"
+            self.faiss_rag.reset()
+            self.faiss_rag.load()
+
+        # Schema and pattern stages: cheap, re-parse only changed files
+        with tracing.span("hybrid.schema_index"):
+            self.schema_rag.index_directory(repo_path)
+        with tracing.span("hybrid.pattern_index"):
+            self.pattern_rag.index_directory(repo_path)
 
-        if self.documents:
+        with tracing.span("hybrid.sync") as phase:
+            changed = self._store.sync(
+                chunker=chunk_document,
+                embed_fn=self.embedder.encode
+            )
+            phase.set("changed", changed)
+        if self._loaded and not changed:
+            return
+
+        # Stream stored chunks into Chroma batch by batch instead of in one call
+        documents = []
+        batches = []
+        with tracing.span("hybrid.load"):
+            self.chroma_rag.reset()
+            for docs, embeddings in self._store.iter_batches():
+                self.chroma_rag.index(docs, embeddings)
+                documents.extend(docs)
+                batches.append(embeddings)
+        self.documents = documents
+        with tracing.span("hybrid.build.tfidf", chunks=len(self.documents)):
             self.tfidf_rag.index(self.documents)
-            self.chroma_rag.index(self.documents)
-            self.faiss_rag.index(self.documents)
+        with tracing.span("hybrid.build.vector", chunks=len(self.documents)):
+            embeddings = np.vstack(batches) if batches and all(b is not None for b in batches) else None
+            del batches
+            # Syncs by chunk ID: unchanged vectors (and a mapped index) are kept
+            self.faiss_rag.index(self.documents, embeddings)
+        self._loaded = True
+
+    def index_texts(self, texts):
+        """
+        Index in-memory files, {source: text} (e.g. web uploads), without an
+        IndexStore or any disk round-trip. Embeddings still go through the
+        embedder's content-hash cache.
+        """
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        self._loaded = False
+        self.faiss_rag.index_path = None
 
-    def _chunk_text(self, text, chunk_size=500):
-        """Simple text chunking by characters."""
-        chunks = []
-        for i in range(0, len(text), chunk_size):
-            chunks.append(text[i:i+chunk_size])
-        return chunks
+        with tracing.span("hybrid.schema_index"):
+            self.schema_rag.index_texts(texts)
+        with tracing.span("hybrid.pattern_index"):
+            self.pattern_rag.index_texts(texts)
+        documents = []
+        with tracing.span("hybrid.chunk", files=len(texts)):
+            for source, text in sorted(texts.items()):
+                for i, doc in enumerate(chunk_document(text, source)):
+                    doc['id'] = chunk_id(source, i)
+                    documents.append(doc)
+        tracing.count("index.chunks", len(documents))
+        embeddings = self.embedder.encode([doc['content'] for doc in documents]) if documents else None
+
+        self.documents = documents
+        with tracing.span("hybrid.build.tfidf", chunks=len(documents)):
+            self.tfidf_rag.index(documents)
+        with tracing.span("hybrid.build.vector", chunks=len(documents)):
+            self.chroma_rag.reset()
+            if documents:
+                self.chroma_rag.index(documents, embeddings)
+            self.faiss_rag.reset()
+            self.faiss_rag.index(documents, embeddings)
+
+    def close(self):
+        """Release the store, the Chroma collection and the retriever threads."""
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        self.chroma_rag.close()
+        self._pool.shutdown(wait=False)
 
     def retrieve(self, query, top_k=5):
-        """Retrieve top-k relevant documents using all three RAGs and merge results."""
+        """
+        Retrieve top-k relevant documents.
+
+        DDL for tables referenced by the query comes first (schema stage);
+        remaining slots are filled by fusing TF-IDF, Chroma, FAISS and query-pattern
+        results.
+        Per-retriever latencies of the call are recorded on the current trace
+        span as 'retriever_timings' (None for a failed retriever; timed-out
+        ones are also listed under 'timeouts').
+        """
         if len(self.documents) == 0:
             return []
 
-        all_results = []
+        with tracing.span("retrieve.schema") as phase:
+            schema_docs = self.schema_rag.retrieve(query, top_k)
+            phase.set("results", len(schema_docs))
+        if len(schema_docs) >= top_k:
+            return schema_docs
+        # CREATE TABLE chunks already covered by the schema stage
+        covered = {(doc['source'], doc['metadata']['table']) for doc in schema_docs}
 
-        # TF-IDF retrieval (keyword-based)
-        tfidf_results = self.tfidf_rag.retrieve(query, top_k)
-        all_results.extend(tfidf_results)
+        ranked, timings = self._fan_out(query, top_k)
+        tracing.current_span().set("retriever_timings", timings)
 
-        # Chroma retrieval (semantic via embeddings)
-        chroma_results = self.chroma_rag.retrieve(query, top_k)
-        all_results.extend(chroma_results)
+        # Fuse per-retriever rankings, keyed by stable chunk ID
+        fused = defaultdict(float)
+        docs = {}
+        for name, results in ranked.items():
+            weight = self.weights.get(name, 1.0)
+            if self.fusion == "rrf":
+                scores = [weight / (self.rrf_k + rank) for rank in range(1, len(results) + 1)]
+            else:
+                sims = np.array([float(sim) for _, sim in results])
+                spread = sims.max() - sims.min() if len(sims) else 0
+                normalized = (sims - sims.min()) / spread if spread > 0 else np.ones_like(sims)
+                scores = weight * normalized
+            for (doc, _), score in zip(results, scores):
+                meta = doc.get('metadata', {})
+                if 'create_table' in meta.get('statements', []) and any(
+                    (doc['source'], table) in covered for table in meta.get('tables', [])
+                ):
+                    continue
+                key = doc.get('id', (doc['source'], doc['content']))
+                fused[key] += score
+                docs.setdefault(key, doc)
 
-        # FAISS retrieval (fast vector similarity)
-        faiss_results = self.faiss_rag.retrieve(query, top_k)
-        all_results.extend(faiss_results)
+        sorted_keys = sorted(fused, key=fused.get, reverse=True)[:top_k - len(schema_docs)]
 
-        # Merger: Aggregate scores by document content and source
-        scores = defaultdict(list)
-        for doc, sim in all_results:
-            key = (doc['source'], doc['content'])
-            scores[key].append(sim)
+        # Return the indexed document dicts so chunk metadata is preserved
+        results = schema_docs + [docs[key] for key in sorted_keys]
 
-        # Average scores and sort
-        avg_scores = {key: np.mean(sims) for key, sims in scores.items()}
-        sorted_keys = sorted(avg_scores, key=avg_scores.get, reverse=True)[:top_k]
+        return results
 
-        results = []
-        for key in sorted_keys:
-            results.append({
-                'content': key[1],
-                'source': key[0]
-            })
+    def _new_pool(self):
+        return ThreadPoolExecutor(max_workers=len(self.RETRIEVERS) * self.concurrency,
+                                  thread_name_prefix="hybrid-rag")
+
+    def _fan_out(self, query, top_k):
+        """
+        Run the retrievers concurrently. Returns ({name: [(doc, score), ...]},
+        timings), timings being this call's per-retriever latencies.
+
+        Each retriever has its own deadline, retriever_timeout after it starts
+        running; one still queued for a thread after twice that long is
+        cancelled. A retriever that overruns cannot be stopped, so its pool is
+        replaced and shut down: the hung thread is abandoned instead of
+        stalling later calls, and work still queued on it is cancelled.
+        """
+        start = time.perf_counter()
+        started = {}
+
+        def timed(name, fn):
+            started[name] = time.perf_counter()
+            with tracing.span(f"retrieve.{name}") as phase:
+                results = fn()
+                phase.set("results", len(results))
+            return results, time.perf_counter() - started[name]
+
+        # Both vector retrievers ask the embedder for the same query; its
+        # cache makes sure the model only encodes it once.
+        tasks = {
+            "tfidf": lambda: self.tfidf_rag.retrieve(query, top_k),
+            "chroma": lambda: self.chroma_rag.retrieve(query, top_k, query_embedding=self.embedder.encode_one(query)),
+            "faiss": lambda: self.faiss_rag.retrieve(query, top_k, query_embedding=self.embedder.encode_one(query)),
+            "pattern": lambda: self.pattern_rag.retrieve_scored(query, top_k),
+        }
+        # Under the lock, so a pool is never submitted to after it is shut down
+        with self._pool_lock:
+            pool = self._pool
+            futures = {name: pool.submit(tracing.bind(timed), name, fn) for name, fn in tasks.items()}
+
+        pending = dict(futures)
+        timed_out = []
+        hung = False
+        while pending:
+            now = time.perf_counter()
+            deadlines = {name: self._deadline(started, name, start) for name in pending}
+            for name, deadline in deadlines.items():
+                future = pending[name]
+                if deadline > now or future.done():
+                    continue
+                if name not in started and not future.cancel():
+                    # Started just now: its own deadline applies from here
+                    started.setdefault(name, now)
+                    continue
+                del pending[name]
+                timed_out.append(name)
+                if name in started:
+                    hung = True
+                    tracing.count("retrieve.timeouts")
+                    print(f"{name} retriever timed out after {self.retriever_timeout}s", file=sys.stderr)
+                else:
+                    tracing.count("retrieve.queue_timeouts")
+                    print(f"{name} retriever got no thread within {2 * self.retriever_timeout}s", file=sys.stderr)
+            if not pending:
+                break
+            timeout = min(self._deadline(started, name, start) for name in pending) - now
+            done, _ = wait(pending.values(), timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+            pending = {name: future for name, future in pending.items() if future not in done}
+
+        if hung:
+            with self._pool_lock:
+                if self._pool is pool:
+                    self._pool = self._new_pool()
+                    pool.shutdown(wait=False, cancel_futures=True)
+
+        ranked = {}
+        timings = {}
+        for name, future in futures.items():
+            if name in timed_out:
+                timings[name] = None
+                continue
+            if future.cancelled():
+                # Queued on a pool another call retired after a hang
+                tracing.count("retrieve.errors")
+                print(f"{name} retriever cancelled: its pool was replaced", file=sys.stderr)
+                timings[name] = None
+                continue
+            try:
+                results, elapsed = future.result()
+            except Exception as e:
+                tracing.count("retrieve.errors")
+                print(f"{name} retriever failed: {e}", file=sys.stderr)
+                timings[name] = None
+                continue
+            ranked[name] = sorted(results, key=lambda r: r[1], reverse=True)
+            timings[name] = elapsed
+            self._latencies[name].append(elapsed)
+        timings["total"] = time.perf_counter() - start
+        timings["timeouts"] = timed_out
+        return ranked, timings
+
+    def _deadline(self, started, name, submitted):
+        """retriever_timeout after the retriever started, or twice that after submit while it is queued."""
+        if name in started:
+            return started[name] + self.retriever_timeout
+        return submitted + 2 * self.retriever_timeout
+
+    def latency_stats(self):
+        """p50/p99/max latency in seconds per retriever over recent calls."""
+        stats = {}
+        for name, samples in self._latencies.items():
+            if samples:
+                values = np.array(samples)
+                stats[name] = {
+                    "count": len(values),
+                    "p50": float(np.percentile(values, 50)),
+                    "p99": float(np.percentile(values, 99)),
+                    "max": float(values.max()),
+                }
+        return stats
+
+
+# Global instance for hybrid retrieval, built on first attribute access
+_hybrid_rag_instance = None
 
-        return results
 
+def __getattr__(name):
+    global _hybrid_rag_instance
+    if name == "hybrid_rag_instance":
+        if _hybrid_rag_instance is None:
+            _hybrid_rag_instance = HybridRAG()
+        return _hybrid_rag_instance
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Global instance for hybrid retrieval
-hybrid_rag_instance = HybridRAG()
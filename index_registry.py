@@ -0,0 +1,286 @@
+"""
+Registry of built RAG indexes, keyed by (strategy, repository).
+
+RAGFactory.create_rag keeps one instance per strategy, so alternating
+between repositories rebuilds it every time. The registry keeps one warm
+index per (strategy, real repository path) instead:
+- get() returns the entry for a repository, building it on first use and
+  re-syncing it (incrementally) at most every REFRESH_INTERVAL seconds
+- entries are evicted least recently used once their estimated size
+  exceeds the budget (SQLCLEAN_INDEX_BUDGET_MB, default 2048); evicted
+  backends are closed
+- a background thread keeps the most frequently used repositories fresh,
+  and rebuilds evicted ones when there is room again, so requests rarely
+  wait for indexing
+
+    rag = get_index_registry().get(RAGStrategy.HYBRID, "sqlSchema/education")
+    docs = rag.retrieve(sql, top_k=5)
+"""
+
+import contextlib
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+DEFAULT_MAX_BYTES = int(os.environ.get("SQLCLEAN_INDEX_BUDGET_MB", 2048)) * 1024 * 1024
+# Re-check a repository for changed files at most this often (seconds)
+REFRESH_INTERVAL = 2.0
+PREWARM_INTERVAL = 30.0
+# Repositories used at least this often are kept warm in the background
+PREWARM_MIN_USES = 3
+PREWARM_TOP = 8
+
+
+def repo_identity(repo_path):
+    """Key part for a repository: its real path, so aliases and symlinks share one index."""
+    return os.path.realpath(repo_path)
+
+
+def estimate_bytes(rag):
+    """Rough resident size of an indexed backend: chunk text plus stored vectors."""
+    documents = getattr(rag, "documents", [])
+    size = sum(len(doc.get("content", "")) for doc in documents) * 3
+    vectors = getattr(getattr(rag, "faiss_rag", None), "vectors", None)
+    if vectors is not None and vectors.index is not None:
+        # FAISS and Chroma each hold a float32 copy
+        size += 2 * vectors.index.ntotal * vectors.index.d * 4
+    return size
+
+
+class ReadWriteLock:
+    """
+    Any number of readers or one writer. A waiting writer holds back new
+    readers, so a steady stream of retrievals cannot starve a refresh.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+class WarmIndex:
+    """
+    An indexed RAG backend for one (strategy, repository).
+
+    Retrievals run concurrently under the read side of a reader/writer
+    lock; a refresh takes the write side, so it never races a retrieve
+    and only blocks retrievals while it actually re-syncs. Usable wherever
+    a RAG backend is expected.
+    """
+
+    def __init__(self, strategy, repo_path):
+        from rag_config import RAGFactory
+        self.strategy = strategy
+        self.repo_path = repo_path
+        self.rag = RAGFactory.get_rag_class(strategy)()
+        self.lock = ReadWriteLock()
+        self.indexed_at = 0.0
+        self.size = 0
+        self.closed = False
+
+    @property
+    def documents(self):
+        return self.rag.documents
+
+    def _due(self):
+        return time.monotonic() - self.indexed_at > REFRESH_INTERVAL
+
+    def refresh(self, force=False):
+        if not (force or self.closed or self._due()):
+            # Nothing to do: don't hold back retrievals for the write lock
+            return
+        with self.lock.write():
+            if self.closed:
+                # Evicted while a caller still held it: start over
+                from rag_config import RAGFactory
+                self.rag = RAGFactory.get_rag_class(self.strategy)()
+                self.closed = False
+                force = True
+            if force or self._due():
+                self.rag.index_directory(self.repo_path)
+                self.indexed_at = time.monotonic()
+                self.size = estimate_bytes(self.rag)
+
+    def index_directory(self, repo_path):
+        self.refresh(force=True)
+
+    def retrieve(self, query, top_k=5):
+        if self.closed:
+            self.refresh()
+        with self.lock.read():
+            return self.rag.retrieve(query, top_k)
+
+    def close(self):
+        with self.lock.write():
+            close = getattr(self.rag, "close", None)
+            if close is not None:
+                close()
+            self.closed = True
+
+
+class IndexRegistry:
+    """Thread-safe LRU of WarmIndex entries bounded by estimated memory."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, prewarm_interval=PREWARM_INTERVAL):
+        self.max_bytes = max_bytes
+        self.prewarm_interval = prewarm_interval
+        self._entries = OrderedDict()
+        self._uses = Counter()
+        # Last known size of every repository seen, including evicted ones
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._prewarmer = None
+        self._stop = threading.Event()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "prewarms": 0}
+
+    def get(self, strategy, repo_path, refresh=True):
+        """Return the (refreshed) WarmIndex for a repository, building it if needed."""
+        key = (strategy, repo_identity(repo_path))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = WarmIndex(strategy, key[1])
+                self.stats["misses"] += 1
+            else:
+                self.stats["hits"] += 1
+            self._entries.move_to_end(key)
+            self._uses[key] += 1
+        if refresh:
+            entry.refresh()
+            self._sized(key, entry)
+        self._start_prewarmer()
+        return entry
+
+    def _sized(self, key, entry):
+        with self._lock:
+            self._sizes[key] = entry.size
+        self._evict(keep=key)
+
+    def _evict(self, keep):
+        evicted = []
+        with self._lock:
+            total = sum(entry.size for entry in self._entries.values())
+            for key in list(self._entries):
+                if total <= self.max_bytes:
+                    break
+                # The entry just used always stays, even if it alone is over budget
+                if key == keep:
+                    continue
+                entry = self._entries.pop(key)
+                total -= entry.size
+                evicted.append(entry)
+            self.stats["evictions"] += len(evicted)
+        for entry in evicted:
+            print(f"Evicting {entry.strategy.value} index of {entry.repo_path}", file=sys.stderr)
+            entry.close()
+
+    def prewarm(self, strategy, repo_path):
+        """Build or refresh an index on a background thread."""
+        thread = threading.Thread(
+            target=self._prewarm_one, args=((strategy, repo_identity(repo_path)),),
+            name="sqlclean-prewarm", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _prewarm_one(self, key):
+        try:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = WarmIndex(*key)
+            entry.refresh()
+            self._sized(key, entry)
+            self.stats["prewarms"] += 1
+        except Exception as e:
+            print(f"Prewarming {key[1]} failed: {e}", file=sys.stderr)
+
+    def _start_prewarmer(self):
+        if self.prewarm_interval and self._prewarmer is None:
+            with self._lock:
+                if self._prewarmer is None:
+                    self._prewarmer = threading.Thread(target=self._prewarm_loop, name="sqlclean-prewarm",
+                                                       daemon=True)
+                    self._prewarmer.start()
+
+    def _prewarm_loop(self):
+        while not self._stop.wait(self.prewarm_interval):
+            with self._lock:
+                hot = [key for key, uses in self._uses.most_common(PREWARM_TOP) if uses >= PREWARM_MIN_USES]
+                resident = sum(entry.size for entry in self._entries.values())
+                todo = []
+                for key in hot:
+                    if key in self._entries:
+                        todo.append(key)
+                    elif resident + self._sizes.get(key, 0) <= self.max_bytes:
+                        # Evicted earlier, but there is room for it again
+                        todo.append(key)
+                        resident += self._sizes.get(key, 0)
+            for key in todo:
+                if self._stop.is_set():
+                    return
+                self._prewarm_one(key)
+
+    def stop(self):
+        self._stop.set()
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def format_stats(self):
+        return (
+            f"{len(self.entries())} indexes, {self.total_bytes() / 2**20:.1f} / {self.max_bytes / 2**20:.0f} MB, "
+            f"{self.stats['hits']} hits, {self.stats['misses']} misses, {self.stats['evictions']} evictions, "
+            f"{self.stats['prewarms']} prewarms"
+        )
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_index_registry():
+    """The process-wide registry, created on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = IndexRegistry()
+        return _registry
@@ -0,0 +1,212 @@
+"""
+Persistent, incremental on-disk index store.
+
+Chunks and embeddings are stored per file in a small SQLite database keyed by
+repository path. On re-index only files whose size/mtime changed are re-read;
+files whose content hash is unchanged are reused as-is, and only added,
+changed or deleted files touch their own rows. Files are found, read,
+chunked and embedded in bounded batches (see ingest).
+"""
+
+import os
+import json
+import hashlib
+import sqlite3
+import numpy as np
+from ingest import DEFAULT_PATTERNS, BATCH_CHUNKS, walk_files, load_files, iter_batches
+import tracing
+
+CACHE_DIR = os.environ.get(
+    "SQLCLEAN_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "sqlclean")
+)
+STORE_VERSION = "3"
+INDEX_PATTERNS = DEFAULT_PATTERNS
+
+
+def file_sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunk_id(rel_path, ord):
+    """Stable 63-bit integer ID for the ord-th chunk of a file."""
+    digest = hashlib.blake2b(f"{rel_path}\0{ord}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
+
+
+class IndexStore:
+    """Per-repository store of file stats, chunks and (optional) embeddings."""
+
+    def __init__(self, repo_path, embedding_key=None, cache_dir=None):
+        self.repo_path = repo_path
+        self.embedding_key = embedding_key or ""
+        root = os.path.abspath(repo_path)
+        store_key = hashlib.sha256(f"{root}\0{self.embedding_key}".encode()).hexdigest()[:16]
+        store_dir = os.path.join(cache_dir or CACHE_DIR, "index")
+        os.makedirs(store_dir, exist_ok=True)
+        self.db_path = os.path.join(store_dir, f"{store_key}.sqlite")
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._init_schema(root)
+
+    def _init_schema(self, root):
+        cur = self.conn.cursor()
+        cur.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        meta = dict(cur.execute("SELECT key, value FROM meta").fetchall())
+        expected = {"version": STORE_VERSION, "repo": root, "embedding_key": self.embedding_key}
+        if any(meta.get(k) != v for k, v in expected.items()):
+            # Format or embedding model changed: start from scratch
+            cur.execute("DROP TABLE IF EXISTS files")
+            cur.execute("DROP TABLE IF EXISTS chunks")
+            cur.execute("DELETE FROM meta")
+            cur.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", expected.items())
+        cur.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, sha256 TEXT)"
+        )
+        cur.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "path TEXT, ord INTEGER, content TEXT, metadata TEXT, embedding BLOB, "
+            "PRIMARY KEY (path, ord))"
+        )
+        self.conn.commit()
+
+    def scan(self, patterns=INDEX_PATTERNS):
+        """Stat walk of the repository (honouring .gitignore). Returns {relative_path: (mtime_ns, size)}."""
+        return {rel: (mtime_ns, size) for rel, mtime_ns, size in walk_files(self.repo_path, patterns)}
+
+    def sync(self, chunker, embed_fn=None, patterns=INDEX_PATTERNS, workers=None):
+        """
+        Bring the store up to date with the repository.
+
+        Changed files are read and chunked by `workers` processes (see
+        ingest.load_files) and embedded and written in batches, so memory
+        stays flat however many files changed.
+
+        Args:
+            chunker: picklable callable(text, source) -> list of document dicts
+            embed_fn: optional callable(list of str) -> 2D array of embeddings
+            patterns: file name patterns to index
+            workers: reader processes (default: CPU count)
+
+        Returns:
+            True if any file was added, changed or deleted.
+        """
+        with tracing.span("index.scan") as phase:
+            current = self.scan(patterns)
+            phase.set("files", len(current))
+        tracing.count("index.files_scanned", len(current))
+        cur = self.conn.cursor()
+        stored = {
+            path: (mtime_ns, size, sha)
+            for path, mtime_ns, size, sha in cur.execute(
+                "SELECT path, mtime_ns, size, sha256 FROM files"
+            )
+        }
+
+        changed = False
+        for rel in stored.keys() - current.keys():
+            cur.execute("DELETE FROM files WHERE path = ?", (rel,))
+            cur.execute("DELETE FROM chunks WHERE path = ?", (rel,))
+            changed = True
+
+        todo = [
+            rel for rel, (mtime_ns, size) in current.items()
+            if rel not in stored or stored[rel][:2] != (mtime_ns, size)
+        ]
+        known = {rel: stored[rel][2] for rel in todo if rel in stored}
+        for batch in iter_batches(load_files(self.repo_path, todo, chunker, known, workers)):
+            texts = [doc['content'] for _, _, docs in batch if docs for doc in docs]
+            embeddings = None
+            if embed_fn is not None and texts:
+                with tracing.span("index.embed", files=len(batch), chunks=len(texts)):
+                    embeddings = np.asarray(embed_fn(texts), dtype=np.float32)
+            offset = 0
+            for rel, sha, docs in batch:
+                mtime_ns, size = current[rel]
+                if docs is None:
+                    # Touched but not modified: only refresh the stat row
+                    cur.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?",
+                        (mtime_ns, size, rel)
+                    )
+                    continue
+                tracing.count("index.files_changed")
+                tracing.count("index.chunks", len(docs))
+                cur.execute("DELETE FROM chunks WHERE path = ?", (rel,))
+                cur.executemany(
+                    "INSERT INTO chunks (path, ord, content, metadata, embedding) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            rel, i, doc['content'],
+                            json.dumps(doc.get('metadata', {})),
+                            embeddings[offset + i].tobytes() if embeddings is not None else None
+                        )
+                        for i, doc in enumerate(docs)
+                    ]
+                )
+                offset += len(docs)
+                cur.execute(
+                    "INSERT OR REPLACE INTO files (path, mtime_ns, size, sha256) VALUES (?, ?, ?, ?)",
+                    (rel, mtime_ns, size, sha)
+                )
+                changed = True
+            # Commit per batch so a huge first index does not build one giant transaction
+            self.conn.commit()
+
+        self.conn.commit()
+        return changed
+
+    def iter_batches(self, batch_size=BATCH_CHUNKS):
+        """
+        Stream stored chunks in batches.
+
+        Yields:
+            (documents, embeddings) per batch of at most `batch_size` chunks,
+            where each document carries a stable integer 'id' and embeddings
+            is a 2D float32 array aligned with documents, or None if the
+            batch has no stored embeddings.
+        """
+        rows = self.conn.execute(
+            "SELECT path, ord, content, metadata, embedding FROM chunks ORDER BY path, ord"
+        )
+        while True:
+            batch = rows.fetchmany(batch_size)
+            if not batch:
+                return
+            documents = []
+            vectors = []
+            for rel, ord, content, metadata, embedding in batch:
+                doc = {
+                    'id': chunk_id(rel, ord),
+                    'content': content,
+                    'source': os.path.join(self.repo_path, rel)
+                }
+                meta = json.loads(metadata) if metadata else {}
+                if meta:
+                    doc['metadata'] = meta
+                documents.append(doc)
+                if embedding is not None:
+                    vectors.append(np.frombuffer(embedding, dtype=np.float32))
+            embeddings = np.vstack(vectors) if vectors and len(vectors) == len(documents) else None
+            yield documents, embeddings
+
+    def load(self):
+        """
+        Load all stored chunks.
+
+        Returns:
+            (documents, embeddings) as for iter_batches, over the whole store.
+        """
+        documents = []
+        batches = []
+        complete = True
+        for docs, embeddings in self.iter_batches():
+            documents.extend(docs)
+            complete = complete and embeddings is not None
+            if complete:
+                batches.append(embeddings)
+        embeddings = np.vstack(batches) if documents and complete else None
+        return documents, embeddings
+
+    def close(self):
+        self.conn.close()
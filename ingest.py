@@ -0,0 +1,312 @@
+"""
+Streaming repository ingestion.
+
+walk_files() is an os.scandir walker that honours .gitignore files (at any
+depth), skips VCS/vendored directories and files above a size limit.
+load_files() reads and chunks files on a pool of worker processes with a
+bounded number of files in flight, and iter_batches() groups the results into
+batches of at most `batch_chunks` chunks, so a repository of any size is
+indexed with flat memory use:
+
+    for batch in iter_batches(load_files(repo, walk_files(repo), chunk_document)):
+        backend.add(batch)
+"""
+
+import fnmatch
+import hashlib
+import multiprocessing
+import os
+import re
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import tracing
+
+DEFAULT_PATTERNS = ("*.md", "*.sql")
+# Files larger than this are generated dumps rather than hand-written schema/docs
+MAX_FILE_BYTES = int(os.environ.get("SQLCLEAN_MAX_FILE_BYTES", 2 * 1024 * 1024))
+ALWAYS_IGNORED = frozenset({
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".tox", ".mypy_cache",
+})
+BATCH_CHUNKS = 512
+# Below this many files, worker start-up costs more than it saves
+PARALLEL_MIN_FILES = 32
+
+
+def _translate(pattern):
+    """Regex body for a gitignore glob (relative to the .gitignore's directory)."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+class GitIgnore:
+    """The rules of one .gitignore file, applied to paths relative to its directory."""
+
+    def __init__(self, lines):
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            # A slash anywhere but the end anchors the pattern to this directory
+            anchored = "/" in line
+            body = _translate(line.lstrip("/"))
+            regex = re.compile(body if anchored else f"(?:.*/)?{body}")
+            self.rules.append((regex, negate, dir_only))
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                return cls(f.readlines())
+        except OSError:
+            return None
+
+    def match(self, rel_path, is_dir):
+        """True (ignored), False (re-included by a ! rule) or None (no rule applies)."""
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(rel_path):
+                result = not negate
+        return result
+
+
+def _ignored(stack, rel_path, is_dir):
+    # Deeper .gitignore files override shallower ones
+    for base, rules in reversed(stack):
+        result = rules.match(rel_path[len(base):], is_dir)
+        if result is not None:
+            return result
+    return False
+
+
+def walk_files(repo_path, patterns=DEFAULT_PATTERNS, max_bytes=MAX_FILE_BYTES, use_gitignore=True):
+    """
+    Yield (relative_path, mtime_ns, size) for files under repo_path whose
+    name matches one of `patterns` (fnmatch, e.g. '*.sql'), in sorted order.
+    """
+    patterns = [p[3:] if p.startswith("**/") else p for p in patterns]
+    # (directory relative path with trailing slash, rules of the .gitignore files above it)
+    pending = [("", [])]
+    while pending:
+        rel_dir, rules = pending.pop()
+        directory = os.path.join(repo_path, rel_dir) if rel_dir else repo_path
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f"Error reading {directory}: {e}", file=sys.stderr)
+            continue
+        if use_gitignore and any(e.name == ".gitignore" for e in entries):
+            local = GitIgnore.from_file(os.path.join(directory, ".gitignore"))
+            if local is not None:
+                rules = rules + [(rel_dir, local)]
+
+        subdirs = []
+        for entry in entries:
+            rel = rel_dir + entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in ALWAYS_IGNORED and not _ignored(rules, rel, True):
+                        subdirs.append((rel + "/", rules))
+                    continue
+                if not any(fnmatch.fnmatch(entry.name, p) for p in patterns) or not entry.is_file():
+                    continue
+                if _ignored(rules, rel, False):
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            if max_bytes and st.st_size > max_bytes:
+                tracing.count("index.files_skipped")
+                print(f"Skipping {rel}: {st.st_size} bytes exceeds the {max_bytes} byte limit", file=sys.stderr)
+                continue
+            yield rel.replace("/", os.sep), st.st_mtime_ns, st.st_size
+        # Depth first, in name order
+        pending.extend(reversed(subdirs))
+
+
+def read_and_chunk(file_path, chunker, known_sha=None):
+    """
+    Read and chunk one file. Returns (sha256, docs); docs is None when the
+    content hash equals `known_sha` (the file was touched but not modified).
+    """
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    sha = hashlib.sha256(raw).hexdigest()
+    if sha == known_sha:
+        return sha, None
+    return sha, chunker(raw.decode("utf-8"), file_path)
+
+
+_executors = {}                 # worker count -> ProcessPoolExecutor
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    """
+    Process pool shared across calls, so a warm server pays the start-up once.
+
+    Pools are kept per worker count: a caller asking for a different count
+    never shuts down a pool another load_files call is still submitting to.
+    """
+    with _executor_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            # spawn, not fork: callers (server, HybridRAG) run thread pools
+            executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            _executors[workers] = executor
+        return executor
+
+
+def _reset_executor(executor):
+    """Drop a broken pool, so the next call with its worker count starts a fresh one."""
+    with _executor_lock:
+        for workers, pooled in list(_executors.items()):
+            if pooled is executor:
+                del _executors[workers]
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def load_files(repo_path, files, chunker, known=None, workers=None):
+    """
+    Read and chunk files in parallel, yielding results in input order.
+
+    Args:
+        files: iterable of relative paths, or of (relative_path, ...) tuples
+        chunker: picklable callable(text, source) -> list of document dicts
+        known: optional {relative_path: sha256}; unchanged files yield docs=None
+        workers: worker processes (default: CPU count; 1 reads in-process)
+
+    Yields:
+        (relative_path, sha256, docs). Files that cannot be read are reported
+        on stderr and skipped.
+    """
+    known = known or {}
+    workers = workers or os.cpu_count() or 1
+    files = iter(files)
+    head = []
+    if workers > 1:
+        # Small jobs are not worth the process start-up
+        for item in files:
+            head.append(item)
+            if len(head) >= PARALLEL_MIN_FILES:
+                break
+        if len(head) < PARALLEL_MIN_FILES:
+            workers = 1
+
+    paths = (item[0] if isinstance(item, tuple) else item for item in _chain(head, files))
+    if workers == 1:
+        yield from _load_serial(repo_path, paths, chunker, known)
+        return
+
+    executor = _get_executor(workers)
+    in_flight = deque()
+    # Bounded look-ahead keeps memory flat however many files there are
+    limit = workers * 4
+    try:
+        for rel in paths:
+            file_path = os.path.join(repo_path, rel)
+            in_flight.append((rel, file_path, executor.submit(read_and_chunk, file_path, chunker, known.get(rel))))
+            tracing.count("index.files_parallel")
+            while len(in_flight) >= limit:
+                result = _result(in_flight[0])
+                in_flight.popleft()
+                if result is not None:
+                    yield result
+        while in_flight:
+            result = _result(in_flight[0])
+            in_flight.popleft()
+            if result is not None:
+                yield result
+    except BrokenProcessPool as e:
+        # Workers could not start (or died): finish in this process
+        print(f"Parallel indexing failed ({e}); reading files in-process", file=sys.stderr)
+        _reset_executor(executor)
+        pending = [rel for rel, _, _ in in_flight]
+        yield from _load_serial(repo_path, _chain(pending, paths), chunker, known)
+
+
+def _load_serial(repo_path, paths, chunker, known):
+    for rel in paths:
+        file_path = os.path.join(repo_path, rel)
+        try:
+            with tracing.span("index.read", path=rel):
+                sha, docs = read_and_chunk(file_path, chunker, known.get(rel))
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}", file=sys.stderr)
+            continue
+        yield rel, sha, docs
+
+
+def _chain(head, rest):
+    yield from head
+    yield from rest
+
+
+def _result(pending):
+    rel, file_path, future = pending
+    try:
+        sha, docs = future.result()
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        print(f"Error reading {file_path}: {e}", file=sys.stderr)
+        return None
+    return rel, sha, docs
+
+
+def iter_batches(results, batch_chunks=BATCH_CHUNKS):
+    """Group load_files() results into lists holding at most ~batch_chunks chunks (whole files)."""
+    batch = []
+    size = 0
+    for result in results:
+        batch.append(result)
+        size += len(result[2] or ())
+        if size >= batch_chunks:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
@@ -0,0 +1,341 @@
+"""
+Query-pattern RAG: retrieval by SQL structure instead of text.
+
+Every query statement in a repository (.sql files, and ```sql blocks in
+Markdown, e.g. past queries and optimized examples) is reduced to the shape
+of its sqlglot AST, with table, column and literal values left out:
+- node-type n-grams: each node's type with up to NGRAM - 1 ancestor types
+  (e.g. Select/Where/EQ)
+- join graph: join kinds and ON-condition shapes, table count, and the
+  degree sequence of the equi-join graph of each SELECT
+- subquery nesting: depth and context (IN, EXISTS, FROM, ...) of every
+  nested SELECT
+
+The feature sets are summarized as MinHash signatures and indexed in banded
+LSH buckets, so a query only scores the shapes that share a bucket with it
+(sub-linear in the corpus) and the similarity estimate approximates the
+Jaccard similarity of the feature sets. Statements with identical shapes
+share one signature entry, which keeps large query logs cheap.
+
+    rag = PatternRAG()
+    rag.index_directory("queries/")
+    docs = rag.retrieve("SELECT ... WHERE id IN (SELECT ...)", top_k=5)
+"""
+
+import hashlib
+import re
+from collections import Counter, defaultdict
+import numpy as np
+from sqlglot import exp
+from chunking import split_statements, parse_statement
+from index_store import chunk_id
+from ingest import walk_files, load_files
+
+NGRAM = 3
+NUM_PERM = 64
+BANDS = 32
+# Matches below this estimated similarity are not returned
+MIN_SIMILARITY = 0.3
+# Join and subquery features are few next to the node n-grams; repeat them
+# so they carry weight in the Jaccard similarity
+STRUCTURE_WEIGHT = 3
+
+_PRIME = 4294967311  # smallest prime above 2**32
+_rng = np.random.RandomState(20240601)
+# Fixed permutations, so signatures computed in worker processes agree
+_A = _rng.randint(1, 2**32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2**32, size=NUM_PERM, dtype=np.uint64)
+
+_SQL_FENCE = re.compile(r"```sql[^\n]*\n(.*?)```", re.IGNORECASE | re.DOTALL)
+# Statements that are query patterns; DDL is left to the schema index
+_PATTERN_TYPES = (exp.Query, exp.Insert, exp.Update, exp.Delete, exp.Merge)
+
+
+def _condition_shape(condition):
+    if condition is None:
+        return "none"
+    if isinstance(condition, exp.And):
+        return "And" + "".join(sorted(type(part).__name__ for part in condition.flatten()))
+    return type(condition).__name__
+
+
+def _join_features(select, equalities):
+    features = []
+    joins = select.args.get("joins") or []
+    tables = len(joins) + (1 if select.args.get("from") else 0)
+    features.append(f"tables:{tables}")
+    for join in joins:
+        kind = " ".join(part for part in (join.side, join.kind) if part) or "INNER"
+        features.append(f"join:{kind}:{_condition_shape(join.args.get('on'))}")
+
+    # Equi-join graph between table aliases, from ON and WHERE equalities
+    edges = set()
+    for eq in equalities:
+        left, right = eq.left, eq.right
+        if isinstance(left, exp.Column) and isinstance(right, exp.Column) and left.table and right.table \
+                and left.table != right.table:
+            edges.add(frozenset((left.table, right.table)))
+    if edges:
+        degrees = Counter(alias for edge in edges for alias in edge)
+        features.append("join_graph:" + "-".join(str(d) for d in sorted(degrees.values())))
+    return features
+
+
+def _subquery_features(selects):
+    features = []
+    max_depth = 0
+    for select in selects:
+        depth = 0
+        parent = select.parent
+        context = None
+        while parent is not None:
+            if isinstance(parent, exp.Select):
+                depth += 1
+            elif context is None and not isinstance(parent, (exp.Subquery, exp.Paren)):
+                context = type(parent).__name__
+            parent = parent.parent
+        if depth:
+            features.append(f"subquery:{depth}:{context}")
+            max_depth = max(max_depth, depth)
+    features.append(f"nesting:{max_depth}")
+    return features
+
+
+def shape_features(expression, n=NGRAM):
+    """The set of shape features of a parsed statement (see the module docstring)."""
+    features = set()
+    selects = []
+    equalities = defaultdict(list)
+    # One pass over the tree: n-grams, and the SELECTs and equalities for the structure features
+    for node in expression.walk():
+        path = []
+        current = node
+        while current is not None and len(path) < n:
+            path.append(type(current).__name__)
+            current = current.parent
+        for k in range(1, len(path) + 1):
+            features.add("/".join(reversed(path[:k])))
+        if isinstance(node, exp.Select):
+            selects.append(node)
+        elif isinstance(node, exp.EQ):
+            equalities[id(node.find_ancestor(exp.Select))].append(node)
+
+    structure = _subquery_features(selects)
+    for select in selects:
+        structure.extend(_join_features(select, equalities[id(select)]))
+    for feature, count in Counter(structure).items():
+        for copy in range(count * STRUCTURE_WEIGHT):
+            features.add(f"{feature}#{copy}")
+    return features
+
+
+def minhash(features):
+    """MinHash signature (NUM_PERM uint32 values) of a feature set, or None if it is empty."""
+    if not features:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(f.encode(), digest_size=4).digest(), "big") for f in features),
+        dtype=np.uint64, count=len(features)
+    )
+    # a * h + b stays below 2**64 for 32-bit a, b and h
+    values = (_A[:, None] * hashes[None, :] + _B[:, None]) % np.uint64(_PRIME)
+    return values.min(axis=1).astype(np.uint32)
+
+
+def query_signature(sql):
+    """Signature of a query (all of its statements), or None if it does not parse."""
+    features = set()
+    for statement in split_statements(sql):
+        parsed = parse_statement(statement)
+        if parsed is not None:
+            features |= shape_features(parsed)
+    return minhash(features)
+
+
+def _pattern_expression(parsed):
+    if isinstance(parsed, exp.Create) and isinstance(parsed.args.get("expression"), exp.Query):
+        # CREATE VIEW / CREATE TABLE ... AS SELECT: the query is the pattern
+        return parsed.args["expression"]
+    return parsed if isinstance(parsed, _PATTERN_TYPES) else None
+
+
+def extract_patterns(content, source):
+    """
+    Query statements of a file as document dicts carrying their 'signature'.
+
+    .sql files contribute every query/DML statement; Markdown files the
+    statements of their ```sql blocks. Module-level so load_files can run it
+    in worker processes.
+    """
+    if source.lower().endswith(".sql"):
+        scripts = [content]
+    elif source.lower().endswith((".md", ".markdown")):
+        scripts = _SQL_FENCE.findall(content)
+    else:
+        return []
+    docs = []
+    for script in scripts:
+        for statement in split_statements(script):
+            parsed = parse_statement(statement)
+            pattern = _pattern_expression(parsed) if parsed is not None else None
+            if pattern is None:
+                continue
+            signature = minhash(shape_features(pattern))
+            if signature is None:
+                continue
+            docs.append({
+                'content': statement,
+                'source': source,
+                'metadata': {'type': 'pattern', 'statement': parsed.key, 'chunk': len(docs)},
+                'signature': signature,
+            })
+    return docs
+
+
+class PatternIndex:
+    """
+    MinHash LSH index: BANDS buckets of NUM_PERM / BANDS signature rows each.
+    Documents with the same signature share one entry.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.docs = {}
+        self._doc_shape = {}
+        self._shapes = {}
+        self._buckets = [defaultdict(set) for _ in range(bands)]
+
+    def _band_keys(self, signature):
+        return [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.docs
+
+    def add(self, doc_id, doc, signature):
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        shape = signature.tobytes()
+        entry = self._shapes.get(shape)
+        if entry is None:
+            entry = self._shapes[shape] = (signature, {})
+            for band, key in zip(self._buckets, self._band_keys(signature)):
+                band[key].add(shape)
+        entry[1][doc_id] = None
+        self.docs[doc_id] = doc
+        self._doc_shape[doc_id] = shape
+
+    def remove(self, doc_id):
+        shape = self._doc_shape.pop(doc_id, None)
+        if shape is None:
+            return
+        del self.docs[doc_id]
+        signature, members = self._shapes[shape]
+        members.pop(doc_id, None)
+        if not members:
+            del self._shapes[shape]
+            for band, key in zip(self._buckets, self._band_keys(signature)):
+                band[key].discard(shape)
+                if not band[key]:
+                    del band[key]
+
+    def clear(self):
+        self.__init__(self.bands * self.rows, self.bands)
+
+    def search(self, signature, top_k=5, min_similarity=MIN_SIMILARITY):
+        """Return [(doc, estimated similarity)] for the most similar shapes in the query's buckets."""
+        candidates = set()
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            candidates |= band.get(key, set())
+        if not candidates:
+            return []
+        shapes = list(candidates)
+        matrix = np.stack([self._shapes[shape][0] for shape in shapes])
+        similarity = (matrix == signature).mean(axis=1)
+        results = []
+        for i in np.argsort(-similarity, kind="stable"):
+            if similarity[i] < min_similarity or len(results) >= top_k:
+                break
+            for doc_id in self._shapes[shapes[i]][1]:
+                results.append((self.docs[doc_id], float(similarity[i])))
+                if len(results) >= top_k:
+                    break
+        return results
+
+
+class PatternRAG:
+    """Query-pattern RAG: past queries and examples whose AST shape resembles the query's."""
+
+    def __init__(self, min_similarity=MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self.index = PatternIndex()
+        self._files = {}
+
+    @property
+    def documents(self):
+        return list(self.index.docs.values())
+
+    def index_directory(self, repo_path, workers=None):
+        """Index all .sql and .md files under repo_path. Unchanged files are not re-read."""
+        files = {}
+        stamps = {}
+        known = {}
+        for rel, mtime_ns, size in walk_files(repo_path):
+            cached = self._files.get(rel)
+            if cached and cached[0] == (mtime_ns, size):
+                files[rel] = cached
+            else:
+                stamps[rel] = (mtime_ns, size)
+                if cached:
+                    known[rel] = cached[1]
+
+        for rel, sha, docs in load_files(repo_path, list(stamps), extract_patterns, known, workers):
+            if docs is None:
+                # Touched but not modified
+                files[rel] = (stamps[rel], sha, self._files[rel][2])
+                continue
+            self._remove_file(rel)
+            files[rel] = (stamps[rel], sha, self._add_file(rel, docs))
+        for rel in set(self._files) - set(files):
+            self._remove_file(rel)
+        self._files = files
+
+    def index_texts(self, texts):
+        """Index in-memory files, {source: text}."""
+        self.index.clear()
+        self._files = {}
+        for source, text in sorted(texts.items()):
+            self._files[source] = (None, None, self._add_file(source, extract_patterns(text, source)))
+
+    def _add_file(self, rel, docs):
+        ids = []
+        for i, doc in enumerate(docs):
+            doc_id = chunk_id(f"{rel}#pattern", i)
+            signature = doc.pop('signature')
+            doc['id'] = doc_id
+            self.index.add(doc_id, doc, signature)
+            ids.append(doc_id)
+        return ids
+
+    def _remove_file(self, rel):
+        cached = self._files.get(rel)
+        for doc_id in cached[2] if cached else []:
+            self.index.remove(doc_id)
+
+    def retrieve_scored(self, query, top_k=5):
+        """[(doc, estimated shape similarity)], most similar first."""
+        signature = query_signature(query)
+        if signature is None:
+            return []
+        return self.index.search(signature, top_k, self.min_similarity)
+
+    def retrieve(self, query, top_k=5):
+        return [
+            dict(doc, metadata=dict(doc['metadata'], similarity=round(similarity, 3)))
+            for doc, similarity in self.retrieve_scored(query, top_k)
+        ]
@@ -2,66 +2,114 @@
 RAG Strategy Configuration and Selection
 Allows switching between different RAG implementations:
 - simple: LocalRAG (TF-IDF only)
-- hybrid: HybridRAG (TF-IDF + Chroma + FAISS)
+- hybrid: HybridRAG (Schema lookup + TF-IDF + Chroma + FAISS + query patterns)
+- schema: SchemaRAG (DDL lookup for the tables a query references)
+- pattern: PatternRAG (past queries with a similar AST shape)
+
+Backends are registered by module and class name and only imported and
+built the first time a strategy is used, so importing this module never
+touches the ML stack. Indexes for specific repositories are kept in the
+IndexRegistry (see get_index), several at a time.
 """
 
+import importlib
+import threading
 from enum import Enum
-from rag_utils import LocalRAG as SimpleLocalRAG
-from hybrid_rag import HybridRAG, TFIDFRAG, ChromaRAG, FAISSRAG
 
 
 class RAGStrategy(Enum):
     SIMPLE = "simple"      # TF-IDF only
-    HYBRID = "hybrid"      # TF-IDF + Chroma + FAISS
+    HYBRID = "hybrid"      # Schema + TF-IDF + Chroma + FAISS + patterns
+    SCHEMA = "schema"      # AST-driven DDL lookup
+    PATTERN = "pattern"    # AST-shape similarity (MinHash LSH)
 
 
 class RAGFactory:
-    """Factory for creating RAG instances based on strategy."""
-    
+    """Lazy registry for creating RAG instances based on strategy."""
+
+    _registry = {
+        RAGStrategy.SIMPLE: ("rag_utils", "LocalRAG"),
+        RAGStrategy.HYBRID: ("hybrid_rag", "HybridRAG"),
+        RAGStrategy.SCHEMA: ("schema_index", "SchemaRAG"),
+        RAGStrategy.PATTERN: ("pattern_index", "PatternRAG"),
+    }
     _instances = {}
-    
+    _lock = threading.Lock()
+
+    @staticmethod
+    def register(strategy: RAGStrategy, module_name: str, class_name: str):
+        """Register (or replace) the backend class used for a strategy."""
+        with RAGFactory._lock:
+            RAGFactory._registry[strategy] = (module_name, class_name)
+            RAGFactory._instances.pop(strategy, None)
+
+    @staticmethod
+    def get_rag_class(strategy: RAGStrategy):
+        """Import and return the backend class for a strategy."""
+        if strategy not in RAGFactory._registry:
+            raise ValueError(f"Unknown RAG strategy: {strategy}")
+        module_name, class_name = RAGFactory._registry[strategy]
+        return getattr(importlib.import_module(module_name), class_name)
+
     @staticmethod
     def create_rag(strategy: RAGStrategy = RAGStrategy.HYBRID):
         """
         Create a RAG instance based on strategy.
-        
+
+        The backend module is imported and the instance built on first use;
+        later calls return the same instance.
+
         Args:
             strategy: RAGStrategy enum value
-            
+
         Returns:
-            RAG instance (LocalRAG for SIMPLE, HybridRAG for HYBRID)
+            RAG instance (LocalRAG for SIMPLE, HybridRAG for HYBRID, SchemaRAG for SCHEMA,
+            PatternRAG for PATTERN)
         """
-        if strategy not in RAGFactory._instances:
-            if strategy == RAGStrategy.SIMPLE:
-                RAGFactory._instances[strategy] = SimpleLocalRAG()
-            elif strategy == RAGStrategy.HYBRID:
-                RAGFactory._instances[strategy] = HybridRAG()
-            else:
-                raise ValueError(f"Unknown RAG strategy: {strategy}")
-        
-        return RAGFactory._instances[strategy]
-    
+        with RAGFactory._lock:
+            if strategy not in RAGFactory._instances:
+                RAGFactory._instances[strategy] = RAGFactory.get_rag_class(strategy)()
+            return RAGFactory._instances[strategy]
+
+    @staticmethod
+    def get_index(strategy: RAGStrategy, repo_path: str):
+        """
+        Return an indexed backend for one repository from the process-wide
+        IndexRegistry (one warm index per strategy and repository, LRU-evicted
+        under a memory budget). It is built on first use and re-synced with
+        the repository's files at most every few seconds.
+        """
+        from index_registry import get_index_registry
+        return get_index_registry().get(strategy, repo_path)
+
+    @staticmethod
+    def is_loaded(strategy: RAGStrategy):
+        """Whether an instance for the strategy has already been built."""
+        return strategy in RAGFactory._instances
+
     @staticmethod
     def get_rag_info(strategy: RAGStrategy):
         """Get information about a RAG strategy."""
         info = {
             RAGStrategy.SIMPLE: {
                 "name": "Simple TF-IDF RAG",
-                "components": ["TF-IDF Vectorizer"],
+                "components": ["BM25 inverted index"],
                 "use_case": "Keyword-based retrieval, lightweight, fast",
-                "dependencies": ["scikit-learn", "numpy"],
+                "dependencies": ["numpy"],
                 "pros": ["Fast", "Lightweight", "Works offline"],
                 "cons": ["Keyword-only", "No semantic understanding"]
             },
             RAGStrategy.HYBRID: {
                 "name": "Hybrid Multi-RAG",
                 "components": [
-                    "TF-IDF (keyword matching)",
+                    "Schema index (DDL of referenced tables)",
+                    "BM25 (keyword matching)",
                     "Chroma (semantic embeddings)",
-                    "FAISS (fast vector search)"
+                    "FAISS (fast vector search)",
+                    "Query patterns (AST shape similarity)"
                 ],
                 "use_case": "Best-of-both-worlds: keywords + semantics + speed",
-                "dependencies": ["scikit-learn", "chromadb", "sentence-transformers", "faiss-cpu"],
+                "dependencies": ["chromadb", "sentence-transformers", "faiss-cpu"],
                 "pros": [
                     "Combines keyword and semantic search",
                     "Handles synonyms well",
@@ -69,11 +117,38 @@ class RAGFactory:
                     "Score fusion for better results"
                 ],
                 "cons": ["Higher memory usage", "Slower indexing", "More dependencies"]
+            },
+            RAGStrategy.SCHEMA: {
+                "name": "Schema-first RAG",
+                "components": ["CREATE TABLE/INDEX/VIEW parser", "Foreign-key graph"],
+                "use_case": "Exact DDL for the tables a query references, plus FK neighbours",
+                "dependencies": ["sqlglot"],
+                "pros": ["No embeddings", "O(1) lookup per table", "Deterministic", "Works offline"],
+                "cons": ["Only uses DDL", "Needs parseable CREATE statements"]
+            },
+            RAGStrategy.PATTERN: {
+                "name": "Query-pattern RAG",
+                "components": [
+                    "AST shape fingerprints (node-type n-grams, join graph, subquery nesting)",
+                    "MinHash LSH index"
+                ],
+                "use_case": "Past queries and optimized examples structured like the input query",
+                "dependencies": ["sqlglot", "numpy"],
+                "pros": ["No embeddings", "Sub-linear lookup in large query logs", "Ignores table and column names"],
+                "cons": ["Needs example queries in the repository", "Ignores names and meaning"]
             }
         }
         return info.get(strategy, {})
 
 
-# Default instances
-default_rag = RAGFactory.create_rag(RAGStrategy.SIMPLE)
-hybrid_rag = RAGFactory.create_rag(RAGStrategy.HYBRID)
+# Default instances, built on first attribute access
+_DEFAULT_INSTANCES = {
+    "default_rag": RAGStrategy.SIMPLE,
+    "hybrid_rag": RAGStrategy.HYBRID,
+}
+
+
+def __getattr__(name):
+    if name in _DEFAULT_INSTANCES:
+        return RAGFactory.create_rag(_DEFAULT_INSTANCES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
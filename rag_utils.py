@@ -1,63 +1,80 @@
-import os
-import glob
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from chunking import chunk_document
+from ingest import walk_files, load_files, iter_batches
+from sparse_index import SparseIndex
+from index_store import chunk_id
+import tracing
 
 class LocalRAG:
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(stop_words='english')
+    def __init__(self, min_score=0.1):
+        self.engine = SparseIndex()
+        self.min_score = min_score
         self.documents = []
-        self.tfidf_matrix = None
+        self._repo_path = None
+        self._files = {}            # rel -> ((mtime_ns, size), sha256, chunks)
 
-    def index_directory(self, repo_path):
-        """Index all .md and .sql files in the given directory recursively."""
-        patterns = ['**/*.md', '**/*.sql']
-        files = []
-        for pattern in patterns:
-            files.extend(glob.glob(os.path.join(repo_path, pattern), recursive=True))
+    def index_directory(self, repo_path, workers=None):
+        """
+        Index all .md and .sql files in the given directory recursively.
 
+        Files are found with the ingest walker (honouring .gitignore and the
+        size limit). Like IndexStore.sync, only files whose stat changed are
+        re-read and re-chunked; their chunks are swapped in the index by
+        chunk ID and chunks of deleted files are removed.
+        """
+        if repo_path != self._repo_path:
+            self._repo_path = repo_path
+            self._files = {}
+            self.documents = []
+            self.engine.clear()
+        with tracing.span("local.build") as phase:
+            current = {rel: (mtime_ns, size) for rel, mtime_ns, size in walk_files(repo_path)}
+            changed = False
+            for rel in self._files.keys() - current.keys():
+                self._drop(rel)
+                changed = True
+            todo = [rel for rel, stat in current.items() if rel not in self._files or self._files[rel][0] != stat]
+            known = {rel: self._files[rel][1] for rel in todo if rel in self._files}
+            for batch in iter_batches(load_files(repo_path, todo, chunk_document, known, workers=workers)):
+                for rel, sha, docs in batch:
+                    if docs is None:
+                        # Touched but not modified: keep the chunks
+                        self._files[rel] = (current[rel], sha, self._files[rel][2])
+                        continue
+                    self._drop(rel)
+                    # Chunk by SQL statement / Markdown section
+                    self.engine.add_many((chunk_id(rel, i), doc) for i, doc in enumerate(docs))
+                    self._files[rel] = (current[rel], sha, docs)
+                    changed = True
+            if changed:
+                self.documents = [doc for rel in sorted(self._files) for doc in self._files[rel][2]]
+            phase.set("changed", changed)
+            phase.set("chunks", len(self.documents))
+        tracing.count("index.chunks", len(self.documents))
+
+    def _drop(self, rel):
+        _, _, docs = self._files.pop(rel, (None, None, ()))
+        for i in range(len(docs)):
+            self.engine.remove(chunk_id(rel, i))
+
+    def index_texts(self, texts):
+        """Index in-memory files, {source: text}, e.g. web uploads."""
         self.documents = []
-        for file_path in files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # Chunk the content into smaller pieces, e.g., by paragraphs or fixed size
-                    chunks = self._chunk_text(content, chunk_size=500)
-                    for chunk in chunks:
-                        self.documents.append({
-                            'content': chunk,
-                            'source': file_path
-                        })
-            except Exception as e:
-                print(f"Error reading {file_path}: {e}")
-
-        if self.documents:
-            contents = [doc['content'] for doc in self.documents]
-            self.tfidf_matrix = self.vectorizer.fit_transform(contents)
-        else:
-            self.tfidf_matrix = None
-
-    def _chunk_text(self, text, chunk_size=500):
-        """Simple text chunking by characters."""
-        chunks = []
-        for i in range(0, len(text), chunk_size):
-            chunks.append(text[i:i+chunk_size])
-        return chunks
+        self._repo_path = None
+        self._files = {}
+        for source, text in texts.items():
+            self.documents.extend(chunk_document(text, source))
+        tracing.count("index.chunks", len(self.documents))
+        with tracing.span("local.build", chunks=len(self.documents)):
+            self.engine.clear()
+            self.engine.add_many(enumerate(self.documents))
 
     def retrieve(self, query, top_k=5):
-        """Retrieve top-k relevant documents based on cosine similarity."""
-        if self.tfidf_matrix is None or len(self.documents) == 0:
-            return []
-
-        query_vec = self.vectorizer.transform([query])
-        similarities = cosine_similarity(query_vec, self.tfidf_matrix)[0]
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
-        results = []
-        for idx in top_indices:
-            if similarities[idx] > 0.1:  # Threshold to filter low similarity
-                results.append(self.documents[idx])
-        return results
+        """Retrieve top-k relevant documents by BM25 score."""
+        return [doc for doc, _ in self.engine.search(query, top_k, self.min_score)]
+
+    def retrieve_batch(self, queries, top_k=5):
+        """Retrieve top-k documents for several queries at once."""
+        return [[doc for doc, _ in hits] for hits in self.engine.search_batch(queries, top_k, self.min_score)]
 
 # Global instance
 rag_instance = LocalRAG()
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+Optimization result cache.
+
+Results are keyed by a sqlglot-normalized AST fingerprint of the input
+(identifiers canonicalized, literals parameterized) combined with a hash of
+the retrieved context, the model name and the temperature. Queries that only
+differ in whitespace, casing or literal values share an entry; on a hit the
+new query's literals are bound back into the cached SQL, provided every
+literal of the cached SQL came from the query it was cached for.
+
+Entries live in an in-memory LRU with TTL, optionally backed by SQLite.
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+import sqlglot
+from sqlglot import exp
+from sqlglot.optimizer.normalize_identifiers import normalize_identifiers
+from index_store import CACHE_DIR
+
+
+def _literal_key(node):
+    return [node.is_string, node.this]
+
+
+def fingerprint_sql(sql, dialect=None):
+    """
+    Normalize SQL into a fingerprint.
+
+    Returns:
+        (fingerprint, literals) where fingerprint is the canonical SQL with
+        every literal replaced by a placeholder and literals is the list of
+        [is_string, value] pairs in traversal order. Unparseable input falls
+        back to whitespace-collapsed, lower-cased text with no literals.
+    """
+    try:
+        expressions = [e for e in sqlglot.parse(sql, read=dialect) if e is not None]
+    except sqlglot.errors.SqlglotError:
+        expressions = []
+    if not expressions:
+        return " ".join(sql.lower().split()), []
+
+    literals = []
+
+    def parameterize(node):
+        if isinstance(node, exp.Literal):
+            literals.append(_literal_key(node))
+            return exp.Placeholder()
+        return node
+
+    parts = []
+    for expression in expressions:
+        normalized = normalize_identifiers(expression.copy(), dialect=dialect)
+        parts.append(normalized.transform(parameterize).sql(dialect=dialect))
+    return ";\n".join(parts), literals
+
+
+def rebind_literals(sql, cached_literals, literals, dialect=None):
+    """
+    Substitute a new query's literal values into SQL cached for another query
+    with the same fingerprint.
+
+    Every literal of the cached SQL must trace back to exactly one literal of
+    the query it was cached for: the cached SQL has to contain the same
+    literal values, each as many times. Literals the model added or changed
+    (e.g. COALESCE(x, 0), or a > 5 rewritten as a >= 6) cannot be rebound
+    safely, so those entries only serve identical literals.
+
+    Returns the rebound SQL, or None if the literals cannot be rebound.
+    """
+    if cached_literals == literals:
+        return sql
+    if len(cached_literals) != len(literals):
+        return None
+
+    mapping = {}
+    for old, new in zip(cached_literals, literals):
+        old, new = tuple(old), tuple(new)
+        if mapping.setdefault(old, new) != new:
+            return None
+
+    try:
+        expressions = [e for e in sqlglot.parse(sql, read=dialect) if e is not None]
+    except sqlglot.errors.SqlglotError:
+        return None
+    found = Counter(tuple(_literal_key(node)) for e in expressions for node in e.find_all(exp.Literal))
+    if found != Counter(tuple(old) for old in cached_literals):
+        return None
+
+    def rebind(node):
+        if isinstance(node, exp.Literal):
+            is_string, value = mapping[tuple(_literal_key(node))]
+            return exp.Literal.string(value) if is_string else exp.Literal.number(value)
+        return node
+
+    return ";\n".join(e.transform(rebind).sql(dialect=dialect, pretty=True) for e in expressions)
+
+
+def make_cache_key(fingerprint, context="", model="", temperature=0.0, extra=""):
+    """Combine the query fingerprint with everything else that shapes the LLM output."""
+    context_hash = hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+    payload = json.dumps([fingerprint, context_hash, model, float(temperature), extra])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU/TTL cache of optimization results with an optional SQLite backend."""
+
+    def __init__(self, max_entries=1024, ttl=7 * 24 * 3600, db_path=None):
+        """
+        Args:
+            max_entries: in-memory LRU capacity
+            ttl: seconds before an entry expires (None = never)
+            db_path: optional SQLite file for a persistent second tier
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, created REAL, value TEXT)"
+            )
+            self._conn.commit()
+        self.stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0}
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key):
+        """Return the cached entry dict for a key, or None, counting the hit or miss."""
+        value, tier = self.lookup(key)
+        self.record(tier)
+        return value
+
+    def lookup(self, key):
+        """
+        Return (entry dict, 'memory' or 'disk') for a key, or (None, None),
+        without counting it: call record() once the entry was used or not.
+        """
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                created, value = item
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    return value, "memory"
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT created, value FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    created, value = row[0], json.loads(row[1])
+                    if not self._expired(created):
+                        self._remember(key, created, value)
+                        return value, "disk"
+                    self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._conn.commit()
+            return None, None
+
+    def record(self, tier):
+        """Count a hit served from `tier` ('memory' or 'disk'), or a miss for None."""
+        with self._lock:
+            if tier is None:
+                self.stats["misses"] += 1
+            else:
+                self.stats["hits"] += 1
+                self.stats[f"{tier}_hits"] += 1
+
+    def put(self, key, value):
+        """Store an entry dict (must be JSON-serializable)."""
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, value)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, created, value) VALUES (?, ?, ?)",
+                    (key, created, json.dumps(value))
+                )
+                self._conn.commit()
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM results")
+                self._conn.commit()
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def format_stats(self):
+        return (
+            f"Result cache: {self.stats['hits']} hits "
+            f"({self.stats['memory_hits']} memory, {self.stats['disk_hits']} disk), "
+            f"{self.stats['misses']} misses, hit rate {self.hit_rate():.0%}"
+        )
+
+
+_default_cache = None
+_configured = False
+_UNSET = object()
+
+
+def configure_result_cache(enabled=True, db_path=_UNSET, max_entries=1024, ttl=7 * 24 * 3600):
+    """
+    (Re)configure the process-wide result cache.
+
+    By default the cache is in-memory only; set `db_path` (or the
+    SQLCLEAN_RESULT_CACHE_DB environment variable) to persist results, e.g.
+    across CLI invocations. Set SQLCLEAN_RESULT_CACHE=off to disable it.
+    """
+    global _default_cache, _configured
+    if db_path is _UNSET:
+        db_path = os.environ.get("SQLCLEAN_RESULT_CACHE_DB") or None
+        if db_path == "default":
+            db_path = os.path.join(CACHE_DIR, "results.sqlite")
+    _default_cache = ResultCache(max_entries=max_entries, ttl=ttl, db_path=db_path) if enabled else None
+    _configured = True
+    return _default_cache
+
+
+def get_result_cache():
+    """Return the process-wide result cache, or None if caching is disabled."""
+    if not _configured:
+        enabled = os.environ.get("SQLCLEAN_RESULT_CACHE", "on").lower() not in ("off", "0", "false")
+        configure_result_cache(enabled=enabled)
+    return _default_cache
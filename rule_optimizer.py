@@ -0,0 +1,236 @@
+"""
+Deterministic, rule-based SQL optimization pre-pass.
+
+Runs before (or, in offline mode, instead of) the Gemini call:
+- applies a safe subset of sqlglot's optimizer rules (qualify, subquery
+  unnesting, predicate pushdown, join/subquery/CTE cleanup, simplification)
+  and re-renders the query in canonical formatting. Unnesting and pushdown
+  move predicates between scopes, so they only run when every column could
+  be tied to its table (qualified in the input, or resolved via the schema)
+- detects known anti-patterns (correlated scalar subqueries in the SELECT
+  list, IN (SELECT ...), SELECT *, non-sargable predicates) so they can be
+  reported offline or handed to the LLM as hints
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+import sqlglot
+from sqlglot import exp
+from sqlglot.optimizer.qualify import qualify
+from sqlglot.optimizer.normalize import normalize
+from sqlglot.optimizer.unnest_subqueries import unnest_subqueries
+from sqlglot.optimizer.pushdown_predicates import pushdown_predicates
+from sqlglot.optimizer.optimize_joins import optimize_joins
+from sqlglot.optimizer.eliminate_subqueries import eliminate_subqueries
+from sqlglot.optimizer.merge_subqueries import merge_subqueries
+from sqlglot.optimizer.eliminate_ctes import eliminate_ctes
+from sqlglot.optimizer.simplify import simplify
+
+
+@dataclass
+class Finding:
+    rule: str
+    message: str
+    snippet: str = ""
+
+    def __str__(self):
+        return f"{self.rule}: {self.message}" + (f" [{self.snippet}]" if self.snippet else "")
+
+
+@dataclass
+class RuleResult:
+    sql: str
+    findings: List[Finding] = field(default_factory=list)
+    rules_applied: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def findings_text(self):
+        return "\n".join(f"- {finding}" for finding in self.findings)
+
+
+# --- Rewrites ---
+
+def _qualify(expression, schema=None, dialect=None):
+    return qualify(
+        expression, schema=schema, dialect=dialect,
+        validate_qualify_columns=False, identify=False
+    )
+
+
+REWRITE_RULES = [
+    ("qualify", _qualify),
+    ("normalize", lambda e, **_: normalize(e)),
+    ("unnest_subqueries", lambda e, **_: unnest_subqueries(e)),
+    ("pushdown_predicates", lambda e, **_: pushdown_predicates(e)),
+    ("optimize_joins", lambda e, **_: optimize_joins(e)),
+    ("eliminate_subqueries", lambda e, **_: eliminate_subqueries(e)),
+    ("merge_subqueries", lambda e, **_: merge_subqueries(e)),
+    ("eliminate_ctes", lambda e, **_: eliminate_ctes(e)),
+    ("simplify", lambda e, **_: simplify(e)),
+]
+# Rules that are only correct when every column is qualified: an unqualified
+# column in a correlated subquery would be moved to the wrong table
+NEEDS_QUALIFIED = {"unnest_subqueries", "pushdown_predicates"}
+
+
+def _columns_resolved(expression):
+    """True if every column names a table, CTE or subquery of the statement."""
+    sources = {node.alias_or_name for node in expression.find_all(exp.Table, exp.Subquery, exp.CTE)}
+    return all(column.table and column.table in sources for column in expression.find_all(exp.Column))
+
+
+def _drop_redundant_aliases(expression):
+    """Remove the `x AS x` / `t AS t` aliases that qualify adds, keeping output close to the input."""
+    def transform(node):
+        if isinstance(node, exp.Alias) and isinstance(node.this, exp.Column) and node.alias == node.this.name:
+            return node.this
+        if isinstance(node, exp.Table) and node.alias == node.name:
+            alias = node.args.get("alias")
+            if not (isinstance(alias, exp.TableAlias) and alias.columns):
+                node.set("alias", None)
+        return node
+    return expression.transform(transform)
+
+
+def _rewrite(expression, schema=None, dialect=None):
+    applied = []
+    resolved = False
+    for name, rule in REWRITE_RULES:
+        if name in NEEDS_QUALIFIED and not resolved:
+            continue
+        before = expression.copy()
+        try:
+            expression = rule(expression, schema=schema, dialect=dialect)
+        except Exception:
+            expression = before
+            continue
+        if name == "qualify":
+            resolved = _columns_resolved(expression)
+        if expression != before:
+            applied.append(name)
+    return _drop_redundant_aliases(expression), applied
+
+
+# --- Anti-pattern detection ---
+
+def _snippet(node, limit=80):
+    text = node.sql()
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _source_names(select):
+    """Names and aliases of the tables/subqueries a SELECT reads from directly."""
+    names = set()
+    for source in select.find_all(exp.Table, exp.Subquery):
+        if source.parent_select is select or source.find_ancestor(exp.Select) is select:
+            names.add(source.alias_or_name)
+            if isinstance(source, exp.Table):
+                names.add(source.name)
+    return names
+
+
+def _is_correlated(subquery):
+    select = subquery.this if isinstance(subquery, exp.Subquery) else subquery
+    if not isinstance(select, exp.Select):
+        return False
+    inner = _source_names(select)
+    return any(col.table and col.table not in inner for col in select.find_all(exp.Column))
+
+
+def _wraps_column(node):
+    """A function call or arithmetic expression applied to a column."""
+    if isinstance(node, (exp.Func, exp.Binary)) and not isinstance(node, exp.Predicate):
+        return node.find(exp.Column) is not None
+    return False
+
+
+def detect_anti_patterns(expression):
+    """Return a list of Findings for known performance anti-patterns."""
+    findings = []
+
+    for select in expression.find_all(exp.Select):
+        for projection in select.expressions:
+            if isinstance(projection, exp.Star) or (
+                isinstance(projection, exp.Column) and isinstance(projection.this, exp.Star)
+            ):
+                findings.append(Finding(
+                    "select_star",
+                    "SELECT * reads every column; list only the columns you need.",
+                    _snippet(projection)
+                ))
+            for subquery in projection.find_all(exp.Subquery):
+                if _is_correlated(subquery):
+                    findings.append(Finding(
+                        "correlated_scalar_subquery",
+                        "Correlated subquery in the SELECT list runs once per row; "
+                        "rewrite as a JOIN to a grouped derived table.",
+                        _snippet(subquery)
+                    ))
+
+    for in_expr in expression.find_all(exp.In):
+        if in_expr.args.get("query") is not None:
+            findings.append(Finding(
+                "in_subquery",
+                "IN (SELECT ...) can often be rewritten as a JOIN or EXISTS for a better plan.",
+                _snippet(in_expr)
+            ))
+
+    for clause in expression.find_all(exp.Where, exp.Join):
+        condition = clause.this if isinstance(clause, exp.Where) else clause.args.get("on")
+        if condition is None:
+            continue
+        for predicate in condition.find_all(exp.EQ, exp.NEQ, exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Between):
+            operands = [predicate.this] + ([predicate.expression] if predicate.expression else [])
+            if any(_wraps_column(op) for op in operands):
+                findings.append(Finding(
+                    "non_sargable_predicate",
+                    "Function or arithmetic on a column prevents index use; "
+                    "move the computation to the other side of the comparison.",
+                    _snippet(predicate)
+                ))
+        for like in condition.find_all(exp.Like, exp.ILike):
+            pattern = like.expression
+            if isinstance(pattern, exp.Literal) and pattern.is_string and pattern.this.startswith("%"):
+                findings.append(Finding(
+                    "leading_wildcard_like",
+                    "LIKE with a leading wildcard cannot use an index.",
+                    _snippet(like)
+                ))
+
+    # Nested WHERE clauses are reachable from their parents too
+    unique = {}
+    for finding in findings:
+        unique.setdefault((finding.rule, finding.snippet), finding)
+    return list(unique.values())
+
+
+def rule_optimize(sql, schema=None, dialect=None):
+    """
+    Run the rule-based pass over one or more SQL statements.
+
+    Args:
+        sql: SQL text
+        schema: optional {table: {column: type}} mapping used to qualify
+            columns (see SchemaIndex.to_sqlglot_schema); without it, subqueries
+            are only unnested when the input qualifies every column
+        dialect: optional sqlglot dialect
+
+    Returns:
+        RuleResult with the rewritten SQL (the input unchanged if it cannot
+        be parsed), detected findings and the rewrite rules that fired.
+    """
+    try:
+        expressions = [e for e in sqlglot.parse(sql, read=dialect) if e is not None]
+    except sqlglot.errors.SqlglotError as e:
+        return RuleResult(sql=sql.strip(), error=str(e))
+
+    findings = []
+    applied = []
+    rewritten = []
+    for expression in expressions:
+        findings.extend(detect_anti_patterns(expression))
+        optimized, rules = _rewrite(expression.copy(), schema=schema, dialect=dialect)
+        applied.extend(rule for rule in rules if rule not in applied)
+        rewritten.append(optimized.sql(dialect=dialect, pretty=True))
+
+    return RuleResult(sql=";\n\n".join(rewritten), findings=findings, rules_applied=applied)
@@ -0,0 +1,288 @@
+"""
+Schema-first RAG.
+
+Parses every CREATE TABLE / INDEX / VIEW in a repository into a
+table -> columns / indexes / foreign keys map. At query time the tables
+referenced by the input SQL are extracted from its AST and looked up
+directly, together with one hop of foreign-key neighbours, so the DDL the
+query actually needs is retrieved in O(1) per table with no embedding step.
+"""
+
+import os
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List
+from sqlglot import exp
+from chunking import split_statements, parse_statement
+from ingest import walk_files
+
+
+@dataclass
+class ForeignKeyInfo:
+    columns: List[str]
+    ref_table: str
+    ref_columns: List[str]
+
+
+@dataclass
+class IndexInfo:
+    name: str
+    table: str
+    columns: List[str]
+    unique: bool = False
+    ddl: str = ""
+
+
+@dataclass
+class TableInfo:
+    name: str
+    kind: str = "table"
+    columns: Dict[str, str] = field(default_factory=dict)
+    primary_key: List[str] = field(default_factory=list)
+    foreign_keys: List[ForeignKeyInfo] = field(default_factory=list)
+    indexes: List[IndexInfo] = field(default_factory=list)
+    ddl: str = ""
+    source: str = ""
+
+    def referenced_tables(self):
+        return {fk.ref_table for fk in self.foreign_keys}
+
+    def context(self):
+        """DDL plus any separately declared indexes, as retrieval context."""
+        parts = [self.ddl.rstrip().rstrip(";") + ";"]
+        parts.extend(index.ddl.rstrip().rstrip(";") + ";" for index in self.indexes if index.ddl)
+        return "\n".join(parts)
+
+
+def _identifier_names(nodes):
+    return [node.name for node in nodes or [] if node.name]
+
+
+def _reference(ref):
+    schema = ref.this if isinstance(ref, exp.Reference) else None
+    if not isinstance(schema, exp.Schema) or not isinstance(schema.this, exp.Table):
+        return None, []
+    return schema.this.name.lower(), _identifier_names(schema.expressions)
+
+
+def _parse_create_table(create, statement, source):
+    schema = create.this
+    table = TableInfo(name=schema.this.name.lower(), ddl=statement, source=source)
+    for item in schema.expressions:
+        if isinstance(item, exp.ColumnDef):
+            table.columns[item.name] = item.args["kind"].sql() if item.args.get("kind") else ""
+            for constraint in item.args.get("constraints") or []:
+                kind = constraint.args.get("kind")
+                if isinstance(kind, exp.PrimaryKeyColumnConstraint):
+                    table.primary_key.append(item.name)
+                elif isinstance(kind, exp.Reference):
+                    ref_table, ref_columns = _reference(kind)
+                    if ref_table:
+                        table.foreign_keys.append(ForeignKeyInfo([item.name], ref_table, ref_columns))
+        elif isinstance(item, exp.PrimaryKey):
+            table.primary_key.extend(_identifier_names(item.expressions))
+        elif isinstance(item, exp.ForeignKey):
+            ref_table, ref_columns = _reference(item.args.get("reference"))
+            if ref_table:
+                table.foreign_keys.append(
+                    ForeignKeyInfo(_identifier_names(item.expressions), ref_table, ref_columns)
+                )
+    return table
+
+
+def _parse_create_index(create, statement):
+    index = create.this
+    table = index.args.get("table")
+    if not isinstance(index, exp.Index) or table is None:
+        return None
+    params = index.args.get("params")
+    columns = [col.name for col in (params.args.get("columns") if params else []) or [] if col.name]
+    return IndexInfo(
+        name=index.name, table=table.name.lower(), columns=columns,
+        unique=bool(create.args.get("unique")), ddl=statement
+    )
+
+
+def parse_ddl(text, source=""):
+    """Parse a SQL script into (tables, indexes) from its CREATE statements."""
+    tables = []
+    indexes = []
+    for statement in split_statements(text):
+        if "CREATE" not in statement.upper():
+            continue
+        create = parse_statement(statement)
+        if not isinstance(create, exp.Create):
+            continue
+        kind = (create.args.get("kind") or "").upper()
+        if kind == "TABLE" and isinstance(create.this, exp.Schema):
+            tables.append(_parse_create_table(create, statement, source))
+        elif kind == "TABLE" and isinstance(create.this, exp.Table):
+            # CREATE TABLE ... AS SELECT
+            tables.append(TableInfo(name=create.this.name.lower(), ddl=statement, source=source))
+        elif kind == "VIEW" and isinstance(create.this, (exp.Table, exp.Schema)):
+            target = create.this.this if isinstance(create.this, exp.Schema) else create.this
+            view = TableInfo(name=target.name.lower(), kind="view", ddl=statement, source=source)
+            query = create.args.get("expression")
+            if query is not None:
+                for ref in query.find_all(exp.Table):
+                    if ref.name and ref.name.lower() != view.name:
+                        view.foreign_keys.append(ForeignKeyInfo([], ref.name.lower(), []))
+            tables.append(view)
+        elif kind == "INDEX":
+            index = _parse_create_index(create, statement)
+            if index is not None:
+                indexes.append(index)
+    return tables, indexes
+
+
+def referenced_tables(sql):
+    """Names of the base tables a query reads or writes (CTE names excluded)."""
+    parsed = parse_statement(sql)
+    if parsed is None:
+        return []
+    ctes = {cte.alias_or_name.lower() for cte in parsed.find_all(exp.CTE)}
+    names = []
+    for table in parsed.find_all(exp.Table):
+        name = table.name.lower()
+        if name and name not in ctes and name not in names:
+            names.append(name)
+    return names
+
+
+class SchemaIndex:
+    """Table -> TableInfo map built from the DDL in a repository."""
+
+    def __init__(self):
+        self.tables: Dict[str, TableInfo] = {}
+        self.referenced_by: Dict[str, set] = {}
+        self._files = {}
+
+    def index_directory(self, repo_path):
+        """Parse all .sql files under repo_path. Unchanged files are not re-parsed."""
+        files = {}
+        for rel, mtime_ns, size in walk_files(repo_path, ("*.sql",)):
+            file_path = os.path.join(repo_path, rel)
+            try:
+                stamp = (mtime_ns, size)
+                cached = self._files.get(file_path)
+                if cached and cached[0] == stamp:
+                    files[file_path] = cached
+                    continue
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    files[file_path] = (stamp, parse_ddl(f.read(), file_path))
+            except Exception as e:
+                print(f"Error reading {file_path}: {e}", file=sys.stderr)
+        self._files = files
+        self._build([parsed for _, parsed in files.values()])
+
+    def index_texts(self, texts):
+        """Index in-memory DDL: {source: text}."""
+        self._files = {}
+        self._build([parse_ddl(text, source) for source, text in texts.items()])
+
+    def _build(self, parsed_files):
+        self.tables = {}
+        pending_indexes = []
+        for tables, indexes in parsed_files:
+            for table in tables:
+                table.indexes = []
+                self.tables[table.name] = table
+            pending_indexes.extend(indexes)
+        for index in pending_indexes:
+            if index.table in self.tables:
+                self.tables[index.table].indexes.append(index)
+
+        self.referenced_by = {}
+        for table in self.tables.values():
+            for ref in table.referenced_tables():
+                self.referenced_by.setdefault(ref, set()).add(table.name)
+
+    def neighbours(self, name):
+        """Tables one foreign-key hop away, in either direction."""
+        table = self.tables.get(name)
+        out = set(table.referenced_tables()) if table else set()
+        out |= self.referenced_by.get(name, set())
+        out.discard(name)
+        return sorted(t for t in out if t in self.tables)
+
+    def lookup(self, names, hops=1):
+        """
+        Return (table, match) pairs for the given table names followed by
+        their foreign-key neighbours up to `hops` away. match is 'direct' or
+        'foreign_key'.
+        """
+        seen = set()
+        results = []
+        frontier = []
+        for name in names:
+            name = name.lower()
+            if name in self.tables and name not in seen:
+                seen.add(name)
+                results.append((self.tables[name], "direct"))
+                frontier.append(name)
+        for _ in range(hops):
+            next_frontier = []
+            for name in frontier:
+                for neighbour in self.neighbours(name):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        results.append((self.tables[neighbour], "foreign_key"))
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        return results
+
+    def to_sqlglot_schema(self):
+        """{table: {column: type}} mapping usable by sqlglot's optimizer."""
+        return {name: dict(table.columns) for name, table in self.tables.items() if table.columns}
+
+
+class SchemaRAG:
+    """Schema-first RAG: AST-driven DDL lookup for the tables a query references."""
+
+    def __init__(self, hops=1):
+        self.hops = hops
+        self.schema_index = SchemaIndex()
+        self.documents = []
+
+    def index_directory(self, repo_path):
+        self.schema_index.index_directory(repo_path)
+        self.documents = [self._to_document(t, "indexed") for t in self.schema_index.tables.values()]
+
+    def index_texts(self, texts):
+        """Index in-memory files, {source: text}; only .sql sources are parsed."""
+        self.schema_index.index_texts({
+            source: text for source, text in texts.items() if source.lower().endswith(".sql")
+        })
+        self.documents = [self._to_document(t, "indexed") for t in self.schema_index.tables.values()]
+
+    @staticmethod
+    def _to_document(table, match):
+        return {
+            'content': table.context(),
+            'source': table.source,
+            'metadata': {'type': 'schema', 'table': table.name, 'kind': table.kind, 'match': match}
+        }
+
+    def retrieve(self, query, top_k=5):
+        """Return the DDL of tables referenced by the query, then their FK neighbours."""
+        names = referenced_tables(query)
+        matches = self.schema_index.lookup(names, hops=self.hops)
+        return [self._to_document(table, match) for table, match in matches[:top_k]]
+
+
+_repo_schemas = {}
+_repo_schemas_lock = threading.Lock()
+
+
+def repo_schema(repo_path):
+    """
+    sqlglot schema mapping of a repository's DDL (see
+    SchemaIndex.to_sqlglot_schema), or None if it declares no tables. The
+    SchemaIndex is kept per real path, so only changed files are re-parsed.
+    """
+    key = os.path.realpath(repo_path)
+    with _repo_schemas_lock:
+        schema_index = _repo_schemas.setdefault(key, SchemaIndex())
+        schema_index.index_directory(repo_path)
+        return schema_index.to_sqlglot_schema() or None
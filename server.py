@@ -0,0 +1,273 @@
+"""
+Local optimization server (`sqlclean serve`).
+
+A long-running process that keeps RAG backends, the embedding model and
+built indexes (see index_registry) resident, so repeated CLI calls (editor
+integrations, pre-commit hooks) only pay for retrieval and the Gemini
+round-trip.
+
+Protocol: HTTP on localhost, one request per thread.
+    GET  /health    -> {"status": "ok", "pid", "uptime_s", "indexes": [...]}
+    POST /optimize  {"sql", "repo", "strategy", "offline", "use_cache", "stream", "context_tokens",
+                     "verify", "verify_rows"}
+                    -> {"output": ...}, or the output as a chunked text
+                       stream when "stream" is true
+
+The CLI forwards to a running server automatically (see `forward`); the
+address comes from SQLCLEAN_SERVER (default 127.0.0.1:8765). A listener
+that does not identify itself as sqlclean on /health is ignored, and the
+CLI runs the optimization locally.
+"""
+
+import codecs
+import http.client
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+CONNECT_TIMEOUT = 0.25
+# A sqlclean server answers /health at once; anything slower is not one
+HEALTH_TIMEOUT = 2.0
+def server_address():
+    """(host, port) of the server from SQLCLEAN_SERVER."""
+    host, _, port = os.environ.get("SQLCLEAN_SERVER", DEFAULT_ADDRESS).rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class ServerState:
+    """Warm indexes come from the process-wide IndexRegistry, keyed by (strategy, repository)."""
+
+    def __init__(self):
+        from index_registry import get_index_registry
+        self.started = time.monotonic()
+        self.registry = get_index_registry()
+
+    def index_for(self, strategy, repo_path):
+        return self.registry.get(strategy, repo_path)
+
+    def health(self):
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "uptime_s": time.monotonic() - self.started,
+            "indexes": [
+                {"strategy": entry.strategy.value, "repo": entry.repo_path, "bytes": entry.size}
+                for entry in self.registry.entries()
+            ],
+            "registry": self.registry.format_stats(),
+        }
+
+
+class OptimizeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "sqlclean"
+
+    def log_message(self, format, *args):
+        print(f"[sqlclean serve] {self.address_string()} {format % args}", file=sys.stderr)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.server.state.health())
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/optimize":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not isinstance(request.get("sql"), str):
+                raise ValueError("'sql' must be a string")
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": f"Bad request: {e}"})
+            return
+        try:
+            kwargs = self._optimize_args(request)
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        from sql_optimizer import optimize_sql, optimize_sql_stream
+        if not request.get("stream"):
+            try:
+                self._send_json(200, {"output": optimize_sql(request["sql"], **kwargs)})
+            except Exception as e:
+                self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for text in optimize_sql_stream(request["sql"], **kwargs):
+                if text:
+                    self._write_chunk(text.encode())
+        except Exception as e:
+            self._write_chunk(f"\n-- [Server error] {type(e).__name__}: {e}\n".encode())
+        # Zero-length chunk ends the response
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _optimize_args(self, request):
+        from rag_config import RAGStrategy
+        strategy = RAGStrategy(request.get("strategy", RAGStrategy.HYBRID.value))
+        offline = bool(request.get("offline"))
+        rag = None
+        if request.get("repo") and not offline:
+            rag = self.server.state.index_for(strategy, request["repo"])
+        return {
+            "repo_path": request.get("repo"), "rag": rag, "rag_strategy": strategy, "offline": offline,
+            "use_cache": request.get("use_cache", True),
+            "context_tokens": request.get("context_tokens"),
+            "verify": bool(request.get("verify")), "verify_rows": request.get("verify_rows"),
+        }
+
+
+def serve(host=None, port=None, preload=(), strategy=None):
+    """
+    Run the server until interrupted.
+
+    Args:
+        preload: repositories to index at startup (with `strategy`)
+    """
+    from rag_config import RAGStrategy
+    default_host, default_port = server_address()
+    httpd = ThreadingHTTPServer((host or default_host, port or default_port), OptimizeHandler)
+    httpd.daemon_threads = True
+    httpd.state = ServerState()
+
+    # Pay the heavy imports and model load once, up front
+    import sql_optimizer  # noqa: F401
+    strategy = strategy or RAGStrategy.HYBRID
+    for repo in preload:
+        print(f"Indexing {repo} with {strategy.value} RAG...", file=sys.stderr)
+        httpd.state.index_for(strategy, repo)
+
+    print(f"sqlclean server listening on {httpd.server_address[0]}:{httpd.server_address[1]}", file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+# --- Client side ---
+
+def _connect():
+    """
+    Open a connection to a running sqlclean server, or return None if there
+    is none. Whatever else listens on the port (another HTTP server, a
+    different protocol) is reported on stderr and treated as no server.
+    """
+    host, port = server_address()
+    conn = http.client.HTTPConnection(host, port, timeout=CONNECT_TIMEOUT)
+    try:
+        conn.connect()
+    except OSError:
+        return None
+    try:
+        conn.sock.settimeout(HEALTH_TIMEOUT)
+        conn.request("GET", "/health")
+        response = conn.getresponse()
+        body = response.read()
+        if not (response.getheader("Server") or "").startswith(OptimizeHandler.server_version):
+            raise ValueError("not a sqlclean server")
+        if response.status != 200 or json.loads(body).get("status") != "ok":
+            raise ValueError(f"unhealthy sqlclean server (HTTP {response.status})")
+    except (OSError, http.client.HTTPException, ValueError, AttributeError) as e:
+        conn.close()
+        print(f"Ignoring {host}:{port}: {e}", file=sys.stderr)
+        return None
+    # Identified: allow as long as the LLM needs
+    conn.sock.settimeout(None)
+    return conn
+
+
+def is_running():
+    conn = _connect()
+    if conn is None:
+        return False
+    conn.close()
+    return True
+
+
+def forward(sql, repo=None, strategy=None, offline=False, use_cache=True, stream=False, context_tokens=None,
+            verify=False, verify_rows=None):
+    """
+    Send an optimization request to a running server.
+
+    Returns None when no sqlclean server is listening or its reply cannot be
+    read (the caller should run locally), the output string, or, with
+    `stream`, an iterator over output text. Raises RuntimeError if the
+    server reports an error.
+    """
+    conn = _connect()
+    if conn is None:
+        return None
+    payload = {
+        "sql": sql,
+        "repo": os.path.abspath(repo) if repo else None,
+        "strategy": strategy.value if strategy is not None else None,
+        "offline": offline,
+        "use_cache": use_cache,
+        "stream": stream,
+        "context_tokens": context_tokens,
+        "verify": verify,
+        "verify_rows": verify_rows,
+    }
+    payload = {k: v for k, v in payload.items() if v is not None}
+    try:
+        conn.request("POST", "/optimize", body=json.dumps(payload), headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        if stream and response.status == 200:
+            return _iter_stream(conn, response)
+        data = json.loads(response.read() or b"{}")
+        error = data.get("error") if response.status != 200 else None
+        output = data["output"] if response.status == 200 else None
+    except (OSError, http.client.HTTPException, ValueError, KeyError, AttributeError) as e:
+        conn.close()
+        print(f"Unreadable reply from the sqlclean server ({type(e).__name__}: {e}); running locally",
+              file=sys.stderr)
+        return None
+    conn.close()
+    if response.status != 200:
+        raise RuntimeError(error or f"server returned HTTP {response.status}")
+    if not isinstance(output, str):
+        print("Unreadable reply from the sqlclean server (no output); running locally", file=sys.stderr)
+        return None
+    return output
+
+
+def _iter_stream(conn, response):
+    # Chunks may end mid-character, so decode incrementally
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    try:
+        while True:
+            data = response.read1(65536)
+            if not data:
+                break
+            text = decoder.decode(data)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+    finally:
+        conn.close()
@@ -0,0 +1,163 @@
+"""
+Incremental sparse retrieval engine shared by LocalRAG and TFIDFRAG.
+
+A BM25 inverted index: documents can be added and removed one at a time
+without refitting anything, queries only touch the posting lists of their
+own terms, and top-k is selected with np.argpartition instead of sorting
+every score. Scores are normalized by the best score the query could reach,
+so a fixed threshold behaves like the old cosine cut-off.
+"""
+
+import re
+import math
+import threading
+from collections import Counter
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z_][a-z0-9_]*|\d+")
+
+STOP_WORDS = frozenset("""
+a about above after again all also an and any are as at be because been before being below
+between both but by can did do does doing down during each few for from further had has have
+having he her here hers him his how i if in into is it its itself just me more most my no nor
+not now of off on once only or other our out over own same she should so some such than that
+the their them then there these they this those through to too under until up very was we
+were what when where which while who whom why will with would you your
+""".split())
+
+
+def tokenize(text):
+    """Lower-cased word/identifier tokens without English stop words."""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class SparseIndex:
+    """Thread-safe BM25 inverted index with incremental add/remove."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}         # term -> {slot: tf}
+            self._arrays = {}           # term -> (slots, tfs) cache
+            self._doc_terms = {}        # slot -> Counter
+            self._slot_of = {}          # doc_id -> slot
+            self._docs = []             # slot -> document (None when free)
+            self._lengths = np.zeros(0, dtype=np.float32)
+            self._free = []
+            self._total_length = 0
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._slot_of
+
+    def add(self, doc_id, document, text=None):
+        """Add (or replace) a document. `text` defaults to document['content']."""
+        terms = Counter(tokenize(text if text is not None else document['content']))
+        with self._lock:
+            if doc_id in self._slot_of:
+                self.remove(doc_id)
+            if self._free:
+                slot = self._free.pop()
+                self._docs[slot] = document
+            else:
+                slot = len(self._docs)
+                self._docs.append(document)
+                if slot >= len(self._lengths):
+                    grown = np.zeros(max(16, 2 * len(self._lengths)), dtype=np.float32)
+                    grown[:len(self._lengths)] = self._lengths
+                    self._lengths = grown
+            length = sum(terms.values())
+            self._lengths[slot] = length
+            self._total_length += length
+            self._slot_of[doc_id] = slot
+            self._doc_terms[slot] = terms
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[slot] = tf
+                self._arrays.pop(term, None)
+
+    def add_many(self, items):
+        """Add an iterable of (doc_id, document) pairs."""
+        with self._lock:
+            for doc_id, document in items:
+                self.add(doc_id, document)
+
+    def update_document(self, doc_id, document):
+        """Swap the stored document for an ID without re-tokenizing it."""
+        with self._lock:
+            self._docs[self._slot_of[doc_id]] = document
+
+    def remove(self, doc_id):
+        """Remove a document; unknown IDs are ignored."""
+        with self._lock:
+            slot = self._slot_of.pop(doc_id, None)
+            if slot is None:
+                return
+            for term in self._doc_terms.pop(slot):
+                posting = self._postings[term]
+                del posting[slot]
+                if not posting:
+                    del self._postings[term]
+                self._arrays.pop(term, None)
+            self._total_length -= int(self._lengths[slot])
+            self._lengths[slot] = 0
+            self._docs[slot] = None
+            self._free.append(slot)
+
+    def _posting_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            posting = self._postings[term]
+            arrays = (
+                np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                np.fromiter(posting.values(), dtype=np.float32, count=len(posting)),
+            )
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(self, query, top_k=5, min_score=0.0):
+        """
+        Return up to top_k (document, score) pairs, best first.
+
+        Scores are BM25 divided by the maximum the query could score, so
+        they fall in [0, 1]; results at or below min_score are dropped.
+        """
+        with self._lock:
+            n_docs = len(self._slot_of)
+            terms = Counter(tokenize(query))
+            if n_docs == 0 or not terms:
+                return []
+
+            avgdl = self._total_length / n_docs or 1.0
+            scores = np.zeros(len(self._docs), dtype=np.float32)
+            max_score = 0.0
+            for term, qtf in terms.items():
+                if term not in self._postings:
+                    continue
+                slots, tfs = self._posting_arrays(term)
+                idf = math.log(1 + (n_docs - len(slots) + 0.5) / (len(slots) + 0.5))
+                lengths = self._lengths[slots]
+                norm = tfs + self.k1 * (1 - self.b + self.b * lengths / avgdl)
+                scores[slots] += qtf * idf * tfs * (self.k1 + 1) / norm
+                max_score += qtf * idf * (self.k1 + 1)
+            if max_score == 0:
+                return []
+
+            scores /= max_score
+            candidates = np.flatnonzero(scores > min_score)
+            if len(candidates) > top_k:
+                top = np.argpartition(scores[candidates], -top_k)[-top_k:]
+                candidates = candidates[top]
+            order = candidates[np.argsort(scores[candidates])[::-1]]
+            return [(self._docs[slot], float(scores[slot])) for slot in order]
+
+    def search_batch(self, queries, top_k=5, min_score=0.0):
+        """Run several queries; posting arrays are shared across them."""
+        with self._lock:
+            return [self.search(query, top_k, min_score) for query in queries]
@@ -1,17 +1,100 @@
 import sys
 import typer
-from sql_optimizer import optimize_sql
+from typer.core import TyperGroup
+from sql_optimizer import optimize_sql, optimize_sql_stream
+from rag_config import RAGStrategy
+from result_cache import configure_result_cache, get_result_cache
+import tracing
+
+
+class DefaultCommandGroup(TyperGroup):
+    """Runs `clean` when the first argument is not a sub-command, so `sqlclean query.sql` keeps working."""
+
+    default_command = "clean"
+
+    def parse_args(self, ctx, args):
+        if not args or (args[0] not in self.commands and args[0] not in ("--help", "-h")):
+            args = [self.default_command] + list(args)
+        return super().parse_args(ctx, args)
+
+
+app = typer.Typer(cls=DefaultCommandGroup)
+
+
+def _setup_cache(cache, cache_db):
+    """Apply the --cache/--cache-db options to the process-wide result cache."""
+    if not cache:
+        configure_result_cache(enabled=False)
+    elif cache_db:
+        configure_result_cache(db_path=cache_db)
+
+
+def _setup_tracing(profile, trace_out):
+    """Enable tracing for --profile/--trace-out. *.json gets OTLP/JSON, anything else JSON lines."""
+    if not (profile or trace_out):
+        return
+    sinks = []
+    if trace_out:
+        sinks.append(tracing.OTLPJsonSink(trace_out) if trace_out.endswith(".json") else tracing.JsonlSink(trace_out))
+    tracing.enable(sinks)
+
+
+def _finish_tracing(profile):
+    if tracing.is_enabled():
+        tracing.flush()
+        if profile:
+            typer.echo(tracing.format_summary(), err=True)
+
+
+def _forward(sql_input, repo, strategy, offline, use_cache, stream, context_tokens, verify, verify_rows):
+    """Send the request to a running server. Returns False if there is none."""
+    import server
+    result = server.forward(sql_input, repo=repo, strategy=strategy, offline=offline,
+                            use_cache=use_cache, stream=stream, context_tokens=context_tokens,
+                            verify=verify, verify_rows=verify_rows)
+    if result is None:
+        return False
+    if not stream:
+        typer.echo(result)
+        return True
+    written = ""
+    for text in result:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        written = text
+    if not written.endswith("\n"):
+        sys.stdout.write("\n")
+    return True
+
+
+def _report_cache_stats():
+    cache = get_result_cache()
+    if cache is not None:
+        typer.echo(cache.format_stats(), err=True)
 
-app = typer.Typer() 
 
 @app.command()
-def clean(file: str = typer.Argument(None, help="Path to the SQL file. If omitted, reads from pipe (stdin)."), 
-          repo: str = typer.Option(None, help="Path to the repository to index for RAG (includes .md and .sql files).")):
+def clean(file: str = typer.Argument(None, help="Path to the SQL file. If omitted, reads from pipe (stdin)."),
+          repo: str = typer.Option(None, help="Path to the repository to index for RAG (includes .md and .sql files)."),
+          strategy: RAGStrategy = typer.Option(RAGStrategy.HYBRID, help="RAG strategy used with --repo."),
+          context_tokens: int = typer.Option(None, help="Token budget for repository context in the prompt (default 1500)."),
+          verify: bool = typer.Option(False, "--verify", help="Run the result against the original on SQLite with the --repo schema and synthetic data; reject regressions."),
+          verify_rows: int = typer.Option(None, help="Synthetic rows per table for --verify (default 1000)."),
+          cache: bool = typer.Option(True, help="Reuse results for queries already optimized."),
+          cache_db: str = typer.Option(None, help="SQLite file to persist optimization results across runs."),
+          cache_stats: bool = typer.Option(False, help="Print result cache hit/miss statistics to stderr."),
+          offline: bool = typer.Option(False, "--offline", help="Rule-based optimization only: no RAG, no network call."),
+          stream: bool = typer.Option(False, "--stream", help="Print the model output as it is generated."),
+          profile: bool = typer.Option(False, "--profile", help="Print per-phase timings and counters to stderr."),
+          trace_out: str = typer.Option(None, help="Write trace spans to this file (.json: OTLP/JSON, otherwise JSON lines)."),
+          no_server: bool = typer.Option(False, "--no-server", help="Run in this process even if `sqlclean serve` is running.")):
     """
     Clean and optimize SQL from a file or piped input.
     Example: cat query.sql | python sqlclean.py
     With RAG: sqlclean query.sql --repo /path/to/repo
     """
+    _setup_cache(cache, cache_db)
+
     # 2. Get the SQL content
     if file:
         try:
@@ -31,15 +114,122 @@ def clean(file: str = typer.Argument(None, help="Path to the SQL file. If omitte
         typer.echo("Error: SQL input is empty.")
         raise typer.Exit(1)
 
-    # 3. Call the LLM with System Instructions
+    # 3. Forward to a warm `sqlclean serve` process when one is running
+    if not (no_server or profile or trace_out or cache_db or cache_stats):
+        try:
+            forwarded = _forward(sql_input, repo, strategy, offline, cache, stream, context_tokens, verify, verify_rows)
+        except RuntimeError as e:
+            typer.echo(f"API Error: {e}", err=True)
+            raise typer.Exit(1)
+        if forwarded:
+            return
+
+    # 4. Call the LLM with System Instructions
+    _setup_tracing(profile, trace_out)
     try:
-        optimized = optimize_sql(sql_input, repo_path=repo)
-        
-        # 4. Output to user
-        typer.echo(optimized)
+        if stream:
+            # Output tokens as they arrive; validation runs once the model is done
+            written = ""
+            for text in optimize_sql_stream(sql_input, repo_path=repo, rag_strategy=strategy, offline=offline,
+                                            context_tokens=context_tokens, verify=verify, verify_rows=verify_rows):
+                sys.stdout.write(text)
+                sys.stdout.flush()
+                written = text or written
+            if not written.endswith("\n"):
+                sys.stdout.write("\n")
+        else:
+            optimized = optimize_sql(sql_input, repo_path=repo, rag_strategy=strategy, offline=offline,
+                                     context_tokens=context_tokens, verify=verify, verify_rows=verify_rows)
+
+            # 5. Output to user
+            typer.echo(optimized)
+        if cache_stats:
+            _report_cache_stats()
     except Exception as e:
         typer.echo(f"API Error: {e}", err=True)
         raise typer.Exit(1)
+    finally:
+        _finish_tracing(profile)
+
+@app.command()
+def batch(source: str = typer.Argument(..., help="Directory, glob, .jsonl file or multi-statement .sql file."),
+          repo: str = typer.Option(None, help="Path to the repository to index once for RAG."),
+          strategy: RAGStrategy = typer.Option(RAGStrategy.HYBRID, help="RAG strategy used with --repo."),
+          context_tokens: int = typer.Option(None, help="Token budget for repository context in each prompt (default 1500)."),
+          verify: bool = typer.Option(False, "--verify", help="Run each result against its original on SQLite with the --repo schema and synthetic data; reject regressions."),
+          verify_rows: int = typer.Option(None, help="Synthetic rows per table for --verify (default 1000)."),
+          concurrency: int = typer.Option(4, help="Number of concurrent Gemini calls."),
+          rate: float = typer.Option(None, help="Maximum Gemini calls per second (default: unlimited)."),
+          max_retries: int = typer.Option(5, help="Retries with exponential backoff on 429 errors."),
+          ordered: bool = typer.Option(True, "--ordered/--streamed", help="Emit results in input order or as they complete."),
+          output_format: str = typer.Option("sql", "--format", help="Output format: 'sql' or 'jsonl'."),
+          output: str = typer.Option(None, help="Write results to this file instead of stdout."),
+          fake_llm: bool = typer.Option(False, "--fake-llm", help="Use a local fake client instead of Gemini (offline dry run)."),
+          cache: bool = typer.Option(True, help="Reuse results for queries already optimized."),
+          cache_db: str = typer.Option(None, help="SQLite file to persist optimization results across runs."),
+          cache_stats: bool = typer.Option(False, help="Print result cache hit/miss statistics to stderr."),
+          offline: bool = typer.Option(False, "--offline", help="Rule-based optimization only: no RAG, no network calls."),
+          profile: bool = typer.Option(False, "--profile", help="Print per-phase timings and counters to stderr."),
+          trace_out: str = typer.Option(None, help="Write trace spans to this file (.json: OTLP/JSON, otherwise JSON lines).")):
+    """
+    Optimize many SQL statements concurrently.
+    Example: sqlclean batch migrations/ --repo sqlSchema/ecommerce --concurrency 8 --rate 5
+    """
+    from batch import collect_queries, run_batch, format_result
+
+    _setup_cache(cache, cache_db)
+    if output_format not in ("sql", "jsonl"):
+        typer.echo(f"Error: Unknown format '{output_format}'.", err=True)
+        raise typer.Exit(1)
+
+    try:
+        items = collect_queries(source)
+    except (OSError, ValueError) as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    if not items:
+        typer.echo("Error: No SQL statements found.", err=True)
+        raise typer.Exit(1)
+
+    client = None
+    if fake_llm:
+        from fake_client import FakeGeminiClient
+        client = FakeGeminiClient()
+
+    _setup_tracing(profile, trace_out)
+    out = open(output, "w") if output else sys.stdout
+    failures = 0
+    try:
+        for result in run_batch(items, repo_path=repo, rag_strategy=strategy, concurrency=concurrency,
+                                rate=rate, max_retries=max_retries, ordered=ordered, client=client,
+                                offline=offline, context_tokens=context_tokens, verify=verify,
+                                verify_rows=verify_rows):
+            failures += result.error is not None
+            out.write(format_result(result, output_format) + "\n")
+            out.flush()
+    finally:
+        if output:
+            out.close()
+        _finish_tracing(profile)
+
+    typer.echo(f"Optimized {len(items) - failures}/{len(items)} statements.", err=True)
+    if cache_stats:
+        _report_cache_stats()
+    if failures:
+        raise typer.Exit(1)
+
+@app.command()
+def serve(host: str = typer.Option(None, help="Interface to bind (default from SQLCLEAN_SERVER, 127.0.0.1)."),
+          port: int = typer.Option(None, help="Port to listen on (default from SQLCLEAN_SERVER, 8765)."),
+          repo: list[str] = typer.Option(None, help="Repository to index at startup (repeatable)."),
+          strategy: RAGStrategy = typer.Option(RAGStrategy.HYBRID, help="RAG strategy for --repo preloading.")):
+    """
+    Run a local server that keeps models and indexes warm.
+    `sqlclean` calls forward to it automatically while it is running.
+    Example: sqlclean serve --repo sqlSchema/ecommerce
+    """
+    import server
+    server.serve(host=host, port=port, preload=repo or (), strategy=strategy)
 
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    app()
@@ -1,13 +1,31 @@
 import os
+import re
+import sys
+import time
 import sqlglot
 from sqlglot import exp
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
 from rag_config import RAGFactory, RAGStrategy
+from result_cache import get_result_cache, fingerprint_sql, rebind_literals, make_cache_key
+from rule_optimizer import rule_optimize
+from schema_index import repo_schema
+from sql_repair import repair_sql, repair_prompt, strip_markdown_fences
+from context_packer import CANDIDATES, DEFAULT_CONTEXT_TOKENS, pack_context, format_context
+from sql_verify import verify_sql, verification_prompt
+import tracing
 
 load_dotenv()
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+MODEL_NAME = "gemini-2.5-flash"
+_client = None
+
+
+def get_client():
+    """Create the Gemini client on first use so imports stay cheap."""
+    global _client
+    if _client is None:
+        from google import genai
+        _client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    return _client
 
 SYSTEM_PROMPT = """
 You are a Senior DBA. Optimize the provided SQL for performance and readability.
@@ -27,68 +45,344 @@ def is_valid_sql(text):
     except:
         return False
 
-def optimize_sql(sql_input, repo_path=None, temperature=0.1, max_retries=2, rag_strategy=RAGStrategy.HYBRID):
+def prepare_rag(repo_path, rag_strategy=RAGStrategy.HYBRID):
+    """Return the indexed RAG backend for a repository, reusing a warm one from the index registry."""
+    # Backends are only imported and built when a repository is given
+    print(f"Indexing repository with {rag_strategy.value} RAG: {repo_path}", file=sys.stderr)
+    with tracing.span("rag.index", strategy=rag_strategy.value):
+        return RAGFactory.get_index(rag_strategy, repo_path)
+
+class FenceFilter:
+    """Drops Markdown code fence lines from streamed model output as it arrives."""
+
+    def __init__(self):
+        self._pending = ""
+        self._mid_line = False
+        self._fences = 0
+
+    def feed(self, text):
+        """Return the part of `text` that can be shown now."""
+        out = []
+        lines = (self._pending + text).splitlines(keepends=True)
+        self._pending = ""
+        for line in lines:
+            complete = line.endswith("\n")
+            if self._mid_line:
+                # The start of this line was already shown, so it is not a fence
+                if self._fences < 2:
+                    out.append(line)
+            elif line.lstrip().startswith("```"):
+                if not complete:
+                    self._pending = line
+                    continue
+                self._fences += 1
+            elif not complete and "```".startswith(line.lstrip()):
+                # Could still turn into a fence: wait for more text
+                self._pending = line
+                continue
+            elif self._fences < 2:
+                # Anything after the closing fence is dropped, like in the final result
+                out.append(line)
+            self._mid_line = not complete
+        return "".join(out)
+
+    def flush(self):
+        pending, self._pending = self._pending, ""
+        if pending.lstrip().startswith("```") or self._fences >= 2:
+            return ""
+        return pending
+
+
+class OptimizationStream:
+    """
+    Iterable of output text as it is produced. Once exhausted, `result` holds
+    the final validated output (the same string optimize_sql would return).
+    """
+
+    def __init__(self, generator):
+        self._generator = generator
+        self.result = None
+
+    def __iter__(self):
+        with tracing.span("optimize_sql"):
+            self.result = yield from self._generator
+
+
+def _record_usage(response):
+    """Add Gemini token counts (when the response reports them) to the trace counters."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    tracing.count("llm.prompt_tokens", getattr(usage, "prompt_token_count", None) or 0)
+    tracing.count("llm.output_tokens", getattr(usage, "candidates_token_count", None) or 0)
+
+
+def _generation_config(temperature):
+    from google.genai import types
+    return types.GenerateContentConfig(system_instruction=SYSTEM_PROMPT, temperature=temperature)
+
+
+def optimize_sql(sql_input, repo_path=None, temperature=0.1, max_retries=2, rag_strategy=RAGStrategy.HYBRID,
+                 rag=None, client=None, use_cache=True, offline=False, context_tokens=None, verify=False,
+                 verify_rows=None):
+    """
+    Optimize a SQL query with Gemini, optionally using repository context.
+
+    Pass an already indexed `rag` (see prepare_rag) to skip indexing, e.g. when
+    optimizing many queries against the same repository, and `client` to use
+    a specific Gemini client instead of the default one. Results for queries
+    already seen (up to whitespace, casing and literal values) are served from
+    the result cache unless `use_cache` is False.
+
+    A deterministic rule-based pass (see rule_optimizer) runs first, using
+    the repository's schema when there is one. With `offline=True` its
+    result is returned directly, without RAG or network calls; otherwise its
+    findings are passed to Gemini as hints.
+
+    Retrieved chunks are packed into at most `context_tokens` estimated
+    tokens (default SQLCLEAN_CONTEXT_TOKENS or 1500), DDL of the referenced
+    tables first; see context_packer.
+
+    With `verify=True` the result is run against the original on SQLite,
+    with the repository's schema and `verify_rows` synthetic rows per table
+    (see sql_verify). The comparison is reported in the output; results
+    that return different rows or are slower are retried, and finally
+    replaced by the original query.
+    """
+    stream = OptimizationStream(_optimize(
+        sql_input, repo_path, temperature, max_retries, rag_strategy, rag, client, use_cache, offline,
+        context_tokens, verify, verify_rows, streaming=False
+    ))
+    for _ in stream:
+        pass
+    return stream.result
+
+
+def optimize_sql_stream(sql_input, repo_path=None, temperature=0.1, max_retries=2, rag_strategy=RAGStrategy.HYBRID,
+                        rag=None, client=None, use_cache=True, offline=False, context_tokens=None, verify=False,
+                        verify_rows=None):
+    """
+    Streaming variant of optimize_sql, built on generate_content_stream.
+
+    Returns an OptimizationStream that yields note lines and model tokens
+    (with Markdown fences removed) as they arrive. Validation happens once
+    the model has finished; if it fails, a correction note and the
+    re-generated SQL follow. The final validated output is available as
+    `stream.result` after iteration.
+    """
+    return OptimizationStream(_optimize(
+        sql_input, repo_path, temperature, max_retries, rag_strategy, rag, client, use_cache, offline,
+        context_tokens, verify, verify_rows, streaming=True
+    ))
+
+
+def _verify(sql_input, sql, repo_path, verify_rows, expressions=None):
+    """Run sql_verify for a candidate, recording the outcome in the trace."""
+    with tracing.span("verify") as phase:
+        result = verify_sql(sql_input, sql, repo_path, verify_rows, expressions)
+        phase.set("status", result.status)
+    tracing.count(f"verify.{result.status}")
+    return result
+
+
+def _rejected(sql_input, result):
+    """Output for a result that failed verification: the notes and the original query."""
+    lines = result.notes() + ["-- Note: Optimized SQL was rejected by verification; returning the original query."]
+    return "\n".join(lines + [sql_input.strip()])
+
+
+def _optimize(sql_input, repo_path, temperature, max_retries, rag_strategy, rag, client, use_cache, offline,
+              context_tokens, verify, verify_rows, streaming):
+    """Shared core of optimize_sql/optimize_sql_stream. Yields text when streaming; returns the final output."""
     current_prompt = sql_input
+    context = ""
     user_notes = []
-    
-    # --- RAG Initialization ---
-    rag = RAGFactory.create_rag(rag_strategy)
+    # The schema for verification comes from the repository, also when a warm index is passed in
+    schema_repo = repo_path or getattr(rag, "repo_path", None)
+
+    # --- PHASE 0: Rule-based Pre-pass ---
+    with tracing.span("rule_prepass") as phase:
+        input_is_sql = is_valid_sql(sql_input)
+        # Without the schema, unqualified columns cannot be tied to their tables
+        schema = repo_schema(schema_repo) if input_is_sql and schema_repo else None
+        rule_result = rule_optimize(sql_input, schema=schema) if input_is_sql else None
+        phase.set("findings", len(rule_result.findings) if rule_result else 0)
+    if offline:
+        if rule_result is None:
+            output = "-- Note: Input did not look like standard SQL. Offline mode only optimizes SQL.\n" + sql_input.strip()
+        else:
+            findings = [f"-- Finding: {finding}" for finding in rule_result.findings]
+            notes = list(findings)
+            if rule_result.rules_applied:
+                notes.append(f"-- Note: Applied rules: {', '.join(rule_result.rules_applied)}.")
+            output = "\n".join(notes + [rule_result.sql]).strip()
+            if verify:
+                verification = _verify(sql_input, rule_result.sql, schema_repo, verify_rows)
+                if verification.regression:
+                    output = "\n".join(findings + [_rejected(sql_input, verification)]).strip()
+                else:
+                    output = "\n".join(notes + verification.notes() + [rule_result.sql]).strip()
+        if streaming:
+            yield output
+        return output
+    findings_text = rule_result.findings_text() if rule_result else ""
     
     # --- RAG Indexing ---
-    if repo_path:
-        print(f"Indexing repository with {rag_strategy.value} RAG: {repo_path}")
-        rag.index_directory(repo_path)
-        # Retrieve relevant docs
-        relevant_docs = rag.retrieve(sql_input, top_k=3)
+    if rag is None and repo_path:
+        rag = prepare_rag(repo_path, rag_strategy)
+    if rag is not None:
+        # Retrieve candidates, then keep what fits the context budget
+        with tracing.span("rag.retrieve", strategy=rag_strategy.value) as phase:
+            candidates = rag.retrieve(sql_input, top_k=CANDIDATES)
+            phase.set("docs", len(candidates))
+        with tracing.span("context.pack") as phase:
+            budget = DEFAULT_CONTEXT_TOKENS if context_tokens is None else context_tokens
+            relevant_docs, tokens = pack_context(candidates, sql_input, budget)
+            phase.set("docs", len(relevant_docs))
+            phase.set("tokens", tokens)
+        tracing.count("context.tokens", tokens)
         if relevant_docs:
-            context = "\n".join([f"From {doc['source']}:\n{doc['content']}" for doc in relevant_docs])
-            current_prompt = f"Context from repository:\n{context}\n\nSQL to optimize:\n{sql_input}"
+            context = format_context(relevant_docs)
             user_notes.append(f"-- Note: Used repository context ({rag_strategy.value} RAG) for optimization.")
+
+    prompt_parts = []
+    if context:
+        prompt_parts.append(f"Context from repository:\n{context}")
+    if findings_text:
+        prompt_parts.append(f"Static analysis findings (address these):\n{findings_text}")
+    if prompt_parts:
+        current_prompt = "\n\n".join(prompt_parts + [f"SQL to optimize:\n{sql_input}"])
     
     # --- PHASE 1: Input Defensive Check ---
-    if not is_valid_sql(sql_input):
-        print("User Input Invalid")
+    if not input_is_sql:
+        print("User Input Invalid", file=sys.stderr)
         user_notes.append("-- Note: Input did not look like standard SQL. Asking AI to interpret.")
         current_prompt = f"The following input might not be valid SQL. If it is text describing a query, write the SQL. If it's nonsense, say so: {sql_input}"
 
+    # --- Result Cache ---
+    cache = get_result_cache() if use_cache and input_is_sql else None
+    if cache is not None:
+        fingerprint, literals = fingerprint_sql(sql_input)
+        cache_key = make_cache_key(fingerprint, context, MODEL_NAME, temperature, SYSTEM_PROMPT + findings_text)
+        # Counted once we know whether the entry is usable for this query
+        cached, tier = cache.lookup(cache_key)
+        cached_sql = rebind_literals(cached["sql"], cached["literals"], literals) if cached is not None else None
+        if cached_sql is not None and verify:
+            # Rebound literals make it a different query: check it like a fresh answer
+            verification = _verify(sql_input, cached_sql, schema_repo, verify_rows)
+            if verification.regression:
+                tracing.count("cache.rejected")
+                cached_sql = None
+            else:
+                user_notes.extend(verification.notes())
+        tracing.count("cache.hits" if cached_sql is not None else "cache.misses")
+        cache.record(tier if cached_sql is not None else None)
+        if cached_sql is not None:
+            final_output = "\n".join(user_notes) + "\n" + cached_sql if user_notes else cached_sql
+            if streaming:
+                yield final_output.strip()
+            return final_output.strip()
+
+    client = client or get_client()
+    if streaming and user_notes:
+        yield "\n".join(user_notes) + "\n"
+
     attempts = 0
     while attempts <= max_retries:
         # --- PHASE 2: Gemini Call ---
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=current_prompt,
-            config=types.GenerateContentConfig(
-                system_instruction=SYSTEM_PROMPT,
-                temperature=temperature,
-            )
-        )
-        
-        suggested_sql = response.text.strip()
-        
-        # Clean Markdown backticks
-        if "```" in suggested_sql:
-            suggested_sql = suggested_sql.split("```")[1].replace("sql", "").strip()
+        tracing.count("llm.calls")
+        with tracing.span("llm.generate", attempt=attempts, streaming=streaming) as phase:
+            if streaming:
+                fences = FenceFilter()
+                parts = []
+                chunk = None
+                started = time.perf_counter()
+                for chunk in client.models.generate_content_stream(
+                    model=MODEL_NAME,
+                    contents=current_prompt,
+                    config=_generation_config(temperature)
+                ):
+                    text = chunk.text or ""
+                    if text and not parts:
+                        phase.set("first_token_s", time.perf_counter() - started)
+                    parts.append(text)
+                    visible = fences.feed(text)
+                    if visible:
+                        yield visible
+                yield fences.flush()
+                response_text = "".join(parts)
+                # The last chunk carries the usage totals
+                _record_usage(chunk)
+            else:
+                response = client.models.generate_content(
+                    model=MODEL_NAME,
+                    contents=current_prompt,
+                    config=_generation_config(temperature)
+                )
+                response_text = response.text
+                _record_usage(response)
+            phase.set("output_chars", len(response_text))
 
         # --- PHASE 3: Output Defensive Check ---
-        try:
-            sqlglot.transpile(suggested_sql)
-            
+        # Fences and prose are stripped and small syntax slips fixed locally;
+        # only what cannot be repaired costs another round-trip.
+        with tracing.span("validate") as phase:
+            repaired = repair_sql(response_text or "")
+            phase.set("dialect", repaired.dialect or "")
+            phase.set("fixes", len(repaired.fixes))
+        suggested_sql = repaired.sql
+
+        if repaired.ok and verify:
+            verification = _verify(sql_input, suggested_sql, schema_repo, verify_rows, repaired.expressions)
+            if verification.regression:
+                attempts += 1
+                tracing.count("llm.retries")
+                print(f"Attempt {attempts} rejected by verification: {verification.status}", file=sys.stderr)
+                if attempts > max_retries:
+                    output = _rejected(sql_input, verification)
+                    if streaming:
+                        yield f"\n{output}\n"
+                    return "\n".join(user_notes + [output]).strip()
+                current_prompt = verification_prompt(sql_input, suggested_sql, verification)
+                user_notes.append(
+                    f"-- Note: AI output was rejected by verification (Attempt {attempts}): "
+                    f"{verification.notes()[0][3:]}"
+                )
+                if streaming:
+                    yield f"\n{user_notes[-1]}\n"
+                continue
+
+        if repaired.ok:
+            if repaired.fixes:
+                tracing.count("llm.local_repairs")
+                user_notes.append(f"-- Note: AI output was repaired locally ({', '.join(repaired.fixes)}).")
+                if streaming:
+                    yield f"\n{user_notes[-1]}\n"
+            if verify:
+                user_notes.extend(verification.notes())
+                if streaming:
+                    yield "\n" + "\n".join(verification.notes()) + "\n"
+            if cache is not None:
+                cache.put(cache_key, {"sql": suggested_sql, "literals": literals})
+
             # Combine notes and final SQL for the user
             final_output = "\n".join(user_notes) + "\n" + suggested_sql if user_notes else suggested_sql
             return final_output.strip()
-            
-        except sqlglot.errors.ParseError as e:
-            attempts += 1
-            print(f"Attempt {attempts} failed. Error: {e}")
-            
-            if attempts > max_retries:
-                return f"-- [Validation Failed after {max_retries} attempts]\n-- Error: {e}\n{suggested_sql}"
-            
-            # --- PHASE 4: Self-Correction Loop ---
-            current_prompt = (
-                f"Your previous SQL output had a syntax error: {str(e)}\n"
-                f"Please fix this SQL and return ONLY the corrected code:\n{suggested_sql}"
-            )
-            user_notes.append(f"-- Note: AI output was corrected for syntax (Attempt {attempts}).")
-
-    return None
\ No newline at end of file
+
+        error = repaired.error
+        attempts += 1
+        tracing.count("llm.retries")
+        print(f"Attempt {attempts} failed. Error: {error}", file=sys.stderr)
+
+        if attempts > max_retries:
+            if streaming:
+                yield f"\n-- [Validation Failed after {max_retries} attempts]\n-- Error: {error}\n"
+            return f"-- [Validation Failed after {max_retries} attempts]\n-- Error: {error}\n{suggested_sql}"
+
+        # --- PHASE 4: Self-Correction Loop ---
+        current_prompt = repair_prompt(suggested_sql, error)
+        user_notes.append(f"-- Note: AI output was corrected for syntax (Attempt {attempts}).")
+        if streaming:
+            yield f"\n{user_notes[-1]}\n"
+
+    return None
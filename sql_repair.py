@@ -0,0 +1,203 @@
+"""
+Local repair of model output before re-prompting.
+
+The model's reply is reduced to SQL (first fenced block, surrounding prose
+dropped) and parsed under several dialects. If no dialect accepts it,
+cheap mechanical fixes are tried in turn (dangling commas, a missing
+closing parenthesis whose position is certain), each checked by parsing
+again, so a Gemini round-trip is only spent on errors that cannot be fixed
+locally without guessing at the query's meaning. The parsed expressions are
+returned with the result so callers do not parse the SQL again.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+import sqlglot
+from sqlglot.errors import ParseError, TokenError
+from sqlglot.tokens import Tokenizer, TokenType
+from chunking import PARSE_DIALECTS
+
+_SQL_START = re.compile(
+    r"^\s*(?:(?:SELECT|WITH|INSERT|UPDATE|DELETE|MERGE|CREATE|ALTER|DROP|TRUNCATE|EXPLAIN|VALUES|REPLACE|"
+    r"UPSERT|CALL|GRANT|REVOKE|SET|USE|BEGIN)\b|--|/\*|\()",
+    re.IGNORECASE,
+)
+# A sentence: capitalized word, at least three more words, no SQL operators
+_PROSE = re.compile(r"^[A-Z][a-z']*(?:[ ,]+[\w'()-]+){3,}[.!:]?$")
+# Tokens a comma can never directly precede
+_AFTER_COMMA = {
+    TokenType.FROM, TokenType.WHERE, TokenType.GROUP_BY, TokenType.ORDER_BY, TokenType.HAVING,
+    TokenType.LIMIT, TokenType.R_PAREN, TokenType.SEMICOLON, TokenType.UNION, TokenType.WINDOW,
+}
+# Tokens of a single operand (a name, a literal or *)
+_OPERAND = {
+    TokenType.VAR, TokenType.IDENTIFIER, TokenType.NUMBER, TokenType.STRING, TokenType.STAR, TokenType.DOT,
+}
+
+
+@dataclass
+class RepairResult:
+    sql: str
+    expressions: Optional[list] = None
+    dialect: Optional[str] = None
+    fixes: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.expressions is not None
+
+
+def strip_markdown_fences(text):
+    """Return the body of the first ``` fenced block (language tag dropped), or the text itself."""
+    text = text.strip()
+    if "```" not in text:
+        return text
+    # An unclosed fence still yields everything after it
+    body = text.split("```")[1]
+    first_line, newline, rest = body.partition("\n")
+    if newline and re.fullmatch(r"[\w+-]*", first_line.strip()):
+        body = rest
+    return body.strip()
+
+
+def strip_prose(sql):
+    """Drop explanation lines before the first SQL line and trailing sentences after the query."""
+    lines = sql.splitlines()
+    start = next((i for i, line in enumerate(lines) if _SQL_START.match(line)), None)
+    if start is None:
+        return sql
+    end = len(lines)
+    while end > start + 1 and (not lines[end - 1].strip() or _PROSE.match(lines[end - 1].strip())):
+        end -= 1
+    return "\n".join(lines[start:end]).strip()
+
+
+def describe_error(error):
+    """Short, escape-free description of a sqlglot error (the str() carries ANSI underlines)."""
+    details = getattr(error, "errors", None)
+    if details:
+        first = details[0]
+        near = (first.get("highlight") or "").strip()
+        where = f"line {first.get('line')}, column {first.get('col')}"
+        return f"{first.get('description')} at {where}" + (f" near '{near}'" if near else "")
+    return re.sub(r"\x1b\[[0-9;]*m", "", str(error))
+
+
+def parse_sql(sql, dialects=PARSE_DIALECTS):
+    """
+    Parse with each dialect in turn.
+
+    Returns:
+        (expressions, dialect, error): the expressions and dialect of the
+        first successful parse, or (None, None, error of the first dialect).
+    """
+    first_error = None
+    for dialect in dialects:
+        try:
+            expressions = sqlglot.parse(sql, read=dialect)
+        except (ParseError, TokenError) as e:
+            first_error = first_error or describe_error(e)
+            continue
+        if any(expression is not None for expression in expressions):
+            return expressions, dialect, None
+        first_error = first_error or "no SQL statement found"
+    return None, None, first_error
+
+
+def _tokens(sql):
+    try:
+        return Tokenizer().tokenize(sql)
+    except TokenError:
+        return None
+
+
+def fix_dangling_commas(sql):
+    """Remove commas directly before FROM/WHERE/... , a closing parenthesis or the end."""
+    tokens = _tokens(sql)
+    if not tokens:
+        return sql
+    drop = []
+    for i, token in enumerate(tokens):
+        if token.token_type == TokenType.COMMA:
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+            if following is None or following.token_type in _AFTER_COMMA:
+                drop.append(token.start)
+    for start in reversed(drop):
+        sql = sql[:start] + sql[start + 1:]
+    return sql
+
+
+def fix_parentheses(sql):
+    """
+    Close one unclosed parenthesis at the end, when only an operand follows it.
+
+    Anywhere else the closing position is a guess that can change the query
+    (`x IN (1, 2 AND y = 3`), and a stray closing parenthesis may be missing
+    its opening one, so those are left for the re-prompt.
+    """
+    tokens = _tokens(sql)
+    if not tokens:
+        return sql
+    if tokens[-1].token_type == TokenType.SEMICOLON:
+        tokens = tokens[:-1]
+    opened = []
+    for i, token in enumerate(tokens):
+        if token.token_type == TokenType.L_PAREN:
+            opened.append(i)
+        elif token.token_type == TokenType.R_PAREN:
+            if not opened:
+                return sql
+            opened.pop()
+    if len(opened) != 1:
+        return sql
+    operand = tokens[opened[0] + 1:]
+    if not operand or any(token.token_type not in _OPERAND for token in operand):
+        return sql
+    body = sql.rstrip()
+    semicolon = body.endswith(";")
+    return body.rstrip(";").rstrip() + ")" + (";" if semicolon else "")
+
+
+FIXES = [
+    ("surrounding prose", strip_prose),
+    ("dangling comma", fix_dangling_commas),
+    ("unclosed parenthesis", fix_parentheses),
+]
+
+
+def repair_sql(text, dialects=PARSE_DIALECTS):
+    """
+    Extract SQL from a model reply and make it parse, locally if possible.
+
+    Fixes are applied cumulatively and the first version that parses wins.
+    If none does, the result carries the extracted SQL unchanged and the
+    error of parsing it, for an error-focused re-prompt.
+    """
+    sql = strip_markdown_fences(text)
+    expressions, dialect, error = parse_sql(sql, dialects)
+    if expressions is not None:
+        return RepairResult(sql, expressions, dialect)
+
+    candidate = sql
+    applied = []
+    for name, fix in FIXES:
+        fixed = fix(candidate)
+        if fixed == candidate:
+            continue
+        candidate = fixed
+        applied.append(name)
+        expressions, dialect, _ = parse_sql(candidate, dialects)
+        if expressions is not None:
+            return RepairResult(candidate, expressions, dialect, applied)
+    return RepairResult(sql, error=error)
+
+
+def repair_prompt(sql, error):
+    """Minimal re-prompt: the error and the SQL, nothing else."""
+    return (
+        f"This SQL does not parse: {error}.\n"
+        "Fix only that syntax error, change nothing else, and return ONLY the corrected SQL.\n\n"
+        f"{sql}"
+    )
@@ -0,0 +1,581 @@
+"""
+Execution-based verification of optimized SQL on an embedded SQLite database.
+
+The repository's DDL (see schema_index) is transpiled to SQLite with
+sqlglot and filled with deterministic synthetic rows (SQLCLEAN_VERIFY_ROWS
+per table, default 1000): unique columns get distinct values, foreign keys
+point at existing rows, ENUM columns use their declared values, and
+nullable columns are sometimes NULL. For each check, about one row in ten
+also takes the literal values the queries compare columns against, so that
+their predicates select something (rolled back afterwards). The original
+and the optimized query are then both run against it:
+- EXPLAIN QUERY PLAN of each, e.g. a full scan turning into an index search
+- result equivalence: rows compared as multisets, and in order when the
+  original has a top-level ORDER BY (by its keys, so ties may come in any
+  order; a top-level LIMIT must match and is compared without it, since
+  ties may be cut differently)
+- runtime: median of several runs each
+
+An optimization that returns different rows, fails to run, or is measurably
+slower is a regression; optimize_sql re-prompts with the problem and finally
+falls back to the original query. Queries that cannot be checked (no schema,
+not a SELECT, features SQLite lacks, or no rows from either query, which
+proves nothing) are reported as skipped.
+
+    result = verify_sql(original, optimized, "sqlSchema/ecommerce")
+    print("\\n".join(result.notes()))
+"""
+
+import os
+import random
+import sqlite3
+import statistics
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional
+from sqlglot import exp
+from chunking import parse_statement
+from schema_index import SchemaIndex
+from sql_repair import parse_sql
+
+DEFAULT_ROWS = int(os.environ.get("SQLCLEAN_VERIFY_ROWS", 1000))
+# Timed runs per query (after one untimed run whose rows are compared)
+RUNS = 5
+# A single run slower than this is aborted
+TIMEOUT_S = 5.0
+# Larger results are not compared
+MAX_RESULT_ROWS = 100_000
+# The optimized query may be this much slower (relative, and absolute in ms) before it counts as a regression
+SLOWDOWN_TOLERANCE = 0.25
+MIN_SLOWDOWN_MS = 0.5
+NULL_RATE = 0.05
+# One row in this many takes each literal the queries compare a column against
+LITERAL_EVERY = 10
+REGRESSIONS = ("slower", "mismatch", "failed")
+
+_ENUM_TYPES = (exp.DataType.Type.ENUM, exp.DataType.Type.SET)
+_COMPARISONS = (exp.EQ, exp.NEQ, exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Like, exp.ILike, exp.NullSafeEQ)
+
+
+@dataclass
+class VerifyResult:
+    """
+    Outcome of a verification. status is one of 'verified', 'slower',
+    'mismatch', 'failed' (the optimized query does not run) or 'skipped'.
+    """
+    status: str
+    reason: str = ""
+    rows: Optional[int] = None
+    original_ms: Optional[float] = None
+    optimized_ms: Optional[float] = None
+    original_plan: List[str] = field(default_factory=list)
+    optimized_plan: List[str] = field(default_factory=list)
+    scale: int = 0
+
+    @property
+    def regression(self):
+        return self.status in REGRESSIONS
+
+    @property
+    def speedup(self):
+        if not self.original_ms or not self.optimized_ms:
+            return None
+        return self.original_ms / self.optimized_ms
+
+    def timing(self):
+        return f"{self.original_ms:.3g} ms -> {self.optimized_ms:.3g} ms"
+
+    def notes(self):
+        """SQL comment lines describing the result, for the output."""
+        if self.status == "skipped":
+            return [f"-- Verification skipped: {self.reason}."]
+        where = f"SQLite, {self.scale} rows per table"
+        if self.status == "failed":
+            return [f"-- Verification ({where}): optimized query failed: {self.reason}."]
+        if self.status == "mismatch":
+            return [f"-- Verification ({where}): optimized query returns different rows ({self.reason})."]
+        if self.status == "slower":
+            lines = [f"-- Verification ({where}): optimized query is slower ({self.reason or self.timing()})."]
+        else:
+            speedup = self.speedup
+            change = f"{speedup:.1f}x faster" if speedup >= 1 else f"{1 / speedup:.1f}x slower, within noise"
+            lines = [f"-- Verified ({where}): same {self.rows} row{'' if self.rows == 1 else 's'}, {self.timing()} ({change})."]
+        if self.original_plan != self.optimized_plan:
+            lines.append(f"-- Plan before: {'; '.join(self.original_plan)}")
+            lines.append(f"-- Plan after:  {'; '.join(self.optimized_plan)}")
+        return lines
+
+
+def verification_prompt(original, optimized, result):
+    """Re-prompt for a regression: both queries and what went wrong."""
+    if result.status == "mismatch":
+        problem = f"returns different rows than the original ({result.reason})"
+    elif result.status == "failed":
+        problem = f"fails to run ({result.reason})"
+    else:
+        problem = f"is slower than the original ({result.reason or result.timing()})"
+    return (
+        f"Your optimized SQL {problem} when both are run on the schema with sample data.\n"
+        "Optimize the original query again so that it returns exactly the same rows and is not slower. "
+        "Return ONLY the SQL.\n\n"
+        f"Original SQL:\n{original}\n\nYour previous version:\n{optimized}"
+    )
+
+
+# --- Schema and synthetic data ---
+
+def _sqlite_ddl(ddl):
+    """
+    Transpile one CREATE statement to SQLite. Returns (sql, {column: enum values}),
+    or (None, {}) if it does not parse. ENUM/SET columns become TEXT.
+    """
+    parsed = parse_statement(ddl)
+    if not isinstance(parsed, exp.Create):
+        return None, {}
+    enums = {}
+    for column in parsed.find_all(exp.ColumnDef):
+        kind = column.args.get("kind")
+        if isinstance(kind, exp.DataType) and kind.this in _ENUM_TYPES:
+            enums[column.name] = [value.name for value in kind.expressions if isinstance(value, exp.Literal)]
+            kind.replace(exp.DataType.build("TEXT"))
+    return parsed.sql(dialect="sqlite"), enums
+
+
+def _fallback_ddl(table):
+    """Bare CREATE TABLE from the parsed column list, for DDL SQLite rejects."""
+    columns = [f'"{name}" {_column_type(kind)}' for name, kind in table.columns.items()]
+    if table.primary_key:
+        columns.append("PRIMARY KEY (" + ", ".join(f'"{name}"' for name in table.primary_key) + ")")
+    return f'CREATE TABLE "{table.name}" ({", ".join(columns)})'
+
+
+def _column_type(declared):
+    """Simplified SQLite type for a declared column type; also decides which values are generated."""
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return "INTEGER"
+    if any(word in declared for word in ("CHAR", "CLOB", "TEXT", "ENUM")):
+        return "TEXT"
+    if any(word in declared for word in ("REAL", "FLOA", "DOUB", "DEC", "NUM")):
+        return "REAL"
+    if "BOOL" in declared:
+        return "BOOLEAN"
+    if "DATE" in declared or "TIME" in declared:
+        return "DATETIME" if "TIME" in declared else "DATE"
+    return "TEXT"
+
+
+def _load_order(conn, tables):
+    """Tables ordered so referenced tables are filled before the tables referencing them."""
+    references = {
+        table: {row[2] for row in conn.execute(f'PRAGMA foreign_key_list("{table}")')} - {table}
+        for table in tables
+    }
+    ordered = []
+    visiting = set()
+
+    def visit(table):
+        if table in ordered or table in visiting:
+            return
+        visiting.add(table)
+        for ref in sorted(references.get(table, ())):
+            if ref in references:
+                visit(ref)
+        ordered.append(table)
+
+    for table in tables:
+        visit(table)
+    return ordered
+
+
+class Sandbox:
+    """An in-memory SQLite database with a repository's schema and synthetic rows."""
+
+    def __init__(self, schema_index, rows=DEFAULT_ROWS, seed=0):
+        self.rows = rows
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.lock = threading.Lock()
+        self.tables = []
+        self._enums = {}
+        self._build(schema_index, random.Random(seed))
+
+    def _build(self, schema_index, rng):
+        for table in schema_index.tables.values():
+            if table.kind != "table":
+                continue
+            sql, enums = _sqlite_ddl(table.ddl)
+            try:
+                self.conn.execute(sql or _fallback_ddl(table))
+            except sqlite3.Error:
+                try:
+                    self.conn.execute(_fallback_ddl(table))
+                except sqlite3.Error:
+                    continue
+            self.tables.append(table.name)
+            self._enums[table.name] = {name.lower(): values for name, values in enums.items() if values}
+
+        for name in _load_order(self.conn, self.tables):
+            self._fill(name, rng)
+
+        # Indexes after the data, as a bulk load would; then views
+        for table in schema_index.tables.values():
+            statements = [index.ddl for index in table.indexes] if table.kind == "table" else [table.ddl]
+            for ddl in statements:
+                sql, _ = _sqlite_ddl(ddl)
+                if sql:
+                    try:
+                        self.conn.execute(sql)
+                    except sqlite3.Error:
+                        pass
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+
+    def _unique_columns(self, table):
+        unique = set()
+        for index in self.conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+            if index[2]:
+                columns = self.conn.execute(f'PRAGMA index_info("{index[1]}")').fetchall()
+                if len(columns) == 1:
+                    unique.add(columns[0][2])
+        return unique
+
+    def _fill(self, table, rng):
+        info = self.conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+        unique = self._unique_columns(table)
+        foreign = {}
+        for row in self.conn.execute(f'PRAGMA foreign_key_list("{table}")'):
+            ref_table, column, ref_column = row[2], row[3], row[4]
+            if ref_table == table:
+                continue
+            try:
+                values = [value for (value,) in self.conn.execute(
+                    f'SELECT "{ref_column or "rowid"}" FROM "{ref_table}"'
+                )]
+            except sqlite3.Error:
+                continue
+            foreign[column] = values
+        enums = self._enums.get(table, {})
+
+        def value(column, i):
+            _, name, declared, notnull, _, pk = column
+            if name in foreign and foreign[name]:
+                return rng.choice(foreign[name])
+            kind = _column_type(declared)
+            if pk or name in unique:
+                return i if kind == "INTEGER" else f"{name}_{i}"
+            if not notnull and rng.random() < NULL_RATE:
+                return None
+            if name.lower() in enums:
+                return rng.choice(enums[name.lower()])
+            if kind == "INTEGER":
+                # *_id columns without a declared foreign key still join on 1..rows
+                return rng.randint(1, self.rows) if name.lower().endswith("id") else rng.randint(0, 100)
+            if kind == "REAL":
+                return round(rng.uniform(0, 1000), 2)
+            if kind == "BOOLEAN":
+                return rng.randint(0, 1)
+            if kind in ("DATE", "DATETIME"):
+                day = time.gmtime(1577836800 + rng.randint(0, 5 * 365) * 86400 + rng.randint(0, 86399))
+                return time.strftime("%Y-%m-%d" if kind == "DATE" else "%Y-%m-%d %H:%M:%S", day)
+            # Few distinct values, so filters and GROUP BYs have something to match
+            return f"{name}_{rng.randint(1, max(1, self.rows // 20))}"
+
+        columns = ", ".join(f'"{column[1]}"' for column in info)
+        placeholders = ", ".join("?" for _ in info)
+        self.conn.executemany(
+            f'INSERT OR IGNORE INTO "{table}" ({columns}) VALUES ({placeholders})',
+            ([value(column, i) for column in info] for i in range(1, self.rows + 1))
+        )
+
+    # --- Running queries ---
+
+    def _deadline(self, seconds):
+        deadline = time.perf_counter() + seconds
+        self.conn.set_progress_handler(lambda: 1 if time.perf_counter() > deadline else 0, 10000)
+
+    def _run(self, sql):
+        """(rows, elapsed ms) of one run; raises sqlite3.Error, or TimeoutError after TIMEOUT_S."""
+        self._deadline(TIMEOUT_S)
+        start = time.perf_counter()
+        try:
+            rows = self.conn.execute(sql).fetchmany(MAX_RESULT_ROWS + 1)
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                raise TimeoutError(f"exceeded {TIMEOUT_S:g}s") from None
+            raise
+        finally:
+            self.conn.set_progress_handler(None, 0)
+        return rows, (time.perf_counter() - start) * 1000
+
+    def _plan(self, sql):
+        return [row[3] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+    def _median_ms(self, sql, first_ms):
+        times = [first_ms]
+        for _ in range(RUNS):
+            times.append(self._run(sql)[1])
+        return statistics.median(times)
+
+    def _result_columns(self, sql):
+        """Lower-cased result column names of a query, without running it."""
+        return [d[0].lower() for d in self.conn.execute(f"SELECT * FROM ({sql}) LIMIT 0").description]
+
+    def _columns(self, table):
+        return {row[1].lower(): row[1] for row in self.conn.execute(f'PRAGMA table_info("{table}")')}
+
+    def _seed_literals(self, queries):
+        """
+        Set every LITERAL_EVERY-th row of each compared column to the literals
+        the queries compare it with. The n-th literal of every column goes to
+        the same rows, so conjunctions (a = 1 AND b = 'x') match as well.
+        """
+        tables = {name.lower(): name for name in self.tables}
+        seeds = {}
+        for query in queries:
+            for key, values in _compared_literals(query, tables, self._columns).items():
+                known = seeds.setdefault(key, [])
+                known += [value for value in values if value not in known]
+        for (table, column), values in seeds.items():
+            for offset, value in enumerate(values[:LITERAL_EVERY]):
+                try:
+                    self.conn.execute(
+                        f'UPDATE OR IGNORE "{table}" SET "{column}" = ? WHERE rowid % ? = ?',
+                        (value, LITERAL_EVERY, offset)
+                    )
+                except sqlite3.Error:
+                    pass
+
+    def verify(self, original, optimized):
+        """Compare two single SELECT statements given as sqlglot expressions."""
+        limits = [query.args.get("limit") for query in (original, optimized)]
+        if (limits[0] and limits[0].sql()) != (limits[1] and limits[1].sql()):
+            return VerifyResult("mismatch", "LIMIT differs", scale=self.rows)
+
+        with self.lock:
+            # The seeded literals only apply to this check
+            self.conn.execute("BEGIN")
+            try:
+                self._seed_literals((original, optimized))
+                return self._compare_runs(original, optimized, limits)
+            finally:
+                self.conn.rollback()
+
+    def _compare_runs(self, original, optimized, limits):
+        """Plans, result comparison and timings; runs under the lock."""
+        original_sql = original.sql(dialect="sqlite")
+        optimized_sql = optimized.sql(dialect="sqlite")
+        try:
+            original_plan = self._plan(original_sql)
+            original_rows, original_first = self._run(original_sql)
+        except (sqlite3.Error, TimeoutError) as e:
+            return VerifyResult("skipped", f"the original query does not run on SQLite ({e})")
+        try:
+            optimized_plan = self._plan(optimized_sql)
+            optimized_rows, optimized_first = self._run(optimized_sql)
+        except TimeoutError as e:
+            return VerifyResult("slower", f"optimized query {e}", scale=self.rows)
+        except sqlite3.Error as e:
+            return VerifyResult("failed", str(e), scale=self.rows)
+
+        if limits[0] is not None:
+            # Ties may be cut differently: compare everything before the LIMIT
+            original_rows = self._run(_without_limit(original).sql(dialect="sqlite"))[0]
+            optimized_rows = self._run(_without_limit(optimized).sql(dialect="sqlite"))[0]
+        if len(original_rows) > MAX_RESULT_ROWS or len(optimized_rows) > MAX_RESULT_ROWS:
+            return VerifyResult("skipped", f"more than {MAX_RESULT_ROWS} result rows to compare")
+        difference = _compare(original_rows, optimized_rows)
+        if not difference and original.args.get("order"):
+            keys = _order_keys(original, self._result_columns(original_sql))
+            difference = _compare_order(original_rows, optimized_rows, keys)
+        if difference:
+            return VerifyResult("mismatch", difference, scale=self.rows)
+        if not original_rows:
+            return VerifyResult("skipped", "neither query returns rows on the sample data, which proves nothing")
+
+        original_ms = self._median_ms(original_sql, original_first)
+        optimized_ms = self._median_ms(optimized_sql, optimized_first)
+
+        status = "verified"
+        if optimized_ms > original_ms * (1 + SLOWDOWN_TOLERANCE) and optimized_ms - original_ms > MIN_SLOWDOWN_MS:
+            status = "slower"
+        return VerifyResult(
+            status, rows=len(original_rows), original_ms=original_ms, optimized_ms=optimized_ms,
+            original_plan=original_plan, optimized_plan=optimized_plan, scale=self.rows
+        )
+
+    def close(self):
+        self.conn.close()
+
+
+def _literal_value(literal):
+    if literal.is_string:
+        return literal.this
+    try:
+        return int(literal.this)
+    except ValueError:
+        return float(literal.this)
+
+
+def _compared_literals(query, tables, columns_of):
+    """
+    {(table, column): [values]} for predicates comparing a column with
+    literals (=, <, LIKE, IN, BETWEEN, ...). `tables` maps lower-cased names
+    to sandbox tables; columns_of(table) maps lower-cased column names.
+    """
+    aliases = {}
+    for table in query.find_all(exp.Table):
+        name = tables.get(table.name.lower())
+        if name is not None:
+            aliases[table.alias_or_name.lower()] = name
+
+    pairs = []
+    for node in query.find_all(*_COMPARISONS, exp.In, exp.Between):
+        if isinstance(node, exp.In):
+            pairs += [(node.this, value) for value in node.expressions]
+        elif isinstance(node, exp.Between):
+            pairs += [(node.this, node.args.get("low")), (node.this, node.args.get("high"))]
+        else:
+            pairs += [(node.this, node.expression), (node.expression, node.this)]
+
+    found = {}
+    for column, literal in pairs:
+        if not isinstance(column, exp.Column) or not isinstance(literal, exp.Literal):
+            continue
+        value = _literal_value(literal)
+        if isinstance(value, str) and isinstance(literal.parent, (exp.Like, exp.ILike)):
+            # A value the pattern matches
+            value = value.replace("%", "").replace("_", "x")
+        if column.table:
+            candidates = [aliases[column.table.lower()]] if column.table.lower() in aliases else []
+        else:
+            candidates = sorted(set(aliases.values()))
+        for table in candidates:
+            name = columns_of(table).get(column.name.lower())
+            if name is not None:
+                found.setdefault((table, name), []).append(value)
+    return found
+
+
+def _without_limit(query):
+    query = query.copy()
+    query.set("limit", None)
+    query.set("offset", None)
+    return query
+
+
+def _normalize(value):
+    if isinstance(value, float):
+        value = round(value, 6)
+        return int(value) if value.is_integer() else value
+    return value
+
+
+def _compare(original, optimized):
+    """Describe how two result sets differ as multisets, or return None if they match."""
+    if original and optimized and len(original[0]) != len(optimized[0]):
+        return f"{len(original[0])} vs {len(optimized[0])} columns"
+    if len(original) != len(optimized):
+        return f"{len(original)} vs {len(optimized)} rows"
+    normalize = lambda rows: Counter(tuple(_normalize(v) for v in row) for row in rows)
+    missing = sum((normalize(original) - normalize(optimized)).values())
+    if missing:
+        return f"{missing} of {len(original)} rows differ"
+    return None
+
+
+def _order_keys(query, columns):
+    """Result column positions of the query's ORDER BY keys, or None if a key is not selected."""
+    selects = [select.unalias() for select in query.selects]
+    star = any(select.is_star for select in selects)
+    positions = []
+    for ordered in query.args["order"].expressions:
+        key = ordered.this
+        if isinstance(key, exp.Literal) and key.is_int:
+            positions.append(int(key.this) - 1)
+        elif not star and key in selects:
+            positions.append(selects.index(key))
+        elif isinstance(key, exp.Column) and (star or not key.table) and columns.count(key.name.lower()) == 1:
+            # An output alias, or a column of SELECT *
+            positions.append(columns.index(key.name.lower()))
+        else:
+            return None
+    return positions
+
+
+def _compare_order(original, optimized, keys=None):
+    """
+    Describe where two equal result multisets are ordered differently, or
+    return None. Only the `keys` positions are compared, so rows that tie on
+    them may come in any order; without keys whole rows must line up.
+    """
+    project = (lambda row: row) if keys is None else (lambda row: tuple(row[i] for i in keys))
+    for n, (a, b) in enumerate(zip(original, optimized), start=1):
+        if tuple(map(_normalize, project(a))) != tuple(map(_normalize, project(b))):
+            return f"rows are not in ORDER BY order (from row {n})"
+    return None
+
+
+def _single_query(sql, expressions=None):
+    """The one SELECT in sql (or the given parsed expressions), or (None, reason)."""
+    if expressions is None:
+        expressions, _, error = parse_sql(sql)
+        if expressions is None:
+            return None, f"does not parse ({error})"
+    statements = [expression for expression in expressions if expression is not None]
+    if len(statements) != 1:
+        return None, "is not a single statement"
+    if not isinstance(statements[0], exp.Query):
+        return None, "is not a SELECT (only queries are executed)"
+    return statements[0], None
+
+
+# --- Sandboxes per repository ---
+
+_sandboxes = {}
+_sandboxes_lock = threading.Lock()
+
+
+def get_sandbox(repo_path, rows=DEFAULT_ROWS):
+    """
+    The sandbox for a repository at a scale, rebuilt when its DDL changes
+    (the schema index only re-parses changed files).
+    """
+    key = (os.path.realpath(repo_path), rows)
+    with _sandboxes_lock:
+        schema_index, sandbox, fingerprint = _sandboxes.get(key, (SchemaIndex(), None, None))
+        schema_index.index_directory(repo_path)
+        current = tuple(sorted(
+            (table.name, table.ddl, tuple(index.ddl for index in table.indexes))
+            for table in schema_index.tables.values()
+        ))
+        if sandbox is None or current != fingerprint:
+            if sandbox is not None:
+                sandbox.close()
+            sandbox = Sandbox(schema_index, rows)
+            _sandboxes[key] = (schema_index, sandbox, current)
+        return sandbox
+
+
+def verify_sql(original, optimized, repo_path, rows=None, optimized_expressions=None):
+    """
+    Verify `optimized` against `original` on a sandbox of the repository's
+    schema. Pass `optimized_expressions` (e.g. RepairResult.expressions) to
+    skip parsing the optimized SQL again.
+    """
+    if not repo_path:
+        return VerifyResult("skipped", "no repository schema (use --repo)")
+    original_query, reason = _single_query(original)
+    if original_query is None:
+        return VerifyResult("skipped", f"original query {reason}")
+    optimized_query, reason = _single_query(optimized, optimized_expressions)
+    if optimized_query is None:
+        if reason.startswith("does not parse"):
+            return VerifyResult("failed", reason)
+        return VerifyResult("skipped", f"optimized SQL {reason}")
+
+    sandbox = get_sandbox(repo_path, rows or DEFAULT_ROWS)
+    if not sandbox.tables:
+        return VerifyResult("skipped", "no CREATE TABLE statements in the repository")
+    return sandbox.verify(original_query, optimized_query)
@@ -0,0 +1,42 @@
+from context_packer import estimate_tokens, format_context, pack_context
+
+
+def chunk(content, source="repo/notes.md", **metadata):
+    return {"content": content, "source": source, "metadata": metadata}
+
+
+QUERY = "SELECT * FROM orders o JOIN customers c ON c.id = o.customer_id"
+
+
+def test_ddl_of_referenced_tables_comes_first():
+    docs = [
+        chunk("Use covering indexes for hot paths."),
+        chunk("CREATE TABLE payments (id INT);", "payments.sql", statements=["create_table"], tables=["payments"]),
+        chunk("CREATE TABLE orders (id INT);", "orders.sql", statements=["create_table"], tables=["orders"]),
+        chunk("CREATE TABLE customers (id INT);", "customers.sql", type="schema", table="customers"),
+    ]
+    packed, tokens = pack_context(docs, QUERY, max_tokens=1000)
+    assert [doc["source"] for doc in packed] == ["orders.sql", "customers.sql", "repo/notes.md", "payments.sql"]
+    # Per-chunk estimates round up, so the total bounds the formatted context
+    assert estimate_tokens(format_context(packed)) <= tokens <= 1000
+
+
+def test_duplicates_and_overlapping_chunks_are_dropped():
+    text = "orders are partitioned by month and indexed on customer id and status for reporting"
+    docs = [chunk(text), chunk(text), chunk(text + " queries"), chunk("an unrelated note about payments")]
+    packed, _ = pack_context(docs, QUERY, max_tokens=1000)
+    assert [doc["content"] for doc in packed] == [text, "an unrelated note about payments"]
+
+
+def test_budget_is_respected_and_first_chunk_truncated():
+    big = "\n".join(f"line {i} about orders and indexes" for i in range(200))
+    docs = [chunk(big), chunk("short note on payments")]
+    packed, tokens = pack_context(docs, QUERY, max_tokens=100)
+    assert tokens <= 100
+    assert packed[0]["content"] and len(packed[0]["content"]) < len(big)
+    assert estimate_tokens(format_context(packed)) <= tokens
+
+
+def test_empty_inputs():
+    assert pack_context([], QUERY) == ([], 0)
+    assert pack_context([chunk("x")], QUERY, max_tokens=0) == ([], 0)
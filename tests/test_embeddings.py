@@ -0,0 +1,63 @@
+import threading
+import numpy as np
+from embeddings import EmbeddingService
+
+
+class GatedModel:
+    """Encodes once `release` is set; records every text it is asked for."""
+
+    def __init__(self):
+        self.texts = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False):
+        self.texts.extend(texts)
+        self.started.set()
+        self.release.wait(5)
+        vectors = np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+def make_service(model):
+    service = EmbeddingService("test-model", disk_cache=False)
+    service._model = model
+    return service
+
+
+def test_embeddings_are_normalized():
+    model = GatedModel()
+    model.release.set()
+    vectors = make_service(model).encode(["SELECT 1", "SELECT a FROM t"])
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+
+def test_cache_is_usable_while_the_model_runs():
+    model = GatedModel()
+    model.release.set()
+    service = make_service(model)
+    service.encode(["cached"])
+    model.started.clear()
+    model.release.clear()
+
+    results = {}
+    threads = [
+        threading.Thread(target=lambda: results.setdefault("slow", service.encode(["slow"]))),
+        threading.Thread(target=lambda: results.setdefault("same", service.encode(["slow", "cached"]))),
+    ]
+    threads[0].start()
+    assert model.started.wait(5)
+    # The lock is free while the model encodes
+    reader = threading.Thread(target=lambda: results.setdefault("cached", service.encode(["cached"])))
+    reader.start()
+    reader.join(2)
+    assert "cached" in results
+    threads[1].start()
+    model.release.set()
+    for thread in threads:
+        thread.join()
+    # The second caller waited for the first call's vector instead of encoding it again
+    assert model.texts == ["cached", "slow"]
+    assert np.array_equal(results["same"][0], results["slow"][0])
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import deque
+import pytest
+
+hybrid_rag = pytest.importorskip("hybrid_rag", exc_type=ImportError)
+
+
+class SlowRetriever:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def retrieve(self, query, top_k, query_embedding=None):
+        time.sleep(self.delay)
+        return [({"content": query, "source": "s.sql", "id": str(self.delay)}, 1.0)]
+
+    retrieve_scored = retrieve
+
+
+class NoEmbedder:
+    def encode_one(self, query):
+        return None
+
+
+def make_rag(timeout, concurrency=1, **delays):
+    # Only the fan-out state: no embedding model or vector stores
+    rag = hybrid_rag.HybridRAG.__new__(hybrid_rag.HybridRAG)
+    rag.retriever_timeout = timeout
+    rag.concurrency = concurrency
+    rag.embedder = NoEmbedder()
+    rag._latencies = {name: deque() for name in rag.RETRIEVERS}
+    rag._pool = rag._new_pool()
+    rag._pool_lock = threading.Lock()
+    for name in rag.RETRIEVERS:
+        setattr(rag, f"{name}_rag", SlowRetriever(delays.get(name, 0.0)))
+    return rag
+
+
+def test_hung_retriever_is_skipped_and_its_pool_replaced():
+    rag = make_rag(0.2, chroma=2.0)
+    pool = rag._pool
+    ranked, timings = rag._fan_out("q", 3)
+    assert sorted(ranked) == ["faiss", "pattern", "tfidf"]
+    assert timings["chroma"] is None
+    assert timings["timeouts"] == ["chroma"]
+    assert rag._pool is not pool
+    assert pool._shutdown
+
+
+def test_deadline_counts_from_retriever_start():
+    rag = make_rag(0.3, chroma=0.2)
+    # Occupy every thread so the retrievers start late
+    blockers = [rag._pool.submit(time.sleep, 0.2) for _ in rag.RETRIEVERS]
+    ranked, timings = rag._fan_out("q", 3)
+    assert all(blocker.done() for blocker in blockers)
+    assert sorted(ranked) == sorted(rag.RETRIEVERS)
+    assert timings["timeouts"] == []
+
+
+def test_concurrent_calls_get_their_own_threads_and_timings():
+    rag = make_rag(0.2, concurrency=4, tfidf=0.15, chroma=0.15, faiss=0.15, pattern=0.15)
+    results = [None] * 4
+
+    def call(i):
+        results[i] = rag._fan_out(f"q{i}", 3)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i, (ranked, timings) in enumerate(results):
+        assert timings["timeouts"] == []
+        assert all(ranked[name][0][0]["content"] == f"q{i}" for name in rag.RETRIEVERS)
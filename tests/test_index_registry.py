@@ -0,0 +1,83 @@
+import threading
+import time
+import index_registry
+from index_registry import ReadWriteLock, WarmIndex
+
+
+class SlowRAG:
+    documents = []
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.indexed = 0
+        self._lock = threading.Lock()
+
+    def index_directory(self, repo_path):
+        time.sleep(0.2)
+        self.indexed += 1
+
+    def retrieve(self, query, top_k=5):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.1)
+        with self._lock:
+            self.active -= 1
+        return [query]
+
+
+def warm_index(rag):
+    entry = WarmIndex.__new__(WarmIndex)
+    entry.repo_path = "repo"
+    entry.rag = rag
+    entry.lock = ReadWriteLock()
+    entry.indexed_at = time.monotonic()
+    entry.size = 0
+    entry.closed = False
+    return entry
+
+
+def run_all(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_retrievals_run_concurrently():
+    rag = SlowRAG()
+    entry = warm_index(rag)
+    start = time.perf_counter()
+    run_all([lambda: entry.retrieve("q")] * 4)
+    assert rag.peak == 4
+    assert time.perf_counter() - start < 0.3
+
+
+def test_refresh_excludes_retrievals():
+    rag = SlowRAG()
+    entry = warm_index(rag)
+    seen = []
+
+    def refresh():
+        entry.refresh(force=True)
+        seen.append(("refreshed", rag.active))
+
+    def retrieve():
+        time.sleep(0.05)
+        entry.retrieve("q")
+        seen.append(("retrieved", rag.indexed))
+
+    run_all([refresh, retrieve])
+    # The retrieval waited for the refresh, which saw no retrieval in flight
+    assert seen == [("refreshed", 0), ("retrieved", 1)]
+
+
+def test_refresh_not_due_skips_the_write_lock(monkeypatch):
+    rag = SlowRAG()
+    entry = warm_index(rag)
+    monkeypatch.setattr(index_registry, "REFRESH_INTERVAL", 60)
+    with entry.lock.read():
+        entry.refresh()  # would deadlock if it waited for the write lock
+    assert rag.indexed == 0
@@ -0,0 +1,86 @@
+import os
+import numpy as np
+import pytest
+import index_store
+from index_store import IndexStore, chunk_id
+
+CHUNKED = []
+
+
+def chunker(text, source):
+    CHUNKED.append(os.path.basename(source))
+    return [{"content": line, "metadata": {"line": i}} for i, line in enumerate(text.splitlines()) if line]
+
+
+def embed(texts):
+    return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    (root / "a.sql").write_text("CREATE TABLE a (id INT);\nSELECT 1;\n")
+    (root / "b.md").write_text("# Notes\n")
+    return root
+
+
+def open_store(repo, tmp_path):
+    return IndexStore(str(repo), embedding_key="test", cache_dir=str(tmp_path / "cache"))
+
+
+def sync(store):
+    CHUNKED.clear()
+    changed = store.sync(chunker, embed, workers=1)
+    return changed, sorted(CHUNKED)
+
+
+def contents(store):
+    documents, _ = store.load()
+    return sorted(doc["content"] for doc in documents)
+
+
+def test_first_sync_indexes_every_file(repo, tmp_path):
+    store = open_store(repo, tmp_path)
+    assert sync(store) == (True, ["a.sql", "b.md"])
+    documents, embeddings = store.load()
+    assert sorted(doc["content"] for doc in documents) == ["# Notes", "CREATE TABLE a (id INT);", "SELECT 1;"]
+    assert embeddings.shape == (3, 2)
+    by_content = {doc["content"]: doc for doc in documents}
+    assert by_content["SELECT 1;"]["id"] == chunk_id("a.sql", 1)
+    assert by_content["SELECT 1;"]["metadata"] == {"line": 1}
+
+
+def test_unchanged_files_are_not_reread(repo, tmp_path):
+    store = open_store(repo, tmp_path)
+    sync(store)
+    assert sync(store) == (False, [])
+    # A new store on the same cache sees the same state
+    assert sync(open_store(repo, tmp_path)) == (False, [])
+
+
+def test_touched_but_identical_file_is_not_rechunked(repo, tmp_path):
+    store = open_store(repo, tmp_path)
+    sync(store)
+    stat = os.stat(repo / "a.sql")
+    os.utime(repo / "a.sql", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert sync(store) == (False, [])
+
+
+def test_changed_added_and_deleted_files(repo, tmp_path):
+    store = open_store(repo, tmp_path)
+    sync(store)
+    (repo / "a.sql").write_text("SELECT 2;\n")
+    (repo / "c.sql").write_text("SELECT 3;\n")
+    os.remove(repo / "b.md")
+    assert sync(store) == (True, ["a.sql", "c.sql"])
+    assert contents(store) == ["SELECT 2;", "SELECT 3;"]
+
+
+def test_store_version_bump_forces_a_rebuild(repo, tmp_path, monkeypatch):
+    sync(open_store(repo, tmp_path))
+    monkeypatch.setattr(index_store, "STORE_VERSION", index_store.STORE_VERSION + "-next")
+    store = open_store(repo, tmp_path)
+    assert contents(store) == []
+    assert sync(store) == (True, ["a.sql", "b.md"])
+    assert len(contents(store)) == 3
@@ -0,0 +1,67 @@
+import os
+from chunking import chunk_document
+from ingest import GitIgnore, load_files, walk_files
+
+
+def write(root, rel, text="x"):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def walked(root, **kwargs):
+    return [rel.replace(os.sep, "/") for rel, _, _ in walk_files(str(root), **kwargs)]
+
+
+def test_gitignore_rules():
+    rules = GitIgnore(["# comment", "*.log", "/build", "docs/", "!keep.log", "a/**/b.sql"])
+    assert rules.match("x.log", False) is True
+    assert rules.match("sub/x.log", False) is True
+    assert rules.match("keep.log", False) is False
+    assert rules.match("build", True) is True
+    assert rules.match("sub/build", True) is None
+    assert rules.match("docs", True) is True
+    assert rules.match("docs", False) is None
+    assert rules.match("a/b.sql", False) is True
+    assert rules.match("a/x/y/b.sql", False) is True
+    assert rules.match("other.sql", False) is None
+
+
+def test_walk_files_filters_and_sorts(tmp_path):
+    for rel in ("b.sql", "a.md", "notes.txt", "sub/c.sql", "node_modules/d.sql", ".git/e.sql"):
+        write(tmp_path, rel)
+    assert walked(tmp_path) == ["a.md", "b.sql", "sub/c.sql"]
+    assert walked(tmp_path, patterns=("*.sql",)) == ["b.sql", "sub/c.sql"]
+
+
+def test_walk_files_honours_nested_gitignore(tmp_path):
+    write(tmp_path, ".gitignore", "generated/\n*.tmp.sql\n")
+    write(tmp_path, "generated/a.sql")
+    write(tmp_path, "x.tmp.sql")
+    write(tmp_path, "keep.sql")
+    write(tmp_path, "sub/.gitignore", "!y.tmp.sql\nlocal.sql\n")
+    write(tmp_path, "sub/y.tmp.sql")
+    write(tmp_path, "sub/local.sql")
+    write(tmp_path, "local.sql")
+    assert walked(tmp_path) == ["keep.sql", "local.sql", "sub/y.tmp.sql"]
+    assert "generated/a.sql" in walked(tmp_path, use_gitignore=False)
+
+
+def test_walk_files_skips_large_files(tmp_path):
+    write(tmp_path, "small.sql", "x" * 10)
+    write(tmp_path, "big.sql", "x" * 100)
+    assert walked(tmp_path, max_bytes=50) == ["small.sql"]
+
+
+def test_load_files_with_another_worker_count_keeps_the_running_pool(tmp_path):
+    for i in range(40):
+        (tmp_path / f"q{i:02}.sql").write_text(f"SELECT {i};\n")
+    files = [rel for rel, _, _ in walk_files(str(tmp_path))]
+    first = load_files(str(tmp_path), files, chunk_document, workers=2)
+    head = [next(first) for _ in range(5)]
+    # A concurrent caller with a different worker count
+    assert len(list(load_files(str(tmp_path), files, chunk_document, workers=3))) == 40
+    results = head + list(first)
+    assert [rel for rel, _, _ in results] == files
+    assert all(docs for _, _, docs in results)
@@ -0,0 +1,77 @@
+from result_cache import ResultCache, fingerprint_sql, make_cache_key, rebind_literals
+
+
+def test_fingerprint_ignores_whitespace_case_and_literals():
+    a, literals_a = fingerprint_sql("select ID from Users where age > 30 and name = 'x'")
+    b, literals_b = fingerprint_sql("SELECT id\n  FROM users WHERE age > 40 AND name = 'y'")
+    assert a == b
+    assert literals_a == [[False, "30"], [True, "x"]]
+    assert literals_b == [[False, "40"], [True, "y"]]
+
+
+def test_fingerprint_of_unparseable_text():
+    assert fingerprint_sql("not  SQL (") == ("not sql (", [])
+
+
+def test_cache_key_depends_on_context_and_model():
+    key = make_cache_key("fp", "context", "model", 0.1)
+    assert key == make_cache_key("fp", "context", "model", 0.1)
+    assert key != make_cache_key("fp", "other", "model", 0.1)
+    assert key != make_cache_key("fp", "context", "model", 0.2)
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", {"sql": "1"})
+    cache.put("b", {"sql": "2"})
+    assert cache.get("a") == {"sql": "1"}
+    cache.put("c", {"sql": "3"})
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+
+
+def test_ttl_expiry():
+    cache = ResultCache(ttl=0)
+    cache.put("a", {"sql": "1"})
+    assert cache.get("a") is None
+
+
+def test_sqlite_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    ResultCache(db_path=path).put("a", {"sql": "1"})
+    cache = ResultCache(db_path=path)
+    assert cache.get("a") == {"sql": "1"}
+    assert cache.stats["disk_hits"] == 1
+
+
+def test_rebind_literals_substitutes_input_literals():
+    _, cached = fingerprint_sql("SELECT id FROM users WHERE age > 30 AND name = 'x'")
+    _, literals = fingerprint_sql("SELECT id FROM users WHERE age > 40 AND name = 'y'")
+    rebound = rebind_literals("SELECT id FROM users WHERE name = 'x' AND age > 30", cached, literals)
+    assert " ".join(rebound.split()) == "SELECT id FROM users WHERE name = 'y' AND age > 40"
+
+
+def test_rebind_literals_identical_literals_are_served_as_is():
+    _, cached = fingerprint_sql("SELECT * FROM t WHERE a > 5")
+    assert rebind_literals("SELECT * FROM t WHERE a >= 6", cached, cached) == "SELECT * FROM t WHERE a >= 6"
+
+
+def test_rebind_literals_misses_on_model_added_literal():
+    # The model's COALESCE default must not be rewritten along with the predicate
+    _, cached = fingerprint_sql("SELECT * FROM t WHERE score > 0")
+    _, literals = fingerprint_sql("SELECT * FROM t WHERE score > 100")
+    optimized = "SELECT COALESCE(x.cnt, 0) FROM t JOIN x ON x.id = t.id WHERE score > 0"
+    assert rebind_literals(optimized, cached, literals) is None
+
+
+def test_rebind_literals_misses_on_model_changed_literal():
+    # a > 5 rewritten as a >= 6 cannot be traced back to the input's 5
+    _, cached = fingerprint_sql("SELECT * FROM t WHERE a > 5")
+    _, literals = fingerprint_sql("SELECT * FROM t WHERE a > 7")
+    assert rebind_literals("SELECT * FROM t WHERE a >= 6", cached, literals) is None
+
+
+def test_rebind_literals_misses_on_ambiguous_mapping():
+    _, cached = fingerprint_sql("SELECT * FROM t WHERE a = 1 AND b = 1")
+    _, literals = fingerprint_sql("SELECT * FROM t WHERE a = 1 AND b = 2")
+    assert rebind_literals("SELECT * FROM t WHERE a = 1 AND b = 1", cached, literals) is None
@@ -0,0 +1,94 @@
+import pytest
+from rule_optimizer import detect_anti_patterns, rule_optimize
+from schema_index import repo_schema
+from sql_verify import verify_sql
+import sqlglot
+
+SCHEMA = """
+CREATE TABLE customers (
+    customer_id INT PRIMARY KEY,
+    city VARCHAR(100),
+    status ENUM('active', 'closed') NOT NULL
+);
+CREATE TABLE orders (
+    order_id INT PRIMARY KEY,
+    customer_id INT NOT NULL,
+    status ENUM('pending', 'shipped') NOT NULL,
+    total_amount DECIMAL(10,2) NOT NULL,
+    FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+);
+CREATE TABLE payments (
+    payment_id INT PRIMARY KEY,
+    order_id INT NOT NULL,
+    status ENUM('completed', 'failed') NOT NULL,
+    FOREIGN KEY (order_id) REFERENCES orders(order_id)
+);
+"""
+
+QUERIES = [
+    # The unqualified status belongs to payments, not to the outer orders
+    "SELECT order_id, status FROM orders WHERE EXISTS ("
+    "SELECT 1 FROM payments WHERE payments.order_id = orders.order_id AND status = 'completed')",
+    "SELECT customer_id, city FROM customers WHERE EXISTS ("
+    "SELECT 1 FROM orders WHERE orders.customer_id = customers.customer_id AND status = 'shipped')",
+    "SELECT order_id FROM orders WHERE customer_id IN (SELECT customer_id FROM customers WHERE status = 'active')",
+    "SELECT o.order_id, o.total_amount FROM orders o WHERE o.total_amount > ("
+    "SELECT AVG(total_amount) FROM orders i WHERE i.customer_id = o.customer_id)",
+    "SELECT t.customer_id, t.n FROM (SELECT customer_id, COUNT(*) AS n FROM orders GROUP BY customer_id) t "
+    "WHERE t.n > 1",
+    "SELECT c.city, COUNT(*) AS n FROM customers c JOIN orders o ON o.customer_id = c.customer_id "
+    "WHERE o.status = 'shipped' AND 1 = 1 GROUP BY c.city",
+]
+
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / "schema.sql").write_text(SCHEMA)
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("with_schema", [False, True], ids=["no-schema", "schema"])
+@pytest.mark.parametrize("sql", QUERIES)
+def test_rewrite_returns_the_same_rows(repo, sql, with_schema):
+    result = rule_optimize(sql, schema=repo_schema(repo) if with_schema else None)
+    assert result.error is None
+    verification = verify_sql(sql, result.sql, repo, rows=300)
+    assert verification.status in ("verified", "slower"), verification.notes()
+
+
+def test_unqualified_columns_block_unnesting():
+    result = rule_optimize(QUERIES[0])
+    assert "unnest_subqueries" not in result.rules_applied
+    assert "pushdown_predicates" not in result.rules_applied
+
+
+def test_schema_resolves_columns_for_unnesting(repo):
+    result = rule_optimize(QUERIES[0], schema=repo_schema(repo))
+    assert "unnest_subqueries" in result.rules_applied
+    assert "payments.status = 'completed'" in result.sql
+
+
+def test_qualified_input_is_unnested_without_schema():
+    result = rule_optimize(
+        "SELECT o.order_id FROM orders o WHERE EXISTS ("
+        "SELECT 1 FROM payments p WHERE p.order_id = o.order_id AND p.status = 'completed')"
+    )
+    assert "unnest_subqueries" in result.rules_applied
+
+
+def test_unparseable_input_is_returned_unchanged():
+    result = rule_optimize("SELECT FROM WHERE (")
+    assert result.error and result.sql == "SELECT FROM WHERE ("
+
+
+def rules(sql):
+    return sorted(finding.rule for finding in detect_anti_patterns(sqlglot.parse_one(sql)))
+
+
+def test_detect_anti_patterns():
+    assert rules("SELECT * FROM t WHERE id IN (SELECT id FROM u)") == ["in_subquery", "select_star"]
+    assert rules("SELECT a FROM t WHERE UPPER(name) = 'X' AND note LIKE '%x'") == [
+        "leading_wildcard_like", "non_sargable_predicate"
+    ]
+    assert rules("SELECT (SELECT MAX(b) FROM u WHERE u.id = t.id) AS m FROM t") == ["correlated_scalar_subquery"]
+    assert rules("SELECT a FROM t WHERE name = 'X'") == []
@@ -0,0 +1,88 @@
+from sparse_index import SparseIndex, tokenize
+
+
+def doc(text):
+    return {"content": text}
+
+
+def ids(results):
+    return [result[0]["id"] for result in results]
+
+
+def make_index(texts):
+    index = SparseIndex()
+    for i, text in enumerate(texts):
+        index.add(i, dict(doc(text), id=i))
+    return index
+
+
+def test_tokenize_drops_stop_words():
+    assert tokenize("SELECT the user_id FROM Orders") == ["select", "user_id", "orders"]
+
+
+def test_search_ranks_matching_documents():
+    index = make_index(["orders customers join", "payments refunds", "orders shipments"])
+    results = index.search("orders customers", top_k=5)
+    assert ids(results)[0] == 0
+    assert set(ids(results)) == {0, 2}
+    assert all(0 < score <= 1 for _, score in results)
+    assert index.search("unknown", top_k=5) == []
+
+
+def test_remove_and_readd():
+    index = make_index(["orders", "orders payments", "payments"])
+    index.remove(1)
+    assert len(index) == 2 and 1 not in index
+    assert ids(index.search("orders payments", top_k=5)) in ([0, 2], [2, 0])
+    index.remove(42)  # unknown IDs are ignored
+    index.add(1, {"content": "shipments", "id": 1})
+    assert ids(index.search("shipments")) == [1]
+    assert ids(index.search("orders")) == [0]
+
+
+def test_replacing_a_document_retokenizes_it():
+    index = make_index(["orders"])
+    index.add(0, {"content": "payments", "id": 0})
+    assert index.search("orders") == []
+    assert ids(index.search("payments")) == [0]
+
+
+def test_top_k_and_min_score():
+    index = make_index([f"orders {'x ' * i}" for i in range(10)])
+    results = index.search("orders", top_k=3)
+    assert len(results) == 3
+    # Shorter documents score higher under BM25 length normalization
+    assert ids(results) == [0, 1, 2]
+    assert index.search("orders", top_k=3, min_score=1.0) == []
+
+
+def test_local_rag_reindexes_only_changed_files(tmp_path, monkeypatch):
+    import os
+    import rag_utils
+    chunked = []
+
+    def chunker(text, source):
+        chunked.append(os.path.basename(source))
+        return [{"content": line} for line in text.splitlines() if line]
+
+    monkeypatch.setattr(rag_utils, "chunk_document", chunker)
+    (tmp_path / "a.sql").write_text("SELECT orders\n")
+    (tmp_path / "b.sql").write_text("SELECT payments\n")
+    (tmp_path / "c.md").write_text("shipments\n")
+    rag = rag_utils.LocalRAG()
+    rag.index_directory(str(tmp_path))
+    assert sorted(chunked) == ["a.sql", "b.sql", "c.md"] and len(rag.engine) == 3
+
+    chunked.clear()
+    rag.index_directory(str(tmp_path))
+    assert chunked == []
+
+    (tmp_path / "a.sql").write_text("SELECT refunds\nSELECT refunds again\n")
+    os.utime(tmp_path / "b.sql", ns=(1, 1))  # touched, content unchanged
+    (tmp_path / "c.md").unlink()
+    rag.index_directory(str(tmp_path))
+    assert chunked == ["a.sql"]
+    assert [doc["content"] for doc in rag.documents] == ["SELECT refunds", "SELECT refunds again", "SELECT payments"]
+    assert len(rag.engine) == 3
+    assert rag.retrieve("orders") == [] and rag.retrieve("shipments") == []
+    assert rag.retrieve("payments") == [{"content": "SELECT payments"}]
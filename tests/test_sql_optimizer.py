@@ -0,0 +1,45 @@
+from fake_client import FakeResponse
+import sql_optimizer
+from result_cache import ResultCache
+from sql_optimizer import optimize_sql, optimize_sql_stream
+
+
+class ScriptedClient:
+    """Streams fixed chunks of model output."""
+
+    def __init__(self, chunks):
+        self.models = self
+        self.chunks = chunks
+
+    def generate_content_stream(self, **kwargs):
+        for chunk in self.chunks:
+            yield FakeResponse(chunk)
+
+    def generate_content(self, **kwargs):
+        self.calls = getattr(self, "calls", 0) + 1
+        return FakeResponse("".join(self.chunks))
+
+
+def test_stream_local_repair_sends_only_the_note():
+    client = ScriptedClient(["SELECT a, b FROM t ", "ORDER BY LOWER(a"])
+    stream = optimize_sql_stream("SELECT a, b FROM t ORDER BY LOWER(a)", client=client, use_cache=False)
+    streamed = "".join(stream)
+    note = "-- Note: AI output was repaired locally (unclosed parenthesis)."
+    assert streamed == f"SELECT a, b FROM t ORDER BY LOWER(a\n{note}\n"
+    assert stream.result == f"{note}\nSELECT a, b FROM t ORDER BY LOWER(a)"
+
+
+def test_unusable_cache_entry_counts_as_a_miss(monkeypatch):
+    cache = ResultCache()
+    monkeypatch.setattr(sql_optimizer, "get_result_cache", lambda: cache)
+    # The model rewrites the literal, so the entry cannot be rebound to a > 7
+    client = ScriptedClient(["SELECT a FROM t WHERE a >= 6"])
+    optimize_sql("SELECT a FROM t WHERE a > 5", client=client)
+    assert optimize_sql("SELECT a FROM t WHERE a > 7", client=client) == "SELECT a FROM t WHERE a >= 6"
+    assert client.calls == 2
+    assert (cache.stats["hits"], cache.stats["misses"]) == (0, 2)
+
+    # The entry now holds the a > 7 answer: the same literals are served
+    optimize_sql("SELECT a FROM t WHERE a > 7", client=client)
+    assert client.calls == 2
+    assert (cache.stats["hits"], cache.stats["memory_hits"], cache.stats["misses"]) == (1, 1, 2)
@@ -0,0 +1,66 @@
+from sql_repair import (
+    fix_dangling_commas, fix_parentheses, parse_sql, repair_sql, strip_markdown_fences, strip_prose
+)
+
+
+def test_strip_markdown_fences():
+    assert strip_markdown_fences("```sql\nSELECT 1\n```\nDone.") == "SELECT 1"
+    assert strip_markdown_fences("```\nSELECT 1") == "SELECT 1"
+    assert strip_markdown_fences("SELECT 1") == "SELECT 1"
+
+
+def test_strip_prose():
+    text = "Here is the optimized query:\nSELECT a\nFROM t\nThis avoids a full table scan."
+    assert strip_prose(text) == "SELECT a\nFROM t"
+
+
+def test_strip_prose_keeps_leading_comments():
+    text = "Here is the optimized query:\n-- uses idx_t_a\nSELECT a FROM t"
+    assert strip_prose(text) == "-- uses idx_t_a\nSELECT a FROM t"
+
+
+def test_fix_dangling_commas():
+    assert fix_dangling_commas("SELECT a, b, FROM t") == "SELECT a, b FROM t"
+    assert fix_dangling_commas("SELECT f(a, b,) FROM t") == "SELECT f(a, b) FROM t"
+    assert fix_dangling_commas("SELECT a, b FROM t") == "SELECT a, b FROM t"
+
+
+def test_fix_parentheses():
+    assert fix_parentheses("SELECT COUNT(*") == "SELECT COUNT(*)"
+    assert fix_parentheses("SELECT a FROM t ORDER BY f(t.a;") == "SELECT a FROM t ORDER BY f(t.a);"
+    # Where the closing parenthesis belongs is a guess: left for the re-prompt
+    assert fix_parentheses("SELECT (a + b FROM t;") == "SELECT (a + b FROM t;"
+    assert fix_parentheses("SELECT a FROM t WHERE x IN (1, 2 AND y = 3") == "SELECT a FROM t WHERE x IN (1, 2 AND y = 3"
+    assert fix_parentheses("SELECT a) FROM t") == "SELECT a) FROM t"
+    # Parentheses inside strings are not counted
+    assert fix_parentheses("SELECT ')' FROM t") == "SELECT ')' FROM t"
+
+
+def test_parse_sql_reports_first_error():
+    expressions, dialect, error = parse_sql("SELECT 1")
+    assert expressions and error is None
+    expressions, dialect, error = parse_sql("SELECT FROM WHERE (")
+    assert expressions is None and error
+
+
+def test_repair_sql_valid_output_is_untouched():
+    result = repair_sql("```sql\nSELECT a FROM t\n```")
+    assert result.ok and result.sql == "SELECT a FROM t" and result.fixes == []
+
+
+def test_repair_sql_fixes_locally():
+    result = repair_sql("SELECT a, b, FROM t ORDER BY f(a")
+    assert result.ok
+    assert result.fixes == ["dangling comma", "unclosed parenthesis"]
+    assert result.sql == "SELECT a, b FROM t ORDER BY f(a)"
+
+
+def test_repair_sql_does_not_guess_parentheses():
+    result = repair_sql("SELECT a FROM t WHERE x IN (1, 2 AND y = 3")
+    assert not result.ok and result.error
+
+
+def test_repair_sql_gives_up_with_the_error():
+    result = repair_sql("SELECT CASE WHEN FROM")
+    assert not result.ok
+    assert result.error and result.sql == "SELECT CASE WHEN FROM"
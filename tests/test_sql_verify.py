@@ -0,0 +1,79 @@
+import pytest
+from sql_verify import get_sandbox, verify_sql
+
+SCHEMA = """
+CREATE TABLE customers (
+    customer_id INT PRIMARY KEY,
+    city VARCHAR(100),
+    status ENUM('active', 'closed') NOT NULL
+);
+CREATE TABLE orders (
+    order_id INT PRIMARY KEY,
+    customer_id INT NOT NULL,
+    total_amount DECIMAL(10,2) NOT NULL,
+    FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+);
+"""
+
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / "schema.sql").write_text(SCHEMA)
+    return str(tmp_path)
+
+
+def verify(original, optimized, repo):
+    return verify_sql(original, optimized, repo, rows=200)
+
+
+def test_equivalent_rewrite_is_verified(repo):
+    result = verify("SELECT * FROM customers WHERE customer_id IN (SELECT customer_id FROM orders)",
+                    "SELECT DISTINCT c.* FROM customers c JOIN orders o ON o.customer_id = c.customer_id", repo)
+    assert result.status in ("verified", "slower")
+    assert result.rows
+
+
+def test_literals_outside_the_synthetic_domain_still_select_rows(repo):
+    # 'Springfield' is never generated, nor are amounts above 1000
+    result = verify("SELECT * FROM customers WHERE city = 'Springfield'",
+                    "SELECT * FROM customers WHERE city = 'Springfield'", repo)
+    assert result.status == "verified" and result.rows
+    result = verify("SELECT * FROM orders WHERE total_amount > 5000",
+                    "SELECT * FROM orders WHERE total_amount >= 5000", repo)
+    assert result.status == "mismatch"
+
+
+def test_seeded_literals_are_rolled_back(repo):
+    verify("SELECT * FROM customers WHERE city = 'Springfield'",
+           "SELECT * FROM customers WHERE city = 'Springfield'", repo)
+    sandbox = get_sandbox(repo, 200)
+    assert sandbox.conn.execute("SELECT COUNT(*) FROM customers WHERE city = 'Springfield'").fetchone() == (0,)
+
+
+def test_empty_results_are_inconclusive(repo):
+    result = verify("SELECT * FROM customers WHERE 1 = 0", "SELECT * FROM customers WHERE 2 = 0", repo)
+    assert result.status == "skipped"
+    assert not result.regression
+    assert result.notes() == ["-- Verification skipped: neither query returns rows on the sample data, "
+                              "which proves nothing."]
+
+
+def test_different_rows_are_a_regression(repo):
+    result = verify("SELECT customer_id FROM customers", "SELECT customer_id FROM customers WHERE status = 'active'",
+                    repo)
+    assert result.status == "mismatch" and result.regression
+
+
+def test_dropping_order_by_is_a_regression(repo):
+    result = verify("SELECT customer_id, city FROM customers ORDER BY city DESC",
+                    "SELECT customer_id, city FROM customers", repo)
+    assert result.status == "mismatch" and "ORDER BY" in result.reason
+
+
+def test_rows_tied_on_the_order_by_keys_may_come_in_any_order(repo):
+    result = verify("SELECT * FROM customers ORDER BY status",
+                    "SELECT * FROM customers ORDER BY status, customer_id DESC", repo)
+    assert result.status in ("verified", "slower")
+    result = verify("SELECT customer_id AS id, status FROM customers ORDER BY 2, id",
+                    "SELECT customer_id AS id, status FROM customers ORDER BY status, id DESC", repo)
+    assert result.status == "mismatch"
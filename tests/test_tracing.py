@@ -0,0 +1,45 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import tracing
+
+
+def test_disabled_by_default():
+    assert not tracing.is_enabled()
+    assert tracing.span("phase") is tracing.NOOP_SPAN
+
+
+def test_use_scopes_tracing_to_the_calling_thread():
+    barrier = threading.Barrier(2)
+    tracers = {}
+
+    def session(name):
+        with tracing.use(tracing.Tracer()) as tracer:
+            barrier.wait()
+            with tracing.span(name):
+                tracing.count(name)
+            barrier.wait()
+        tracers[name] = tracer
+
+    threads = [threading.Thread(target=session, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for name, tracer in tracers.items():
+        assert [span.name for span in tracer.spans] == [name]
+        assert tracer.counters == {name: 1}
+    assert not tracing.is_enabled()
+
+
+def traced_child():
+    with tracing.span("child"):
+        pass
+
+
+def test_bind_carries_a_scoped_tracer_into_a_pool():
+    with ThreadPoolExecutor(1) as pool, tracing.use(tracing.Tracer()) as tracer:
+        with tracing.span("parent") as parent:
+            pool.submit(tracing.bind(traced_child)).result()
+    child, parent_span = tracer.spans
+    assert child.name == "child" and child.parent_id == parent.span_id
+    assert parent_span is parent
@@ -0,0 +1,72 @@
+import pytest
+import upload_index
+from rag_config import RAGStrategy
+from upload_index import UploadIndexCache
+
+
+class FakeRAG:
+    instances = []
+
+    def __init__(self):
+        self.documents = []
+        self.closed = False
+        FakeRAG.instances.append(self)
+
+    def index_texts(self, texts):
+        if "broken.sql" in texts:
+            raise ValueError("cannot index")
+        self.documents = [{"content": text} for text in texts.values()]
+
+    def retrieve(self, query, top_k=5):
+        assert not self.closed, "retrieve on a closed backend"
+        return self.documents[:top_k]
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_backend(monkeypatch):
+    FakeRAG.instances = []
+    monkeypatch.setattr(upload_index.RAGFactory, "get_rag_class", lambda strategy: FakeRAG)
+
+
+def files(name, size=100):
+    return {name: b"x" * size}
+
+
+def test_same_upload_set_is_indexed_once():
+    cache = UploadIndexCache()
+    with cache.use(RAGStrategy.SIMPLE, files("a.sql")) as (key, rag):
+        pass
+    with cache.use(RAGStrategy.SIMPLE, files("a.sql")) as (same_key, same_rag):
+        assert (same_key, same_rag) == (key, rag)
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_evicted_backend_stays_open_while_in_use():
+    cache = UploadIndexCache(max_bytes=500)
+    with cache.use(RAGStrategy.SIMPLE, files("a.sql")) as (_, held):
+        # Another session's upload pushes the held one out of the budget
+        with cache.use(RAGStrategy.SIMPLE, files("b.sql")):
+            pass
+        assert cache.stats["evictions"] == 1
+        assert held.retrieve("q") and not held.closed
+    assert held.closed
+    assert len(cache) == 1
+
+
+def test_idle_evicted_backend_is_closed_at_once():
+    cache = UploadIndexCache(max_bytes=500)
+    with cache.use(RAGStrategy.SIMPLE, files("a.sql")) as (_, first):
+        pass
+    with cache.use(RAGStrategy.SIMPLE, files("b.sql")):
+        assert first.closed
+
+
+def test_failed_index_is_not_cached():
+    cache = UploadIndexCache()
+    with pytest.raises(ValueError):
+        with cache.use(RAGStrategy.SIMPLE, files("broken.sql")):
+            pass
+    assert len(cache) == 0 and cache.total_bytes() == 0
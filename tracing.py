@@ -0,0 +1,322 @@
+"""
+Lightweight per-phase tracing.
+
+Timed spans and counters around indexing, embedding, retrieval, caching and
+the Gemini round-trip. Tracing is off by default: span() then returns a
+shared no-op object and count() returns immediately, so instrumented code
+pays two lookups per call. enable() turns it on for the process and
+attaches sinks that receive each finished span:
+
+    tracing.enable([JsonlSink("trace.jsonl")])
+    with tracing.span("rag.retrieve", strategy="hybrid") as s:
+        docs = rag.retrieve(query)
+        s.set("docs", len(docs))
+    tracing.count("llm.retries")
+    tracing.flush()
+
+use() instead traces only the current thread/context, so concurrent
+callers (e.g. web app sessions) each collect their own spans:
+
+    with tracing.use(tracing.Tracer()) as tracer:
+        optimize_sql(sql)
+
+Spans nest per thread/context; use bind() to carry the current span (and
+a use() tracer) into work submitted to a thread pool.
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+
+_current = contextvars.ContextVar("sqlclean_span", default=None)
+_scoped = contextvars.ContextVar("sqlclean_tracer", default=None)
+_tracer = None
+
+
+def _active():
+    return _scoped.get() or _tracer
+
+
+class Span:
+    """A timed, named phase with attributes. Used as a context manager."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_ns", "end_ns",
+                 "thread", "error", "_token", "_tracer")
+
+    def __init__(self, name, parent, attributes, tracer):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start_ns = self.end_ns = 0
+        self.thread = threading.current_thread().name
+        self.error = None
+        self._token = None
+        self._tracer = tracer
+
+    @property
+    def seconds(self):
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set(self, key, value):
+        self.attributes[key] = value
+        return self
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Exited from another context (e.g. a generator resumed elsewhere)
+            pass
+        self._tracer._finish(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+            "parent_id": self.parent_id, "start_ns": self.start_ns, "seconds": self.seconds,
+            "thread": self.thread, "attributes": self.attributes, "error": self.error,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, key, value):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Sink:
+    """Receives finished spans and, on flush, the counter totals."""
+
+    def on_span(self, span):
+        pass
+
+    def flush(self, counters):
+        pass
+
+
+class JsonlSink(Sink):
+    """Writes one JSON object per span, and a counters line on flush."""
+
+    def __init__(self, path_or_file):
+        self._owned = isinstance(path_or_file, str)
+        self._file = open(path_or_file, "a") if self._owned else path_or_file
+        self._lock = threading.Lock()
+
+    def on_span(self, span):
+        line = json.dumps(dict(span.to_dict(), type="span"), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self, counters):
+        with self._lock:
+            self._file.write(json.dumps({"type": "counters", "counters": counters}) + "\n")
+            self._file.flush()
+            if self._owned:
+                self._file.close()
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPJsonSink(Sink):
+    """
+    Buffers spans and writes them on flush as OpenTelemetry OTLP/JSON
+    (resourceSpans), which OTel collectors and viewers can import.
+    Counters are attached as resource attributes.
+    """
+
+    def __init__(self, path, service_name="sqlclean"):
+        self.path = path
+        self.service_name = service_name
+        self._spans = []
+        self._lock = threading.Lock()
+        # perf_counter has no epoch; anchor it to wall-clock time once
+        self._offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    def on_span(self, span):
+        with self._lock:
+            self._spans.append(span)
+
+    def flush(self, counters):
+        with self._lock:
+            spans, self._spans = self._spans, []
+        otlp_spans = []
+        for span in spans:
+            attributes = dict(span.attributes, thread=span.thread)
+            otlp = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns + self._offset_ns),
+                "endTimeUnixNano": str(span.end_ns + self._offset_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {},
+            }
+            if span.parent_id:
+                otlp["parentSpanId"] = span.parent_id
+            otlp_spans.append(otlp)
+        resource = [{"key": "service.name", "value": {"stringValue": self.service_name}}]
+        resource += [{"key": f"counter.{k}", "value": _otlp_value(v)} for k, v in counters.items()]
+        document = {"resourceSpans": [{
+            "resource": {"attributes": resource},
+            "scopeSpans": [{"scope": {"name": "sqlclean.tracing"}, "spans": otlp_spans}],
+        }]}
+        with open(self.path, "w") as f:
+            json.dump(document, f)
+
+
+class Tracer:
+    """Collects finished spans, per-name aggregates and counters."""
+
+    def __init__(self, sinks=None, keep=10000):
+        self.sinks = list(sinks or [])
+        self.spans = deque(maxlen=keep)
+        self.counters = {}
+        self.aggregates = {}
+        self._lock = threading.Lock()
+
+    def _finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+            agg = self.aggregates.get(span.name)
+            if agg is None:
+                agg = self.aggregates[span.name] = {"count": 0, "total_s": 0.0, "max_s": 0.0}
+            agg["count"] += 1
+            agg["total_s"] += span.seconds
+            agg["max_s"] = max(agg["max_s"], span.seconds)
+        for sink in self.sinks:
+            sink.on_span(span)
+
+    def count(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+def enable(sinks=None, keep=10000):
+    """Turn tracing on for the process. Returns the Tracer."""
+    global _tracer
+    _tracer = Tracer(sinks, keep)
+    return _tracer
+
+
+def disable():
+    """Turn tracing off. Sinks are not flushed; call flush() first."""
+    global _tracer
+    _tracer = None
+
+
+@contextlib.contextmanager
+def use(tracer):
+    """
+    Trace the current thread/context (and work bound to it) into `tracer`,
+    leaving other threads and the process-wide tracer alone. Yields tracer.
+    """
+    token = _scoped.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _scoped.reset(token)
+
+
+def is_enabled():
+    return _active() is not None
+
+
+def get_tracer():
+    return _active()
+
+
+def span(name, **attributes):
+    """Context manager timing a phase; a shared no-op when tracing is off."""
+    tracer = _active()
+    if tracer is None:
+        return NOOP_SPAN
+    return Span(name, _current.get(), attributes, tracer)
+
+
+def current_span():
+    """The innermost active span, or the no-op span."""
+    if _active() is None:
+        return NOOP_SPAN
+    return _current.get() or NOOP_SPAN
+
+
+def count(name, value=1):
+    """Add to a counter (retries, chunks, tokens, cache hits, ...)."""
+    tracer = _active()
+    if tracer is not None:
+        tracer.count(name, value)
+
+
+def bind(fn):
+    """Wrap fn so it runs under the caller's current span, e.g. in a thread pool."""
+    if _active() is None:
+        return fn
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def flush():
+    """Hand the counter totals to every sink (writes buffered output)."""
+    tracer = _active()
+    if tracer is not None:
+        counters = dict(tracer.counters)
+        for sink in tracer.sinks:
+            sink.flush(counters)
+
+
+def summary():
+    """Per-span-name aggregates and counters of the current tracer."""
+    tracer = _active()
+    if tracer is None:
+        return {"spans": {}, "counters": {}}
+    with tracer._lock:
+        return {
+            "spans": {name: dict(agg) for name, agg in tracer.aggregates.items()},
+            "counters": dict(tracer.counters),
+        }
+
+
+def format_summary(data=None):
+    """Human-readable profile: one line per span name, then counters."""
+    data = data or summary()
+    lines = [f"{'phase':<28}{'calls':>7}{'total ms':>12}{'max ms':>10}"]
+    for name, agg in sorted(data["spans"].items(), key=lambda item: -item[1]["total_s"]):
+        lines.append(f"{name:<28}{agg['count']:>7}{agg['total_s'] * 1000:>12.1f}{agg['max_s'] * 1000:>10.1f}")
+    if data["counters"]:
+        lines.append("counters: " + ", ".join(
+            f"{k}={v:.3g}" if isinstance(v, float) else f"{k}={v}" for k, v in sorted(data["counters"].items())
+        ))
+    return "\n".join(lines)
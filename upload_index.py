@@ -0,0 +1,162 @@
+"""
+In-memory indexes for uploaded files, shared by all web sessions.
+
+Uploads are indexed straight from memory (see the backends' index_texts)
+instead of being written to a temporary directory, and the built RAG
+backend is kept under the strategy and a content hash of the upload set.
+Optimizing again against the same files, from the same or another
+session, skips chunking and embedding. Entries are evicted least recently
+used once their estimated size exceeds the budget
+(SQLCLEAN_UPLOAD_CACHE_MB, default 512). Sessions hold an entry while they
+use it, and an evicted backend is only closed once the last holder is done:
+
+    with get_upload_cache().use(strategy, files) as (key, rag):
+        docs = rag.retrieve(sql)
+"""
+
+import contextlib
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from rag_config import RAGFactory
+from index_registry import estimate_bytes
+
+DEFAULT_MAX_BYTES = int(os.environ.get("SQLCLEAN_UPLOAD_CACHE_MB", 512)) * 1024 * 1024
+
+
+def upload_key(strategy, files):
+    """Cache key for an upload set, {name: bytes}; independent of upload order."""
+    digest = hashlib.sha256(strategy.value.encode())
+    for name in sorted(files):
+        digest.update(b"\0" + name.encode() + b"\0")
+        digest.update(hashlib.sha256(files[name]).digest())
+    return digest.hexdigest()
+
+
+class _Entry:
+    __slots__ = ("lock", "rag", "size", "holders", "evicted")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rag = None
+        self.size = 0
+        self.holders = 0
+        self.evicted = False
+
+
+def _close(rag):
+    close = getattr(rag, "close", None)
+    if close is not None:
+        close()
+
+
+class UploadIndexCache:
+    """Thread-safe LRU of indexed backends keyed by upload_key, bounded by estimated memory."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @contextlib.contextmanager
+    def use(self, strategy, files):
+        """
+        Context manager yielding (key, rag) for an upload set, {name: bytes},
+        building the index on a miss. Concurrent requests for the same set
+        build it once. The backend stays open until the block exits, even if
+        it is evicted meanwhile.
+        """
+        key, entry = self._acquire(strategy, files)
+        try:
+            yield key, entry.rag
+        finally:
+            self._release(entry)
+
+    def _acquire(self, strategy, files):
+        key = upload_key(strategy, files)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            self._entries.move_to_end(key)
+            entry.holders += 1
+        try:
+            with entry.lock:
+                if entry.rag is not None:
+                    self.stats["hits"] += 1
+                    return key, entry
+                self.stats["misses"] += 1
+                rag = RAGFactory.get_rag_class(strategy)()
+                try:
+                    rag.index_texts({
+                        name: data.decode("utf-8", errors="replace") for name, data in files.items()
+                    })
+                except Exception:
+                    with self._lock:
+                        if self._entries.get(key) is entry:
+                            del self._entries[key]
+                    raise
+                entry.rag = rag
+                entry.size = estimate_bytes(rag)
+        except Exception:
+            self._release(entry)
+            raise
+        self._evict(keep=key)
+        return key, entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry.holders -= 1
+            close = entry.evicted and entry.holders == 0
+        if close:
+            _close(entry.rag)
+
+    def _evict(self, keep):
+        evicted = []
+        with self._lock:
+            total = sum(entry.size for entry in self._entries.values())
+            for key in list(self._entries):
+                if total <= self.max_bytes:
+                    break
+                entry = self._entries[key]
+                # The newest entry always stays, even if it alone is over budget
+                if key == keep or entry.rag is None:
+                    continue
+                del self._entries[key]
+                total -= entry.size
+                self.stats["evictions"] += 1
+                # Sessions still retrieving from it close it when they are done
+                entry.evicted = True
+                if entry.holders == 0:
+                    evicted.append(entry.rag)
+        for rag in evicted:
+            _close(rag)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def __len__(self):
+        with self._lock:
+            return sum(entry.rag is not None for entry in self._entries.values())
+
+    def format_stats(self):
+        return (
+            f"{len(self)} indexes, {self.total_bytes() / 2**20:.1f} / {self.max_bytes / 2**20:.0f} MB, "
+            f"{self.stats['hits']} hits, {self.stats['misses']} misses, {self.stats['evictions']} evictions"
+        )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_upload_cache():
+    """The process-wide cache (outlives Streamlit script reruns and sessions)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = UploadIndexCache()
+        return _cache
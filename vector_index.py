@@ -0,0 +1,213 @@
+"""
+Configurable FAISS vector index with stable IDs, persistence and mmap loading.
+
+Index types (all inner product over normalized embeddings):
+- flat:      exact search, 4 bytes/dim per vector
+- fp16/sq8:  exact scan over float16 / 8-bit scalar-quantized vectors (2x / 4x smaller)
+- hnsw:      graph search, fast but memory-hungry; removal uses tombstones
+- ivf_flat / ivf_sq8: inverted lists, searches `nprobe` of `nlist` cells
+- ivf_pq:    inverted lists + product quantization, ~64 bytes per vector
+
+"auto" picks by corpus size: flat below 20k vectors, ivf_sq8 below 200k,
+ivf_pq above (a million 1024-dim chunks then take ~100 MB instead of 4 GB).
+Vectors carry caller-supplied int64 IDs so documents can be removed or
+replaced individually. Saved indexes are memory-mapped on load; the first
+modification reads them fully into memory.
+"""
+
+import os
+import sys
+import numpy as np
+import faiss
+
+INDEX_TYPES = ("auto", "flat", "fp16", "sq8", "hnsw", "ivf_flat", "ivf_sq8", "ivf_pq")
+AUTO_FLAT_MAX = 20_000
+AUTO_SQ8_MAX = 200_000
+# Faiss wants ~39 training points per IVF centroid and 256 per PQ sub-quantizer code
+MIN_POINTS_PER_CENTROID = 39
+MIN_PQ_TRAINING = 256 * 39
+MAX_TRAINING = 100_000
+
+
+def choose_index_type(n):
+    if n < AUTO_FLAT_MAX:
+        return "flat"
+    if n < AUTO_SQ8_MAX:
+        return "ivf_sq8"
+    return "ivf_pq"
+
+
+def _nlist(n):
+    nlist = int(4 * np.sqrt(n))
+    return max(1, min(65536, nlist, n // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dim):
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def factory_string(index_type, dim, n):
+    """faiss.index_factory description for an index type and corpus size."""
+    if index_type in ("ivf_flat", "ivf_sq8", "ivf_pq"):
+        nlist = _nlist(n)
+        if nlist < 2 or (index_type == "ivf_pq" and n < MIN_PQ_TRAINING):
+            # Too few vectors to train: fall back to an exact index
+            return "IDMap2,Flat"
+        codec = {"ivf_flat": "Flat", "ivf_sq8": "SQ8", "ivf_pq": f"PQ{_pq_subquantizers(dim)}"}[index_type]
+        return f"IVF{nlist},{codec}"
+    return {
+        "flat": "IDMap2,Flat",
+        "fp16": "IDMap2,SQfp16",
+        "sq8": "IDMap2,SQ8",
+        "hnsw": "IDMap2,HNSW32",
+    }[index_type]
+
+
+class FaissIndex:
+    """A FAISS index keyed by int64 IDs."""
+
+    def __init__(self, index_type="auto", nprobe=16, ef_search=64):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type: {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.index = None
+        self.spec = None
+        self.built_size = 0
+        self.mapped = False
+        self.path = None
+        self._deleted = set()
+        self._stale = 0
+
+    @property
+    def ntotal(self):
+        return 0 if self.index is None else self.index.ntotal - len(self._deleted) - self._stale
+
+    def reset(self):
+        self.index = None
+        self.spec = None
+        self.built_size = 0
+        self.mapped = False
+        self._deleted = set()
+        self._stale = 0
+
+    def _tune(self):
+        """Apply the search-time knobs (nprobe, efSearch) to the current index."""
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.nprobe = min(self.nprobe, ivf.nlist)
+            return
+        inner = faiss.downcast_index(self.index)
+        if isinstance(inner, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            inner = faiss.downcast_index(inner.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = self.ef_search
+
+    def build(self, ids, vectors):
+        """Replace the contents with the given vectors, choosing the index type for their count."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        n, dim = vectors.shape
+        index_type = choose_index_type(n) if self.index_type == "auto" else self.index_type
+        self.spec = factory_string(index_type, dim, n)
+        self.index = faiss.index_factory(dim, self.spec, faiss.METRIC_INNER_PRODUCT)
+        if not self.index.is_trained:
+            sample = vectors
+            if n > MAX_TRAINING:
+                sample = vectors[np.random.default_rng(0).choice(n, MAX_TRAINING, replace=False)]
+            self.index.train(sample)
+        self.index.add_with_ids(vectors, ids)
+        self.built_size = n
+        self.mapped = False
+        self._deleted = set()
+        self._stale = 0
+        self._tune()
+
+    def needs_rebuild(self, n):
+        """Whether a corpus of n vectors should be rebuilt rather than updated in place."""
+        if self.index is None:
+            return True
+        if self.index_type == "auto" and not (self.built_size / 2 <= n <= self.built_size * 2):
+            return True
+        # Tombstones (HNSW) are only filtered at query time; rebuild when they pile up
+        return len(self._deleted) + self._stale > max(100, self.index.ntotal // 5)
+
+    def _writable(self):
+        if self.mapped:
+            # Memory-mapped indexes are read-only: load a private copy first
+            self.index = faiss.read_index(self.path)
+            self.mapped = False
+            self._tune()
+
+    def add(self, ids, vectors):
+        if len(ids) == 0:
+            return
+        self._writable()
+        ids = np.asarray(ids, dtype=np.int64)
+        revived = self._deleted.intersection(ids.tolist())
+        if revived:
+            # The hidden vectors stay in the graph; search keeps the best hit per ID
+            self._deleted -= revived
+            self._stale += len(revived)
+        self.index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), ids)
+
+    def remove(self, ids):
+        if self.index is None or len(ids) == 0:
+            return
+        self._writable()
+        ids = np.asarray(ids, dtype=np.int64)
+        try:
+            self.index.remove_ids(ids)
+        except RuntimeError:
+            # HNSW cannot delete: hide the vectors instead
+            self._deleted.update(ids.tolist())
+
+    def search(self, vector, top_k):
+        """Return [(id, score), ...] best first."""
+        if self.ntotal <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        k = min(self.index.ntotal, top_k + len(self._deleted) + self._stale)
+        scores, ids = self.index.search(query, k)
+        results = []
+        seen = set()
+        for i, score in zip(ids[0].tolist(), scores[0].tolist()):
+            if i == -1 or i in self._deleted or i in seen:
+                continue
+            seen.add(i)
+            results.append((i, score))
+        return results[:top_k]
+
+    def save(self, path):
+        """Write the index atomically (plus tombstones) so it can be mmapped later."""
+        tmp = path + ".tmp"
+        faiss.write_index(self.index, tmp)
+        os.replace(tmp, path)
+        np.save(path + ".deleted.npy", np.array(sorted(self._deleted) + [-1] * self._stale, dtype=np.int64))
+
+    def load(self, path, mmap=True):
+        """Load a saved index, memory-mapped if possible. Returns False if there is none."""
+        if not os.path.exists(path):
+            return False
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        try:
+            self.index = faiss.read_index(path, flags)
+            self.mapped = bool(mmap)
+        except RuntimeError as e:
+            print(f"Could not memory-map {path} ({e}); reading it into memory", file=sys.stderr)
+            self.index = faiss.read_index(path)
+            self.mapped = False
+        self.path = path
+        self.spec = None
+        self.built_size = self.index.ntotal
+        deleted_path = path + ".deleted.npy"
+        deleted = np.load(deleted_path).tolist() if os.path.exists(deleted_path) else []
+        # -1 entries count stale copies of re-added vectors
+        self._stale = deleted.count(-1)
+        self._deleted = set(deleted) - {-1}
+        self._tune()
+        return True
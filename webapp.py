@@ -1,22 +1,41 @@
-from sql_optimizer import optimize_sql
-import os
-import tempfile
+import contextlib
+from sql_optimizer import optimize_sql, optimize_sql_stream
 from rag_config import RAGStrategy
+from result_cache import get_result_cache
+from upload_index import get_upload_cache
+import tracing
 
 # --- CORE LOGIC ---
 # Using the same logic as your CLI
 
-def get_optimized_sql(sql_input, repo_path=None, uploaded_files=None, rag_strategy=RAGStrategy.HYBRID):
+def _run_optimizer(sql_input, on_token=None, **kwargs):
+    """optimize_sql, or its streaming variant when on_token(text) is given."""
+    if on_token is None:
+        return optimize_sql(sql_input, **kwargs)
+    stream = optimize_sql_stream(sql_input, **kwargs)
+    for text in stream:
+        on_token(text)
+    return stream.result
+
+def get_optimized_sql(sql_input, repo_path=None, uploaded_files=None, rag_strategy=RAGStrategy.HYBRID, offline=False,
+                      on_token=None, session=None):
+    """
+    Optimize with context from a server path or from uploaded files.
+
+    Uploads are indexed in memory and the index is shared through the
+    upload cache, keyed by their content; pass the Streamlit session state
+    as `session` to record which upload set the session last used.
+    """
+    if offline:
+        return _run_optimizer(sql_input, on_token, offline=True)
     if uploaded_files:
-        # Create temporary directory and save uploaded files
-        with tempfile.TemporaryDirectory() as temp_dir:
-            for uploaded_file in uploaded_files:
-                file_path = os.path.join(temp_dir, uploaded_file.name)
-                with open(file_path, 'wb') as f:
-                    f.write(uploaded_file.getbuffer())
-            return optimize_sql(sql_input, repo_path=temp_dir, rag_strategy=rag_strategy)
+        files = {uploaded_file.name: bytes(uploaded_file.getbuffer()) for uploaded_file in uploaded_files}
+        with get_upload_cache().use(rag_strategy, files) as (key, rag):
+            if session is not None:
+                session["upload_index_key"] = key
+            return _run_optimizer(sql_input, on_token, rag=rag, rag_strategy=rag_strategy)
     else:
-        return optimize_sql(sql_input, repo_path=repo_path, rag_strategy=rag_strategy)
+        return _run_optimizer(sql_input, on_token, repo_path=repo_path, rag_strategy=rag_strategy)
 
 # --- UI DESIGN ---
 # Only import streamlit when running as main script
@@ -33,16 +52,49 @@ if __name__ == "__main__":
     st.sidebar.markdown("### RAG Configuration")
     rag_strategy_name = st.sidebar.radio(
         "Choose RAG Strategy:",
-        ["Simple (TF-IDF)", "Hybrid (TF-IDF + Chroma + FAISS)"],
-        help="Simple: Fast, lightweight. Hybrid: Better semantic understanding"
+        ["Simple (TF-IDF)", "Hybrid (TF-IDF + Chroma + FAISS)", "Schema-first (DDL lookup)",
+         "Query patterns (AST shape)"],
+        help="Simple: Fast, lightweight. Hybrid: Better semantic understanding. Schema-first: DDL of the tables "
+             "your query uses. Query patterns: past queries structured like yours"
     )
-    rag_strategy = RAGStrategy.SIMPLE if "Simple" in rag_strategy_name else RAGStrategy.HYBRID
+    if "Simple" in rag_strategy_name:
+        rag_strategy = RAGStrategy.SIMPLE
+    elif "Schema" in rag_strategy_name:
+        rag_strategy = RAGStrategy.SCHEMA
+    elif "patterns" in rag_strategy_name:
+        rag_strategy = RAGStrategy.PATTERN
+    else:
+        rag_strategy = RAGStrategy.HYBRID
     
     if rag_strategy == RAGStrategy.HYBRID:
-        st.sidebar.info("🔀 Hybrid RAG combines TF-IDF, Chroma embeddings, and FAISS for best results")
+        st.sidebar.info("🔀 Hybrid RAG combines schema lookup, TF-IDF, Chroma embeddings, and FAISS for best results")
+    elif rag_strategy == RAGStrategy.SCHEMA:
+        st.sidebar.info("🗂️ Schema-first RAG retrieves the DDL of referenced tables and their foreign-key neighbours")
+    elif rag_strategy == RAGStrategy.PATTERN:
+        st.sidebar.info("🧩 Query-pattern RAG retrieves past queries and examples whose AST shape matches yours")
     else:
         st.sidebar.info("⚡ Simple RAG uses TF-IDF for fast keyword-based retrieval")
     
+    offline = st.sidebar.checkbox(
+        "Offline (rule-based only)",
+        help="Apply sqlglot optimizer rules and anti-pattern checks locally, without calling Gemini"
+    )
+
+    debug = st.sidebar.checkbox(
+        "Debug panel",
+        help="Trace each phase (indexing, retrieval, Gemini call, validation) and show timings and counters"
+    )
+
+    cache = get_result_cache()
+    if cache is not None:
+        st.sidebar.markdown("### Result Cache")
+        st.sidebar.caption(cache.format_stats())
+
+    upload_cache = get_upload_cache()
+    if len(upload_cache):
+        st.sidebar.markdown("### Upload Indexes")
+        st.sidebar.caption(upload_cache.format_stats())
+
     # Input area
     raw_sql = st.text_area("Paste your SQL here:", height=200, placeholder="SELECT * FROM users...")
     
@@ -82,21 +134,46 @@ if __name__ == "__main__":
                 
             with st.spinner("Optimizing" + context_msg):
                 try:
-                    optimized = get_optimized_sql(raw_sql, repo_path, uploaded_files, rag_strategy)
-                    
-                    # Show results in columns
+                    # Show results in columns; the optimized side fills in as tokens arrive
                     col1, col2 = st.columns(2)
                     with col1:
                         st.subheader("Original")
                         st.code(raw_sql, language="sql")
                     with col2:
                         st.subheader("Optimized")
-                        st.code(optimized, language="sql")
+                        live = st.empty()
+                    streamed = []
+
+                    def show_token(text):
+                        streamed.append(text)
+                        live.code("".join(streamed), language="sql")
+
+                    previous_upload = st.session_state.get("upload_index_key")
+                    # Scoped to this session's thread: other sessions keep their own tracing
+                    tracer = tracing.Tracer() if debug else None
+                    with tracing.use(tracer) if debug else contextlib.nullcontext():
+                        optimized = get_optimized_sql(raw_sql, repo_path, uploaded_files, rag_strategy, offline,
+                                                      on_token=show_token, session=st.session_state)
+                    # Replace the live text with the validated result
+                    live.code(optimized, language="sql")
                         
                     if (repo_method == "Server Path" and repo_path and repo_path.strip()) or \
                        (repo_method == "Upload Files" and uploaded_files):
                         st.info("✅ Used repository context for optimization")
+                    if uploaded_files and previous_upload == st.session_state.get("upload_index_key"):
+                        st.caption("Reused the in-memory index of these uploads")
                     st.success("Refactoring complete!")
+
+                    if tracer is not None:
+                        with st.expander("🔍 Debug: trace", expanded=True):
+                            st.text(tracing.format_summary({
+                                "spans": tracer.aggregates, "counters": tracer.counters
+                            }))
+                            st.dataframe([
+                                {"phase": span.name, "ms": round(span.seconds * 1000, 2),
+                                 "thread": span.thread, "attributes": str(span.attributes)}
+                                for span in sorted(tracer.spans, key=lambda span: span.start_ns)
+                            ])
                 except Exception as e:
                     st.error(f"Error: {e}")
         else: